@@ -1,15 +1,81 @@
 import io
+import json
+import base64
+import time
+import queue
+import threading
 import binascii
+from pathlib import Path
+from typing import List
+
 from loguru import logger as log
-from pyzbar import pyzbar
-from pyzbar.pyzbar import ZBarSymbol
 
 from PIL import Image
-from numpy import array
+from numpy import array, ndarray
+
+from cache import cache_key, result_cache
+from config import config
+from duplicate import duplicate_index, phash
+from exporter import export_formats, export_invoices
+from image_ocr import (
+    bytes_to_img,
+    check_img,
+    decode_documents,
+    documents_result,
+    img_hash,
+    invoice_qr_codes,
+    ocr_img_bytes,
+    pipline_result,
+)
+from invoice_store import InvoiceStoreError, invoice_store
+from metrics import metrics_summary, span, trace
+from model import model_status
+from progress import listen
+from qr import find_invoice_qrcode
+from pdf import render_pdf_pages, text_visual_info
+from preprocess import preprocess_image
+from upload import is_upload_handle, upload_store
+from vector_cache import embedding_cache
+from worker_pool import OcrWorkerPool
+from utils import invoice_verify, ocr_batch_pipline
+
+from classes import api_invoice_error, api_invoice_return, invoice_content, ocr_image
+
+
+def is_img_data(item: str) -> bool:
+    """
+    Whether `item` carries the image itself (a data URL or an upload handle) rather than a file path.
+    """
+    return item.startswith("data:image/") or is_upload_handle(item)
+
+
+def get_img_bytes(image_data: str) -> bytes | None:
+    """
+    Decodes the payload of a base64-encoded image data URL, or looks up an upload handle.
+    Args:
+        image_data (str): A string containing the image data in data URL format (e.g., "data:image/png;base64,..."),
+            or a handle returned by the `/api/upload` endpoint (e.g., "upload:<id>").
+    Returns:
+        bytes | None: The encoded image file bytes if successful, otherwise None.
+    """
+
+    if is_upload_handle(image_data):
+        if (img_bytes := upload_store.get(image_data)) is None:
+            log.error(f"Upload not found or expired: {image_data}")
+        return img_bytes
 
-from utils import invoice_verify, ocr_pipline
+    if not image_data.startswith("data:image/"):
+        log.error("Invalid image data format")
+        return
 
-from classes import api_invoice_error, api_invoice_return, invoice_content
+    # 提取 base64 编码部分
+    base64_data = image_data.split(",")[1]
+    log.debug(f"Base64 data siez: {len(base64_data) / 1024} KB")
+    try:
+        return binascii.a2b_base64(base64_data)
+    except binascii.Error as e:
+        log.error(f"Invalid base64 data: {e}")
+        return
 
 
 def get_img(image_data: str) -> Image.Image | None:
@@ -23,25 +89,416 @@ def get_img(image_data: str) -> Image.Image | None:
         - Logs an error if the input format is invalid or if the image cannot be identified.
         - Logs the length of the base64 data for debugging purposes.
     """
+    return bytes_to_img(get_img_bytes(image_data))
 
-    if not image_data.startswith("data:image/"):
-        log.error("Invalid image data format")
+
+def load_img_bytes(item: str) -> bytes | None:
+    """
+    Loads encoded image file bytes from a base64 data URL or a local file path.
+    """
+    if is_img_data(item):
+        return get_img_bytes(item)
+
+    try:
+        return Path(item).read_bytes()
+    except OSError as e:
+        log.error(f"Cannot open image file {item}: {e}")
         return
 
-    # 提取 base64 编码部分
-    base64_data = image_data.split(",")[1]
-    log.debug(f"Base64 data siez: {len(base64_data) / 1024} KB")
-    qr_image_data = binascii.a2b_base64(base64_data)
 
-    image_stream = io.BytesIO(qr_image_data)
+def load_pdf_bytes(item: str) -> bytes | None:
+    """
+    Loads PDF file bytes from a base64 data URL ("data:application/pdf;base64,..."),
+    an upload handle or a local file path.
+    """
+    if is_upload_handle(item):
+        return get_img_bytes(item)
+
+    if item.startswith("data:"):
+        if not item.startswith("data:application/pdf;base64,"):
+            log.error("Invalid PDF data format")
+            return
+        try:
+            return binascii.a2b_base64(item.split(",")[1])
+        except binascii.Error as e:
+            log.error(f"Invalid base64 data: {e}")
+            return
+
+    try:
+        return Path(item).read_bytes()
+    except OSError as e:
+        log.error(f"Cannot open PDF file {item}: {e}")
+        return
+
+
+def find_duplicates(
+    img_bytes: bytes | None, threshold: int | None = None
+) -> tuple[bytes | None, List[dict], List[str] | None]:
+    """
+    Looks an image up in the perceptual-hash index of earlier OCR results and saved invoices.
+    Args:
+        img_bytes (bytes | None): The encoded image file.
+        threshold (int, optional): Maximum Hamming distance, defaults to `duplicate.threshold`.
+    Returns:
+        tuple[bytes | None, List[dict], List[str] | None]: The image hash, or None if it
+            cannot be computed, the matches ordered by distance, and the invoice QR code
+            fields if the lookup had to decode them (empty when no QR code was found),
+            so the OCR pipeline does not decode the same image again. Matches with a
+            different invoice number than the QR code are left out.
+    """
+    img = bytes_to_img(img_bytes)
+    if duplicate_index is None or img is None:
+        return None, [], None
+    if threshold is None:
+        threshold = config.duplicate.threshold
+
+    qr_codes = None
+    with span("duplicate_lookup") as attrs:
+        try:
+            img_phash = phash(img)
+        except Exception as e:
+            log.warning(f"无法计算图片哈希: {e}")
+            return None, [], None
+        matches = duplicate_index.find(img_phash, threshold)
+        if any(match["invoice_number"] for match in matches):
+            # 版式相同的不同发票哈希也很接近，用二维码中的发票号码排除
+            qr_codes = invoice_qr_codes(img, force=True) or []
+            if qr_codes:
+                matches = duplicate_index.find(img_phash, threshold, qr_codes[3])
+        attrs["matches"] = len(matches)
+
+    for match in matches:
+        number = match["invoice_number"]
+        match["saved"] = bool(number) and invoice_store.get(number) is not None
+    return img_phash, matches, qr_codes
+
+
+def duplicate_info(match: dict, confirmed: bool) -> dict:
+    return {
+        "distance": match["distance"],
+        "invoice_number": match["invoice_number"],
+        "saved": match["saved"],
+        "confirmed": confirmed,
+    }
+
+
+def is_confirmed_duplicate(match: dict, qr_codes: List[str] | None) -> bool:
+    """
+    Invoices printed from the same template have close perceptual hashes, so a match is
+    only taken as the same invoice when the QR code carries its invoice number, or the
+    hashes are within `duplicate.exact_threshold` (the same image re-encoded or resized).
+    """
+    if match["distance"] <= config.duplicate.exact_threshold:
+        return True
+    return bool(qr_codes) and match["invoice_number"] == qr_codes[3]
+
+
+def duplicate_result(matches: List[dict], qr_codes: List[str] | None) -> dict | None:
+    """
+    Builds the OCR result of a confirmed duplicate image from its closest confirmed match:
+    the recorded OCR result, or the fields of the saved invoice.
+    """
+    for match in matches:
+        if not is_confirmed_duplicate(match, qr_codes):
+            continue
+        info = duplicate_info(match, confirmed=True)
+        if match["result"]:
+            return {**match["result"], "duplicate": info}
+        if match["saved"]:
+            invoice = invoice_store.get(match["invoice_number"])
+            content = invoice_content(
+                date=invoice["date"],
+                program=invoice["program"],
+                amount="" if invoice["amount"] is None else f"{invoice['amount']:.2f}",
+                content=invoice["content"],
+                invoice_type=invoice["invoice_type"],
+                invoice_number=invoice["invoice_number"],
+            )
+            return {**api_invoice_return(content).to_dict(), "duplicate": info}
+
+
+def duplicate_warning(matches: List[dict], result: dict) -> dict | None:
+    """
+    The closest unconfirmed match that may still be the same invoice as the OCR result,
+    i.e. one without an invoice number or with the recognized one.
+    """
+    number = str((result.get("content") or {}).get("invoice_number") or "")
+    for match in matches:
+        if match["invoice_number"] in (None, number) or not number:
+            return duplicate_info(match, confirmed=False)
 
+
+def index_invoice_image(invoice_number: str, image: tuple[str, bytes] | None):
+    """
+    Replaces the perceptual hash of a saved invoice's image.
+    """
+    if duplicate_index is None or image is None:
+        return
+    duplicate_index.remove_invoice(invoice_number)
     try:
-        img = Image.open(image_stream)
-    except (IOError, ValueError) as e:
-        log.error(f"Cannot identify image file: {e}")
+        duplicate_index.add(phash(bytes_to_img(image[1])), invoice_number)
+    except Exception as e:
+        log.warning(f"无法计算图片哈希: {e}")
+
+
+image_suffixes = [".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff"]
+
+
+def collect_img_paths(paths: List[str]) -> List[str]:
+    """
+    Expands directories in `paths` into the image files they contain.
+    Args:
+        paths (List[str]): Image file or directory paths.
+    Returns:
+        List[str]: Image file paths, directories expanded in name order.
+    """
+    img_paths = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            img_paths += [
+                str(p)
+                for p in sorted(path.iterdir())
+                if p.is_file() and p.suffix.lower() in image_suffixes
+            ]
+        else:
+            img_paths.append(str(path))
+    return img_paths
+
+
+def img_to_ndarray(img: Image.Image | None) -> ndarray | api_invoice_error:
+    """
+    Checks an image, runs the preprocessing stage and converts it to the ndarray expected by the OCR pipeline.
+    Args:
+        img (Image.Image | None): The decoded image.
+    Returns:
+        ndarray | api_invoice_error: The image array, or an error if the image cannot be used.
+    """
+    if error := check_img(img):
+        return error
+
+    img_ndarray = array(preprocess_image(img))
+    if img_ndarray.size == 0:
+        return api_invoice_error("Image size is zero")
+
+    return img_ndarray
+
+
+def batch_sources(items: List[str]) -> List[tuple[str, str | int]]:
+    """
+    Expands batch input items into `(item, source)` pairs, where `source` is the
+    file path, or the input index for data URLs.
+    """
+    sources: List[tuple[str, str | int]] = []
+    for index, item in enumerate(items):
+        if is_img_data(item):
+            sources.append((item, index))
+        else:
+            sources += [(path, path) for path in collect_img_paths([item])]
+    return sources
+
+
+def batch_ocr(items: List[str], callback=None) -> List[dict]:
+    """
+    Runs the OCR pipeline over many images.
+    Args:
+        items (List[str]): Base64 image data URLs, upload handles, image file paths or directories.
+        callback (Callable[[int, int, dict], None], optional): Called as
+            `callback(index, total, result)` whenever an image is finished.
+            It may be called from worker threads.
+    Returns:
+        List[dict]: One result dict per image, in input order. Each dict carries
+            the `source` it was produced from (the file path, or the input index
+            for data URLs). The receipts split from a multi-receipt scan go through
+            the pipeline with the other images and are combined as in `ocr_img_bytes`.
+    """
+    sources = batch_sources(items)
+    total = len(sources)
+    results: List[dict] = [{} for _ in range(total)]
+
+    def finish(index: int, result: api_invoice_return | api_invoice_error):
+        results[index] = {**result.to_dict(), "source": sources[index][1]}
+        if callback:
+            callback(index, total, results[index])
+
+    # visual_predict 中的序号 -> (sources 中的序号, 图片中的第几张票据)
+    indexes: List[tuple[int, int]] = []
+    # 分割出多张票据的图片: sources 中的序号 -> (各票据区域, 各票据结果)
+    split: dict[int, tuple[list, list]] = {}
+    lock = threading.Lock()
+
+    def finish_document(i: int, result: invoice_content | str):
+        index, position = indexes[i]
+        if index not in split:
+            finish(index, pipline_result(result))
+            return
+        regions, documents = split[index]
+        with lock:
+            documents[position] = pipline_result(result)
+            if any(document is None for document in documents):
+                return
+        finish(index, documents_result(regions, documents))
+
+    def images():
+        for index, (item, _) in enumerate(sources):
+            documents = decode_documents(load_img_bytes(item))
+            if isinstance(documents, api_invoice_error):
+                finish(index, documents)
+                continue
+            if len(documents) > 1:
+                split[index] = (
+                    [region for region, _ in documents],
+                    [None] * len(documents),
+                )
+            for position, (_, image) in enumerate(documents):
+                indexes.append((index, position))
+                yield image
+
+    with trace("batch_ocr", images=total):
+        ocr_batch_pipline(images(), callback=finish_document)
+
+    return results
+
+
+def pool_batch_ocr(pool: OcrWorkerPool, items: List[str], callback=None) -> List[dict]:
+    """
+    Same as `batch_ocr`, but spreads the images over the OCR worker pool.
+    At most two jobs per worker are in flight so images are not all read into memory at once.
+    """
+    sources = batch_sources(items)
+    total = len(sources)
+    results: List[dict] = [{} for _ in range(total)]
+    finished: queue.Queue[str] = queue.Queue()
+    pending: dict[str, int] = {}
+
+    def collect():
+        job_id = finished.get()
+        index = pending.pop(job_id)
+        results[index] = {**pool.wait(job_id), "source": sources[index][1]}
+        if callback:
+            callback(index, total, results[index])
+
+    for index, (item, _) in enumerate(sources):
+        while len(pending) >= pool.size * 2:
+            collect()
+        img_bytes = load_img_bytes(item)
+        if img_bytes is None:
+            results[index] = {
+                **api_invoice_error("Cannot identify image file").to_dict(),
+                "source": sources[index][1],
+            }
+            if callback:
+                callback(index, total, results[index])
+            continue
+        pending[pool.submit(img_bytes, on_done=finished.put)] = index
+
+    while pending:
+        collect()
+
+    return results
+
+
+def invoice_image(image_data: str | None) -> tuple[str, bytes] | None:
+    """
+    Decodes the image attached to an invoice for storage.
+    Returns:
+        tuple[str, bytes] | None: The MIME type and image file bytes, or None if no valid image was given.
+    """
+    if not image_data or not is_img_data(image_data):
         return
+    img = bytes_to_img(img_bytes := get_img_bytes(image_data))
+    if img is None:
+        return
+    return Image.MIME.get(img.format, "image/png"), img_bytes
+
+
+def data_url(mime: str, data: bytes) -> str:
+    return f"data:{mime};base64,{base64.b64encode(data).decode()}"
+
+
+def pdf_pages(pdf_bytes: bytes):
+    """
+    Rasterizes the pages of a PDF in the render process pool.
+    Yields:
+        tuple[int, Image.Image, ocr_image]: The page index, the page image and the
+            pipeline input, in the order pages finish rendering. Pages with a usable
+            text layer carry it as `visual_info_list`, so text detection and
+            recognition are skipped for them.
+    """
+    pdf_hash = img_hash(pdf_bytes)
+    dpi = config.pdf.dpi
+    for index, img_ndarray, text in render_pdf_pages(
+        pdf_bytes, dpi, config.pdf.render_workers
+    ):
+        use_text = len(text.strip()) >= config.pdf.min_text_chars
+        img = Image.fromarray(img_ndarray)
+        yield index, img, ocr_image(
+            array(preprocess_image(img)),
+            cache_key(pdf_hash, index, dpi, use_text),
+            invoice_qr_codes(img),
+            [text_visual_info(text)] if use_text else None,
+        )
+
+
+def pdf_ocr(pdf_bytes: bytes, callback=None) -> List[dict]:
+    """
+    Runs the OCR pipeline over every page of a PDF. Pages are rasterized in parallel
+    and fed into the pipeline as soon as they are ready.
+    Args:
+        pdf_bytes (bytes): The PDF file.
+        callback (Callable[[int, dict], None], optional): Called as
+            `callback(page, result)` whenever a page is finished.
+    Returns:
+        List[dict]: One result dict per page, in page order, each carrying its `page` index.
+    """
+    results: dict[int, dict] = {}
+    # visual_predict 中的序号 -> 页码
+    pages: List[int] = []
+
+    def images():
+        for index, _, image in pdf_pages(pdf_bytes):
+            pages.append(index)
+            yield image
 
-    return img
+    def finish(i: int, result):
+        page = pages[i]
+        results[page] = {**pipline_result(result).to_dict(), "page": page}
+        if callback:
+            callback(page, results[page])
+
+    with trace("pdf_ocr", bytes=len(pdf_bytes)) as current:
+        ocr_batch_pipline(images(), callback=finish)
+        if current:
+            current.attrs["pages"] = len(results)
+    return [results[page] for page in sorted(results)]
+
+
+def pool_pdf_ocr(pool: OcrWorkerPool, pdf_bytes: bytes, callback=None) -> List[dict]:
+    """
+    Same as `pdf_ocr`, but sends the rendered pages to the OCR worker pool as PNG.
+    The text layer is not used on this path, the workers always run text detection and recognition.
+    """
+    results: dict[int, dict] = {}
+    finished: queue.Queue[str] = queue.Queue()
+    pending: dict[str, int] = {}
+
+    def collect():
+        job_id = finished.get()
+        page = pending.pop(job_id)
+        results[page] = {**pool.wait(job_id), "page": page}
+        if callback:
+            callback(page, results[page])
+
+    for index, img, _ in pdf_pages(pdf_bytes):
+        while len(pending) >= pool.size * 2:
+            collect()
+        buffer = io.BytesIO()
+        img.save(buffer, format="PNG")
+        pending[pool.submit(buffer.getvalue(), on_done=finished.put)] = index
+
+    while pending:
+        collect()
+
+    return [results[page] for page in sorted(results)]
 
 
 class API:
@@ -49,12 +506,24 @@ class API:
     API class for handling requests from the front-end.
     """
 
-    def __init__(self):
+    def __init__(self, pool: OcrWorkerPool | None = None):
         self._window = None
+        self._pool = pool
 
     def set_window(self, webview_window):
         self._window = webview_window
 
+    def _emit(self, event: str, detail: dict):
+        """
+        Dispatches a DOM CustomEvent on the front-end window.
+        """
+        if not self._window:
+            return
+        self._window.evaluate_js(
+            f"window.dispatchEvent(new CustomEvent({json.dumps(event)}, "
+            f"{{detail: {json.dumps(detail, ensure_ascii=False)}}}))"
+        )
+
     # 可以添加更多的方法来实现与前端的交互
     def echo(self, message):
         return message
@@ -63,7 +532,8 @@ class API:
         """
         Scans and decodes a QR code from a base64-encoded image string.
         Args:
-            qr_image_data (str): A base64-encoded image string in the format "data:image/<type>;base64,<data>".
+            qr_image_data (str): A base64-encoded image string in the format "data:image/<type>;base64,<data>",
+                or an upload handle returned by the `/api/upload` endpoint.
         Returns:
             dict: A dictionary containing the result of the QR code scan.
                 On success:
@@ -80,12 +550,11 @@ class API:
                     {
                         "success": False,
                         "error": str
-        Raises:
-            ValueError: If no valid QR code is found, more than one QR code is detected,
-                        or the QR code fails verification.
         Notes:
             - The function expects the QR code to contain comma-separated invoice information.
-            - The QR code is validated using the `invoice_verify` function.
+            - The QR code is validated using the `invoice_verify` function. The likely QR corners
+              are tried first, then rescaled and binarized variants; when the image carries
+              several QR codes the first valid invoice QR code is used.
         """
         # return {"success": False, "error": "No QR code found"}
 
@@ -95,20 +564,12 @@ class API:
         if not img:
             return {"success": False, "error": "Cannot identify image file"}
 
-        results = pyzbar.decode(img, symbols=[ZBarSymbol.QRCODE])
-
-        results = list(map(lambda x: x.data.decode("utf-8"), results))
-
-        log.debug(f"解析到的二维码内容: {results}")
+        stats = {}
+        codes = find_invoice_qrcode(img, stats, exhaustive=True)
 
-        if not results or len(results) != 1:
-            return {"success": False, "error": "未找到有效的二维码或二维码数量不为1"}
+        log.debug(f"解析到的二维码内容: {codes}，尝试{stats['attempts']}次")
 
-        result: str = results[0]
-        if not invoice_verify(result):
-            return {"success": False, "error": "无效的二维码！"}
-
-        if codes := result.split(","):
+        if codes:
             return {
                 "success": True,
                 "content": {
@@ -123,38 +584,456 @@ class API:
                 },
             }
         else:
-            return {"success": False, "error": "No QR code found"}
+            return {"success": False, "error": "未找到有效的发票二维码"}
 
-    def img_ocr(self, img_data: str) -> dict:
-        result = self._img_ocr(img_data)
-        return result.to_dict()
+    def get_model_status(self) -> dict:
+        """
+        Returns the loading state of the OCR models so the front-end can poll readiness.
+        Returns:
+            dict: `{"state": "idle" | "loading" | "ready" | "error", "error": str | None, "load_time": float | None,
+                "profile": str}`, where `profile` is the inference profile from config.yaml.
+                When the worker pool is used the state reflects the pool, with extra
+                `workers`, `ready_workers` and `queued` counters.
+        """
+        if self._pool:
+            return self._pool.status()
+        return model_status()
+
+    def clear_cache(self) -> dict:
+        """
+        Removes every cached OCR result and cached text embedding, and forgets the OCR
+        results kept for duplicate detection. Hashes of saved invoices are kept.
+        """
+        if result_cache is None and embedding_cache is None and duplicate_index is None:
+            return {"success": False, "error": "缓存未启用"}
+        if result_cache:
+            result_cache.clear()
+        if embedding_cache:
+            embedding_cache.clear()
+        if duplicate_index:
+            duplicate_index.clear_results()
+        return {"success": True}
 
-    def _img_ocr(self, img_data) -> api_invoice_return | api_invoice_error:
+    def get_metrics(self, limit: int | None = None) -> dict:
         """
-        Placeholder for image OCR functionality.
+        Returns latency percentiles of recent OCR requests and their pipeline stages.
         Args:
-            img_data (str): Base64-encoded image data.
+            limit (int, optional): How many recent requests to include, defaults to `metrics.window`.
         Returns:
-            dict: A dictionary containing the OCR result.
+            dict: `{"success": True, "requests": {...}, "spans": {...}, "gates": {...}, "vector_cache": {...}}`.
+                Requests and spans are keyed by name with `count`, `mean`, `p50`, `p90`, `p99`
+                and `max` in seconds. `gates` counts how often each skippable stage ran or was
+                skipped, e.g. `{"table_recognition": {"run": 3, "no_table": 10}}`. Requests handled by the worker pool are included, since
+                all processes write to the same metrics file. `vector_cache` carries the
+                embedding cache `hits`, `misses`, `hit_rate`, `entries` and `size_mb`.
         """
-        img = get_img(img_data)
+        return {
+            "success": True,
+            **metrics_summary(limit),
+            "vector_cache": embedding_cache.stats() if embedding_cache else None,
+        }
 
-        if not img:
-            return api_invoice_error("Cannot identify image file")
+    def _progress_listener(self, request_id: str | None):
+        """
+        Forwards pipeline progress events to the front-end as `ocr_progress` events.
+        """
+
+        def listener(event: str, detail: dict):
+            self._emit(
+                "ocr_progress", {"request_id": request_id, "event": event, **detail}
+            )
+
+        return listener
+
+    def img_ocr(
+        self,
+        img_data: str,
+        request_id: str | None = None,
+        allow_duplicate: bool = False,
+    ) -> dict:
+        """
+        Runs OCR on one image and waits for the result.
+        Args:
+            img_data (str): Base64-encoded image data or an upload handle.
+            request_id (str, optional): Echoed back in the `ocr_progress` events pushed to
+                the front-end while the image is processed. Events carry an `event` name:
+                `queued` (with `position`) and `started` when the worker pool is used,
+                `stage` (with `stage` and `duration`) whenever a pipeline stage completes,
+                and `fields` with the invoice fields already resolved from the QR code and
+                the rule extractor, before the LLM stages finish.
+            allow_duplicate (bool): Run the OCR pipeline even if the image is a duplicate
+                of an earlier OCR result or a saved invoice, without a duplicate warning.
+        Returns:
+            dict: The OCR result. For a duplicate confirmed by the QR code's invoice number,
+                or a near-identical image, the pipeline is skipped and the earlier result
+                is returned with an extra
+                `duplicate: {"distance", "invoice_number", "saved", "confirmed": True}` entry.
+                Unconfirmed near-duplicates are recognized as usual, and the result carries
+                the closest match as a warning with `"confirmed": False` unless the
+                recognized invoice number rules it out.
+                A scan of several receipts carries a `documents` list, see `ocr_img_bytes`.
+        """
+        img_bytes = get_img_bytes(img_data)
+        img_phash = None
+        matches = []
+        qr_codes = None
+        if duplicate_index is not None:
+            img_phash, matches, qr_codes = find_duplicates(img_bytes)
+            if not allow_duplicate and (result := duplicate_result(matches, qr_codes)):
+                log.info(f"重复发票，跳过识别: {result['duplicate']}")
+                return result
+        if not config.qr_fast_path:
+            # 查重时不论qr_fast_path都可能识别二维码，未启用快速路径时不交给识别管道
+            qr_codes = None
+
+        if self._pool:
+            if img_bytes is None:
+                return api_invoice_error("Cannot identify image file").to_dict()
+            job_id = self._pool.submit(
+                img_bytes,
+                on_progress=self._progress_listener(request_id),
+                qr_codes=qr_codes,
+            )
+            result = self._pool.wait(job_id)
+        else:
+            with listen(self._progress_listener(request_id)):
+                result = ocr_img_bytes(img_bytes, qr_codes).to_dict()
+
+        # 多票据图片的哈希无法对应到单张票据的发票号码，不加入索引
+        if (
+            img_phash is not None
+            and result.get("success")
+            and "documents" not in result
+        ):
+            duplicate_index.add(
+                img_phash, result["content"].get("invoice_number"), result
+            )
+            if not allow_duplicate and (warning := duplicate_warning(matches, result)):
+                log.info(f"疑似重复发票: {warning}")
+                result["duplicate"] = warning
+        return result
+
+    def find_duplicates(self, img_data: str, threshold: int | None = None) -> dict:
+        """
+        Looks for earlier OCR results and saved invoices whose images are near-duplicates
+        of the given image, without running OCR.
+        Args:
+            img_data (str): Base64-encoded image data or an upload handle.
+            threshold (int, optional): Maximum Hamming distance between the 256-bit perceptual
+                hashes, defaults to `duplicate.threshold`.
+        Returns:
+            dict: `{"success": True, "matches": [{"distance", "invoice_number", "saved", "created"}, ...]}`,
+                closest first.
+        """
+        if duplicate_index is None:
+            return api_invoice_error("重复发票检测未启用").to_dict()
+        img_phash, matches, _ = find_duplicates(get_img_bytes(img_data), threshold)
+        if img_phash is None:
+            return api_invoice_error("Cannot identify image file").to_dict()
+        return {
+            "success": True,
+            "matches": [
+                {key: match[key] for key in ("distance", "invoice_number", "saved", "created")}
+                for match in matches
+            ],
+        }
+
+    def submit_ocr(self, img_data: str, request_id: str | None = None) -> dict:
+        """
+        Queues an OCR job on the worker pool and returns immediately.
+        Args:
+            img_data (str): Base64-encoded image data or an upload handle.
+            request_id (str, optional): Echoed back in `ocr_progress` events, see `img_ocr`.
+        Returns:
+            dict: `{"success": True, "job_id": str}`, poll it with `get_ocr_job`.
+        """
+        if not self._pool:
+            return api_invoice_error("OCR进程池未启用").to_dict()
+
+        img_bytes = get_img_bytes(img_data)
+        if img_bytes is None:
+            return api_invoice_error("Cannot identify image file").to_dict()
+        job_id = self._pool.submit(
+            img_bytes, on_progress=self._progress_listener(request_id)
+        )
+        return {"success": True, "job_id": job_id}
+
+    def get_ocr_job(self, job_id: str) -> dict:
+        """
+        Returns the state of an OCR job submitted with `submit_ocr`.
+        Returns:
+            dict: `{"success": True, "job": {"job_id", "state", "result", ...}}`, where `state` is one of
+                queued, running, done, failed, cancelled or timeout and `result` is set once finished.
+        """
+        job = self._pool.get(job_id) if self._pool else None
+        if not job:
+            return api_invoice_error(f"任务不存在: {job_id}").to_dict()
+        return {"success": True, "job": job.to_dict()}
+
+    def cancel_ocr_job(self, job_id: str) -> dict:
+        """
+        Cancels a queued or running OCR job. A running job is stopped by restarting its worker.
+        """
+        if not self._pool or not self._pool.cancel(job_id):
+            return api_invoice_error(f"无法取消任务: {job_id}").to_dict()
+        return {"success": True}
+
+    def batch_ocr(self, items: List[str]) -> dict:
+        """
+        Runs OCR over many images in one call.
+        Args:
+            items (List[str]): Base64 image data URLs, upload handles, image file paths or directories.
+        Returns:
+            dict: `{"success": True, "results": [...], "elapsed": float, "throughput": float}`.
+                Per-image results are also streamed to the front-end as
+                `batch_ocr_progress` events while the batch is running.
+                Unlike `img_ocr`, images are not checked against the duplicate index,
+                call `find_duplicates` per image for that.
+        """
+        start = time.perf_counter()
+        finished = 0
+        lock = threading.Lock()
+
+        def on_result(index: int, total: int, result: dict):
+            nonlocal finished
+            with lock:
+                finished += 1
+                count = finished
+            elapsed = time.perf_counter() - start
+            self._emit(
+                "batch_ocr_progress",
+                {
+                    "index": index,
+                    "finished": count,
+                    "total": total,
+                    "result": result,
+                    "elapsed": elapsed,
+                    "throughput": count / elapsed if elapsed > 0 else 0.0,
+                },
+            )
+
+        if self._pool:
+            results = pool_batch_ocr(self._pool, items, callback=on_result)
+        else:
+            results = batch_ocr(items, callback=on_result)
+        elapsed = time.perf_counter() - start
+        log.info(f"批量识别完成: {len(results)}张图片，耗时{elapsed:.2f}s")
+        return {
+            "success": True,
+            "results": results,
+            "elapsed": elapsed,
+            "throughput": len(results) / elapsed if elapsed > 0 else 0.0,
+        }
+
+    def pdf_ocr(self, pdf_data: str) -> dict:
+        """
+        Runs OCR over every page of a PDF.
+        Args:
+            pdf_data (str): A base64 PDF data URL ("data:application/pdf;base64,..."),
+                an upload handle or a local file path.
+        Returns:
+            dict: `{"success": True, "results": [...], "elapsed": float}`, one result per page
+                in page order, each carrying its `page` index. Pages are also streamed to
+                the front-end as `pdf_ocr_progress` events in the order they finish.
+                Pages are not checked against the duplicate index.
+        """
+        pdf_bytes = load_pdf_bytes(pdf_data)
+        if not pdf_bytes:
+            return api_invoice_error("Cannot open PDF file").to_dict()
+
+        start = time.perf_counter()
+        finished = 0
+        lock = threading.Lock()
+
+        def on_result(page: int, result: dict):
+            nonlocal finished
+            with lock:
+                finished += 1
+                count = finished
+            self._emit(
+                "pdf_ocr_progress", {"page": page, "finished": count, "result": result}
+            )
+
+        try:
+            if self._pool:
+                results = pool_pdf_ocr(self._pool, pdf_bytes, callback=on_result)
+            else:
+                results = pdf_ocr(pdf_bytes, callback=on_result)
+        except Exception as e:
+            log.exception(f"PDF识别失败: {e}")
+            return api_invoice_error(f"PDF识别失败: {e}").to_dict()
+
+        elapsed = time.perf_counter() - start
+        log.info(f"PDF识别完成: {len(results)}页，耗时{elapsed:.2f}s")
+        return {"success": True, "results": results, "elapsed": elapsed}
 
-        if img.format not in ["JPEG", "PNG", "BMP", "TIFF"]:
-            return api_invoice_error(f"Unsupported image format: {img.format}")
+    def add_invoice(self, item: dict) -> dict:
+        """
+        Saves a new invoice to the invoice database.
+        Args:
+            item (dict): Invoice fields `invoice_number`, `invoice_type`, `date` (YYYY-MM-DD),
+                `program`, `amount` and `content`, plus an optional `image` data URL or upload handle.
+                The original image and its thumbnail are stored apart from the fields.
+        Returns:
+            dict: `{"success": True, "invoice": {...}}`, or an error if the invoice number already exists.
+        """
+        image = invoice_image(item.get("image"))
+        try:
+            invoice = invoice_store.add(item, image)
+        except (InvoiceStoreError, ValueError) as e:
+            return api_invoice_error(str(e)).to_dict()
+        index_invoice_image(invoice["invoice_number"], image)
+        return {"success": True, "invoice": invoice}
+
+    def update_invoice(self, item: dict) -> dict:
+        """
+        Updates a stored invoice identified by `invoice_number`. The stored image is kept
+        unless a new `image` is given. See `add_invoice` for the fields.
+        """
+        image = invoice_image(item.get("image"))
+        try:
+            invoice = invoice_store.update(item, image)
+        except (InvoiceStoreError, ValueError) as e:
+            return api_invoice_error(str(e)).to_dict()
+        index_invoice_image(invoice["invoice_number"], image)
+        return {"success": True, "invoice": invoice}
+
+    def delete_invoice(self, invoice_number: str) -> dict:
+        try:
+            invoice_store.delete(invoice_number)
+        except InvoiceStoreError as e:
+            return api_invoice_error(str(e)).to_dict()
+        if duplicate_index:
+            duplicate_index.remove_invoice(invoice_number)
+        return {"success": True}
+
+    def get_invoice(self, invoice_number: str) -> dict:
+        """
+        Loads one invoice with its original image.
+        Returns:
+            dict: `{"success": True, "invoice": {...}}`, where `invoice.image` is a data URL or an empty string.
+        """
+        invoice = invoice_store.get(invoice_number)
+        if invoice is None:
+            return api_invoice_error(f"发票号 {invoice_number} 不存在。").to_dict()
+        image = invoice_store.image(invoice_number)
+        invoice["image"] = data_url(*image) if image else ""
+        return {"success": True, "invoice": invoice}
+
+    def list_invoices(
+        self,
+        page: int = 1,
+        page_size: int = 50,
+        filters: dict | None = None,
+        order_by: str = "date",
+        descending: bool = True,
+        thumbnails: bool = False,
+    ) -> dict:
+        """
+        Pages through the invoice database without loading the original images.
+        Args:
+            page (int): 1-based page number.
+            page_size (int): Invoices per page, capped at `invoice_store.max_page_size`.
+            filters (dict, optional): Any of `invoice_type`, `date_from`, `date_to` (YYYY-MM-DD, inclusive),
+                `min_amount`, `max_amount` and `keyword` (matches the project name or an invoice number prefix).
+            order_by (str): One of date, amount, invoice_number, invoice_type or created.
+            descending (bool): Sort order.
+            thumbnails (bool): Attach a JPEG `thumbnail` data URL to each invoice of the page.
+        Returns:
+            dict: `{"success": True, "total": int, "page": int, "page_size": int, "items": [...]}`.
+        """
+        try:
+            result = invoice_store.query(
+                page, page_size, **(filters or {}), order_by=order_by, descending=descending
+            )
+        except (InvoiceStoreError, TypeError, ValueError) as e:
+            return api_invoice_error(str(e)).to_dict()
+
+        if thumbnails:
+            thumbs = invoice_store.thumbnails(
+                [item["invoice_number"] for item in result["items"]]
+            )
+            for item in result["items"]:
+                thumb = thumbs.get(item["invoice_number"])
+                item["thumbnail"] = data_url("image/jpeg", thumb) if thumb else ""
+        return {"success": True, **result}
+
+    def _save_dialog(self, filename: str) -> Path | None:
+        """
+        Asks the user where to save a file. Returns None if the dialog was cancelled.
+        """
+        if not self._window:
+            return
+        import webview
 
-        img_ndarray = array(img)
-        if img_ndarray.size == 0:
-            return api_invoice_error("Image size is zero")
+        selected = self._window.create_file_dialog(
+            webview.SAVE_DIALOG, save_filename=filename
+        )
+        if isinstance(selected, (tuple, list)):
+            selected = selected[0] if selected else None
+        return Path(selected) if selected else None
 
-        result = ocr_pipline(img_ndarray)
+    def save_file(self, content: str, filename: str) -> dict:
+        """
+        Saves text content to a file chosen by the user in a save dialog.
+        Returns:
+            dict: `{"success": True, "message": path}`, or an error if the dialog was cancelled.
+        """
+        path = self._save_dialog(filename)
+        if path is None:
+            return {"success": False, "error": "已取消保存"}
+        try:
+            path.write_text(content, encoding="utf-8")
+        except OSError as e:
+            return api_invoice_error(f"保存失败: {e}").to_dict()
+        return {"success": True, "message": str(path)}
 
-        if isinstance(result, invoice_content):
-            return api_invoice_return(content=result)
+    def export_invoices(
+        self,
+        fmt: str = "xlsx",
+        filters: dict | None = None,
+        path: str | None = None,
+        order_by: str = "date",
+        descending: bool = False,
+    ) -> dict:
+        """
+        Exports the saved invoices, or a filtered subset, for reimbursement.
+        Invoices are streamed from the invoice database to the file, so memory use does not
+        grow with the number of invoices.
+        Args:
+            fmt (str): `csv`, `xlsx`, or `zip` for a reimbursement package holding `invoices.csv`
+                and every original image under `images/`.
+            filters (dict, optional): Same filters as `list_invoices`.
+            path (str, optional): Output file. A save dialog is shown when omitted.
+            order_by (str): Sort column, see `list_invoices`.
+            descending (bool): Sort order.
+        Returns:
+            dict: `{"success": True, "path": str, "count": int, "elapsed": float}`. Progress is
+                streamed to the front-end as `export_progress` events with `finished` and `total`.
+        """
+        if fmt not in export_formats:
+            return api_invoice_error(f"不支持的导出格式: {fmt}").to_dict()
+        target = Path(path) if path else self._save_dialog(f"发票.{fmt}")
+        if target is None:
+            return {"success": False, "error": "已取消导出"}
 
-        if isinstance(result, str):
-            return api_invoice_error(error=result)
+        def on_progress(finished: int, total: int):
+            self._emit(
+                "export_progress",
+                {"path": str(target), "finished": finished, "total": total},
+            )
 
-        return api_invoice_error(error="Unknow pipline result！请联系管理员！")
+        start = time.perf_counter()
+        try:
+            count = export_invoices(
+                target, fmt, filters, order_by, descending, progress=on_progress
+            )
+        except Exception as e:
+            log.exception(f"导出失败: {e}")
+            return api_invoice_error(f"导出失败: {e}").to_dict()
+        return {
+            "success": True,
+            "path": str(target),
+            "count": count,
+            "elapsed": time.perf_counter() - start,
+        }
@@ -0,0 +1,29 @@
+"""
+基准测试脚本的运行环境，必须在导入项目模块之前导入：
+使用仓库根目录的config.yaml和模型，缓存、数据库与性能记录写入临时目录，
+不会留在源码树中，也不会混入正常使用时的发票数据。
+"""
+
+import os
+import sys
+import atexit
+import shutil
+import tempfile
+from pathlib import Path
+
+root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(root))
+os.environ.setdefault("BXOCR_HOME", str(root))
+
+# 本次运行的临时目录
+work_dir = Path(tempfile.mkdtemp(prefix="bxocr-bench-"))
+
+from config import config
+
+config.cache.cache_dir = str(work_dir / "cache")
+config.vector_cache.path = str(work_dir / "cache" / "vectors.sqlite3")
+config.invoice_store.path = str(work_dir / "data" / "invoices.sqlite3")
+config.duplicate.path = str(work_dir / "data" / "image_hashes.sqlite3")
+config.metrics.metrics_dir = str(work_dir / "metrics")
+
+atexit.register(shutil.rmtree, work_dir, ignore_errors=True)
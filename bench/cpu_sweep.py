@@ -0,0 +1,214 @@
+"""
+在本机上搜索CPU推理的最佳设置：
+对工作进程数、每进程线程数和oneDNN开关的每种组合，同时启动对应数量的进程，各自加载模型后对样本图片运行visual_predict，
+比较总吞吐量。--write 会把最佳组合写回config.yaml的cpu与worker_pool节，保留文件中的注释。
+核心绑定按config.yaml中的cpu.pin_cores与cpu.cores进行。
+
+用法: python bench/cpu_sweep.py samples/ --workers 1 2 --threads 2 4 8 --write
+"""
+
+import sys
+import json
+import time
+import argparse
+import subprocess
+from pathlib import Path
+
+import bench_env  # noqa: F401  仓库根目录加入sys.path，运行产物写入临时目录
+
+from config import config
+from cpu import available_cores, parse_core_set
+from metrics import percentiles
+
+# 子进程输出中与父进程通信的行以此开头
+marker = "@cpu_sweep "
+
+
+def child(args):
+    """
+    子进程：按参数配置并加载模型，就绪后等待父进程的开始信号，输出一行JSON结果
+    """
+    config.cache.enabled = False
+    config.cpu.threads = args.child_threads
+    config.cpu.enable_mkldnn = args.child_mkldnn
+
+    from cpu import apply_cpu_settings
+
+    apply_cpu_settings(args.child_index, args.child_workers)
+
+    import model
+    from api import bytes_to_img, collect_img_paths, img_to_ndarray
+    from utils import visual_predict_args
+
+    pipeline = model.get_pipeline()
+    images = [
+        img_to_ndarray(bytes_to_img(Path(path).read_bytes()))
+        for path in collect_img_paths(args.paths)
+    ]
+    # 预热，oneDNN首次运行时需要编译算子
+    list(pipeline.visual_predict(input=images[:1], **visual_predict_args))
+
+    print(f"{marker}ready", flush=True)
+    sys.stdin.readline()
+
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for img in images:
+            item_start = time.perf_counter()
+            list(pipeline.visual_predict(input=[img], **visual_predict_args))
+            latencies.append(time.perf_counter() - item_start)
+    elapsed = time.perf_counter() - start
+    result = {"images": len(latencies), "elapsed": elapsed, "latencies": latencies}
+    print(f"{marker}{json.dumps(result)}", flush=True)
+
+
+def read_marked(process: subprocess.Popen) -> str | None:
+    """
+    读取子进程输出中下一行带标记的内容，Paddle等库自身的输出会被跳过
+    """
+    for line in process.stdout:
+        if line.startswith(marker):
+            return line[len(marker) :].strip()
+    return None
+
+
+def run(args, workers: int, threads: int, mkldnn: bool) -> dict | None:
+    """
+    同时启动workers个子进程，全部就绪后一起开始计时
+    :return: 总吞吐量与单张延迟分位数，有子进程失败时返回None
+    """
+    processes = [
+        subprocess.Popen(
+            [
+                sys.executable,
+                __file__,
+                *args.paths,
+                "--repeat",
+                str(args.repeat),
+                "--child-index",
+                str(index),
+                "--child-workers",
+                str(workers),
+                "--child-threads",
+                str(threads),
+                *(["--child-mkldnn"] if mkldnn else []),
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        for index in range(workers)
+    ]
+    try:
+        for process in processes:
+            if read_marked(process) != "ready":
+                return None
+        for process in processes:
+            process.stdin.write("go\n")
+            process.stdin.flush()
+        results = []
+        for process in processes:
+            line = read_marked(process)
+            if process.wait() != 0 or not line:
+                return None
+            results.append(json.loads(line))
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.kill()
+
+    stats = percentiles([value for result in results for value in result["latencies"]])
+    stats["throughput"] = sum(result["images"] / result["elapsed"] for result in results)
+    return stats
+
+
+def set_config_values(path: Path, section: str, values: dict):
+    """
+    修改config.yaml中某一节的值，只替换对应的行，保留注释与其他内容；
+    该节或键不存在时追加
+    """
+    lines = path.read_text(encoding="utf-8").splitlines()
+    remaining = dict(values)
+    start = next((i for i, line in enumerate(lines) if line.startswith(f"{section}:")), None)
+    if start is None:
+        lines += ["", f"{section}:"]
+        start = len(lines) - 1
+
+    end = start + 1
+    while end < len(lines) and (not lines[end].strip() or lines[end].startswith((" ", "#"))):
+        key = lines[end].strip().partition(":")[0]
+        if lines[end].startswith("  ") and key in remaining:
+            lines[end] = f"  {key}: {json.dumps(remaining.pop(key))}"
+        end += 1
+    # 追加到该节最后一个键之后，不包括下一节前的空行与注释
+    while end > start + 1 and (not lines[end - 1].strip() or lines[end - 1].startswith("#")):
+        end -= 1
+    lines[end:end] = [f"  {key}: {json.dumps(value)}" for key, value in remaining.items()]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("paths", nargs="+", help="样本图片或目录")
+    parser.add_argument("--workers", type=int, nargs="+", help="工作进程数，默认使用配置中的值")
+    parser.add_argument("--threads", type=int, nargs="+", help="每个进程的线程数，默认为1到可用核心数的2的幂")
+    parser.add_argument("--mkldnn", choices=["on", "off", "both"], default="both")
+    parser.add_argument("--repeat", type=int, default=2, help="每张图片识别次数")
+    parser.add_argument("--write", action="store_true", help="将最佳设置写回配置文件")
+    parser.add_argument(
+        "--config",
+        type=Path,
+        default=Path(__file__).resolve().parent.parent / "config.yaml",
+        help="写回的配置文件",
+    )
+    parser.add_argument("--child-index", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--child-workers", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--child-threads", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--child-mkldnn", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child_index is not None:
+        child(args)
+        return
+
+    cores = len(parse_core_set(config.cpu.cores) or available_cores())
+    workers_list = args.workers or [max(config.worker_pool.size, 1)]
+    threads_list = args.threads or [1 << i for i in range(cores.bit_length()) if 1 << i <= cores]
+    mkldnn_list = {"on": [True], "off": [False], "both": [True, False]}[args.mkldnn]
+
+    print(f"可用核心 {cores} 个")
+    print(f"{'进程':>4} {'线程':>4} {'oneDNN':>6} {'张/秒':>8} {'p50 s':>8} {'p90 s':>8}")
+    best = None
+    for workers in workers_list:
+        for threads in threads_list:
+            if workers * threads > cores:
+                continue
+            for mkldnn in mkldnn_list:
+                stats = run(args, workers, threads, mkldnn)
+                if stats is None:
+                    print(f"{workers:>4} {threads:>4} {str(mkldnn):>6} 运行失败")
+                    continue
+                print(
+                    f"{workers:>4} {threads:>4} {str(mkldnn):>6} {stats['throughput']:8.3f}"
+                    f" {stats['p50']:8.3f} {stats['p90']:8.3f}"
+                )
+                if best is None or stats["throughput"] > best[0]:
+                    best = (stats["throughput"], workers, threads, mkldnn)
+
+    if best is None:
+        print("没有成功的组合")
+        sys.exit(1)
+    throughput, workers, threads, mkldnn = best
+    print(f"\n最佳设置: {workers}个进程，每进程{threads}线程，oneDNN {mkldnn}，{throughput:.3f} 张/秒")
+
+    if args.write:
+        set_config_values(args.config, "cpu", {"threads": threads, "enable_mkldnn": mkldnn})
+        # 未指定--workers时没有比较进程数，保留原配置（为0时在界面进程中识别）
+        if args.workers:
+            set_config_values(args.config, "worker_pool", {"size": workers})
+        print(f"已写入 {args.config}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""
+离线运行完整识别管道的基准测试与准确度回归：
+对样本目录中的发票和火车票图片逐张识别，LLM请求由本地回放服务应答，
+输出各阶段耗时分位数、吞吐量、峰值内存和相对golden.json的字段准确度，并可与基线比较。
+
+样本目录结构:
+    corpus/
+        *.jpg / *.png ...    样本图片
+        golden.json          {"文件名": {"invoice_type": "普通发票", "date": "...", "amount": "...", ...}}
+        recordings.jsonl     回放服务的录制内容（--record 时生成）
+
+用法:
+    录制: python bench/ocr_suite.py corpus/ --record http://127.0.0.1:11434/v1
+    回放: python bench/ocr_suite.py corpus/ --save-baseline bench/baseline.json
+    比较: python bench/ocr_suite.py corpus/ --baseline bench/baseline.json
+"""
+
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+import bench_env  # noqa: F401  仓库根目录加入sys.path，运行产物写入临时目录
+
+from config import config
+
+# 必须在导入识别模块之前修改：关闭结果缓存，性能记录写到bench_env的临时目录
+config.cache.enabled = False
+config.metrics.enabled = True
+config.metrics.profile = False
+
+from replay_server import Recordings, ReplayServer
+
+
+def peak_rss_mb() -> float | None:
+    """
+    进程峰值常驻内存
+    """
+    try:
+        import resource
+    except ImportError:
+        return _windows_peak_rss_mb()
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为KB，macOS 为字节
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+
+def _windows_peak_rss_mb() -> float | None:
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [
+            ("cb", wintypes.DWORD),
+            ("PageFaultCount", wintypes.DWORD),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t),
+        ]
+
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    process = ctypes.windll.kernel32.GetCurrentProcess()
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(
+        process, ctypes.byref(counters), counters.cb
+    ):
+        return None
+    return counters.PeakWorkingSetSize / 1024 / 1024
+
+
+def normalize(value) -> str:
+    return str(value).strip().replace(" ", "").replace("￥", "").replace("¥", "")
+
+
+def field_accuracy(results: dict[str, dict], golden: dict[str, dict]) -> dict:
+    """
+    :param results: 文件名 -> 识别结果
+    :param golden: 文件名 -> 期望的invoice_content字段
+    :return: 每个字段的正确率，以及全部字段的总正确率
+    """
+    correct: dict[str, int] = {}
+    total: dict[str, int] = {}
+    for name, expected in golden.items():
+        result = results.get(name) or {}
+        content = result.get("content") or {}
+        for field, value in expected.items():
+            total[field] = total.get(field, 0) + 1
+            if result.get("success") and normalize(content.get(field, "")) == normalize(value):
+                correct[field] = correct.get(field, 0) + 1
+
+    fields = {field: correct.get(field, 0) / total[field] for field in total}
+    overall = sum(correct.values()) / sum(total.values()) if total else None
+    return {"fields": fields, "overall": overall}
+
+
+def compare(report: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    与基线比较，返回回退项。耗时以p50比较，超过基线(1 + tolerance)倍视为回退
+    """
+    regressions = []
+    for group in ("requests", "spans"):
+        for name, stats in report["metrics"][group].items():
+            base = baseline["metrics"][group].get(name)
+            if not base or not base.get("p50") or not stats.get("p50"):
+                continue
+            if stats["p50"] > base["p50"] * (1 + tolerance):
+                regressions.append(
+                    f"{name} p50 {base['p50']:.3f}s -> {stats['p50']:.3f}s"
+                )
+
+    if report["throughput"] < baseline["throughput"] * (1 - tolerance):
+        regressions.append(
+            f"吞吐量 {baseline['throughput']:.3f} -> {report['throughput']:.3f} 张/秒"
+        )
+
+    base_accuracy = baseline["accuracy"]["fields"]
+    for field, accuracy in report["accuracy"]["fields"].items():
+        if field in base_accuracy and accuracy < base_accuracy[field]:
+            regressions.append(
+                f"{field} 准确度 {base_accuracy[field]:.1%} -> {accuracy:.1%}"
+            )
+    return regressions
+
+
+def print_report(report: dict):
+    print(
+        f"\n推理配置档 {report['profile']}{'（高性能推理）' if report['enable_hpi'] else ''}，"
+        f"样本 {report['images']} 张，模型加载 {report['load_time']:.1f}s"
+    )
+    print(
+        f"总耗时 {report['elapsed']:.2f}s，吞吐量 {report['throughput']:.3f} 张/秒，"
+        f"峰值内存 {report['peak_rss_mb'] or 0:.0f} MB"
+    )
+    print(
+        f"LLM回放: 命中 {report['replay']['hits']}，未命中 {report['replay']['misses']}，"
+        f"新录制 {report['replay']['recorded']}"
+    )
+
+    print(f"\n{'阶段':<16}{'次数':>6}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}")
+    for group in ("requests", "spans"):
+        for name, stats in report["metrics"][group].items():
+            if not stats["count"]:
+                continue
+            print(
+                f"{name:<16}{stats['count']:>6}"
+                + "".join(f"{stats[q]:>9.3f}" for q in ("p50", "p90", "p99", "max"))
+            )
+
+    if gates := report["metrics"].get("gates"):
+        print("\n可跳过阶段")
+        for stage, decisions in gates.items():
+            print(f"  {stage:<20}" + "，".join(f"{k} {v}" for k, v in decisions.items()))
+
+    accuracy = report["accuracy"]
+    if accuracy["overall"] is not None:
+        print(f"\n字段准确度（总体 {accuracy['overall']:.1%}）")
+        for field, value in accuracy["fields"].items():
+            print(f"  {field:<16}{value:>8.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("corpus", type=Path, help="样本目录")
+    parser.add_argument("--recordings", type=Path, help="录制文件，默认为样本目录下的recordings.jsonl")
+    parser.add_argument("--record", metavar="UPSTREAM", help="录制模式，LLM请求转发到该地址")
+    parser.add_argument("--repeat", type=int, default=1, help="每张图片识别次数")
+    parser.add_argument("--baseline", type=Path, help="与该基线报告比较，有回退时以非零状态退出")
+    parser.add_argument("--save-baseline", type=Path, help="将本次报告保存为基线")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="耗时与吞吐量允许的相对波动")
+    parser.add_argument("--profile", help="推理配置档，默认使用config.yaml中的设置")
+    parser.add_argument("--hpi", action="store_true", help="启用高性能推理插件")
+    args = parser.parse_args()
+
+    if args.profile:
+        config.inference.profile = args.profile
+    if args.hpi:
+        config.inference.enable_hpi = True
+
+    server = ReplayServer(
+        Recordings(args.recordings or args.corpus / "recordings.jsonl"), args.record
+    )
+    server.start()
+    for bot_config in (
+        config.retriever_config,
+        config.mllm_chat_bot_config,
+        config.chat_bot_config,
+    ):
+        bot_config.base_url = server.base_url
+
+    import model
+    from api import collect_img_paths, ocr_img_bytes
+    from metrics import metrics_summary
+
+    img_paths = collect_img_paths([str(args.corpus)])
+    if not img_paths:
+        parser.error(f"样本目录中没有图片: {args.corpus}")
+    golden_path = args.corpus / "golden.json"
+    golden = json.loads(golden_path.read_text(encoding="utf-8")) if golden_path.exists() else {}
+
+    start = time.perf_counter()
+    model.get_pipeline()
+    load_time = time.perf_counter() - start
+
+    results: dict[str, dict] = {}
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for path in img_paths:
+            result = ocr_img_bytes(Path(path).read_bytes()).to_dict()
+            results[Path(path).name] = result
+            if not result["success"]:
+                print(f"识别失败 {Path(path).name}: {result.get('error')}")
+    elapsed = time.perf_counter() - start
+    server.stop()
+
+    count = len(img_paths) * args.repeat
+    report = {
+        "profile": model.profile_name,
+        "enable_hpi": config.inference.enable_hpi,
+        "images": count,
+        "load_time": load_time,
+        "elapsed": elapsed,
+        "throughput": count / elapsed if elapsed > 0 else 0.0,
+        "peak_rss_mb": peak_rss_mb(),
+        "replay": {
+            "hits": server.hits,
+            "misses": server.misses,
+            "recorded": server.recorded,
+        },
+        "metrics": metrics_summary(limit=count),
+        "accuracy": field_accuracy(results, golden),
+        "results": results,
+    }
+    print_report(report)
+
+    if args.save_baseline:
+        args.save_baseline.write_text(
+            json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8"
+        )
+        print(f"\n基线已保存: {args.save_baseline}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        if regressions := compare(report, baseline, args.tolerance):
+            print("\n相对基线出现回退:")
+            for item in regressions:
+                print(f"  {item}")
+            sys.exit(1)
+        print("\n与基线相比没有回退")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+比较不同预处理配置下OCR的延迟与准确度：
+以关闭预处理、原始分辨率的OCR文字为基准，计算各配置的文字相似度和visual_predict耗时。
+不调用LLM，只需要本地OCR模型。
+
+用法: python bench/preprocess.py samples/ --max-side 0 2048 1600 1280 --repeat 1
+"""
+
+import time
+import argparse
+from difflib import SequenceMatcher
+
+import bench_env  # noqa: F401  仓库根目录加入sys.path，运行产物写入临时目录
+
+from PIL import Image
+from numpy import array
+
+from api import collect_img_paths
+from config import config
+from model import get_pipeline
+from preprocess import preprocess_image
+from utils import visual_predict_args, visual_text
+
+
+def run(img: Image.Image, repeat: int) -> tuple[float, float, str]:
+    """
+    :return: (预处理耗时ms, visual_predict平均耗时ms, OCR文字)
+    """
+    start = time.perf_counter()
+    img_ndarray = array(preprocess_image(img))
+    prepare = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        visual_info_list = [
+            res["visual_info"]
+            for res in get_pipeline().visual_predict(
+                input=img_ndarray, **visual_predict_args
+            )
+        ]
+    predict = (time.perf_counter() - start) / repeat * 1000
+    return prepare, predict, visual_text(visual_info_list)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("paths", nargs="+", help="样本图片或目录")
+    parser.add_argument(
+        "--max-side",
+        type=int,
+        nargs="+",
+        default=[0, 2048, 1600, 1280],
+        help="待比较的工作分辨率，0表示不缩小",
+    )
+    parser.add_argument("--no-crop", action="store_true", help="关闭自动裁剪")
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    images = [Image.open(path) for path in collect_img_paths(args.paths)]
+    if not images:
+        parser.error("没有找到样本图片")
+    get_pipeline()
+
+    # 基准：关闭预处理
+    config.preprocess.enabled = False
+    baseline = [run(img.convert("RGB"), 1)[2] for img in images]
+
+    config.preprocess.enabled = True
+    config.preprocess.auto_crop = not args.no_crop
+    print(f"样本 {len(images)} 张，重复 {args.repeat} 次")
+    print(f"{'max_side':>8} {'预处理ms':>10} {'识别ms':>10} {'文字相似度':>10}")
+    for max_side in args.max_side:
+        config.preprocess.max_side = max_side
+        prepare = predict = similarity = 0.0
+        for img, text in zip(images, baseline):
+            p, q, result = run(img, args.repeat)
+            prepare += p
+            predict += q
+            similarity += SequenceMatcher(None, text, result).ratio()
+        n = len(images)
+        print(
+            f"{max_side or '原图':>8} {prepare / n:10.1f} {predict / n:10.1f} {similarity / n:10.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
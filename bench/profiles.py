@@ -0,0 +1,87 @@
+"""
+比较各推理配置档的延迟、峰值内存和字段准确度：
+每个配置档在单独的进程中运行bench/ocr_suite.py，避免模型与内存占用互相影响，最后汇总为一张表。
+LLM请求由样本目录中的录制内容回放，需要先用ocr_suite.py --record录制。
+
+用法: python bench/profiles.py corpus/ --profiles accurate fast tiny --hpi
+"""
+
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+
+import bench_env  # noqa: F401  仓库根目录加入sys.path，运行产物写入临时目录
+
+from model import inference_profiles
+
+ocr_suite = Path(__file__).resolve().parent / "ocr_suite.py"
+
+
+def run_profile(corpus: Path, profile: str, hpi: bool, repeat: int) -> dict | None:
+    with tempfile.TemporaryDirectory() as temp:
+        report_path = Path(temp) / "report.json"
+        command = [
+            sys.executable,
+            str(ocr_suite),
+            str(corpus),
+            "--profile",
+            profile,
+            "--repeat",
+            str(repeat),
+            "--save-baseline",
+            str(report_path),
+        ]
+        if hpi:
+            command.append("--hpi")
+        if subprocess.run(command).returncode != 0 or not report_path.exists():
+            return None
+        return json.loads(report_path.read_text(encoding="utf-8"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("corpus", type=Path, help="样本目录，结构见ocr_suite.py")
+    parser.add_argument(
+        "--profiles",
+        nargs="+",
+        default=list(inference_profiles),
+        choices=list(inference_profiles),
+    )
+    parser.add_argument("--hpi", action="store_true", help="同时测试启用高性能推理插件的版本")
+    parser.add_argument("--repeat", type=int, default=1, help="每张图片识别次数")
+    args = parser.parse_args()
+
+    runs = [(profile, False) for profile in args.profiles]
+    if args.hpi:
+        runs += [(profile, True) for profile in args.profiles]
+
+    rows = []
+    for profile, hpi in runs:
+        name = f"{profile}+hpi" if hpi else profile
+        print(f"\n===== {name} =====")
+        report = run_profile(args.corpus, profile, hpi, args.repeat)
+        if report is None:
+            print(f"{name} 运行失败")
+            continue
+        rows.append((name, report))
+
+    print(
+        f"\n{'配置档':<14}{'加载s':>8}{'识别p50 s':>11}{'识别p90 s':>11}"
+        f"{'张/秒':>8}{'内存MB':>8}{'准确度':>8}"
+    )
+    for name, report in rows:
+        visual = report["metrics"]["spans"].get("visual_predict") or {}
+        accuracy = report["accuracy"]["overall"]
+        print(
+            f"{name:<14}{report['load_time']:>8.1f}"
+            f"{visual.get('p50', 0):>11.3f}{visual.get('p90', 0):>11.3f}"
+            f"{report['throughput']:>8.3f}{report['peak_rss_mb'] or 0:>8.0f}"
+            f"{f'{accuracy:.1%}' if accuracy is not None else '-':>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+比较发票二维码识别的命中率与延迟：
+旧方法在原图上识别一次且要求恰好一个二维码，新方法依次尝试角落区域、缩放和二值化的变体。
+不需要OCR模型和LLM。--augment 会为每张样本额外生成缩小、旋转、低对比度和高压缩的版本。
+
+用法: python bench/qr.py samples/ --augment --repeat 3
+"""
+
+import io
+import time
+import argparse
+
+import bench_env  # noqa: F401  仓库根目录加入sys.path，运行产物写入临时目录
+
+from PIL import Image, ImageEnhance
+
+from api import collect_img_paths
+from metrics import percentiles
+from qr import decode_qrcode, find_invoice_qrcode
+from utils import invoice_verify
+
+
+def legacy(img: Image.Image) -> list[str] | None:
+    """
+    改动前的识别方法
+    """
+    results = decode_qrcode(img)
+    if len(results) != 1:
+        return None
+    return invoice_verify(results[0]) or None
+
+
+def jpeg(img: Image.Image, quality: int) -> Image.Image:
+    buffer = io.BytesIO()
+    img.convert("RGB").save(buffer, format="JPEG", quality=quality)
+    buffer.seek(0)
+    return Image.open(buffer)
+
+
+def augment(img: Image.Image) -> dict[str, Image.Image]:
+    img = img.convert("RGB")
+    small = img.resize((img.width // 3, img.height // 3), Image.BILINEAR)
+    return {
+        "original": img,
+        "small": small,
+        "rotated": img.rotate(12, expand=True, fillcolor=(255, 255, 255)),
+        "low_contrast": ImageEnhance.Contrast(img).enhance(0.35),
+        "jpeg_q20": jpeg(small, 20),
+    }
+
+
+def measure(method, img: Image.Image, repeat: int) -> tuple[bool, float]:
+    """
+    :return: (是否找到有效二维码, 平均耗时s)
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        found = method(img) is not None
+    return found, (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("paths", nargs="+", help="样本图片或目录")
+    parser.add_argument("--augment", action="store_true", help="加入变形后的样本")
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    samples: dict[str, list[Image.Image]] = {}
+    for path in collect_img_paths(args.paths):
+        img = Image.open(path)
+        img.load()
+        variants = augment(img) if args.augment else {"original": img}
+        for kind, variant in variants.items():
+            samples.setdefault(kind, []).append(variant)
+    if not samples:
+        parser.error("没有找到样本图片")
+
+    print(f"{'样本':>14} {'方法':>8} {'命中率':>8} {'p50 ms':>8} {'p90 ms':>8} {'max ms':>8}")
+    for kind, images in samples.items():
+        for name, method in (("legacy", legacy), ("new", find_invoice_qrcode)):
+            results = [measure(method, img, args.repeat) for img in images]
+            hits = sum(found for found, _ in results)
+            stats = percentiles([elapsed for _, elapsed in results])
+            print(
+                f"{kind:>14} {name:>8} {hits / len(images):8.1%}"
+                f" {stats['p50'] * 1000:8.1f} {stats['p90'] * 1000:8.1f}"
+                f" {stats['max'] * 1000:8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+离线基准测试使用的OpenAI兼容服务，回放录制的LLM响应：
+- POST /v1/chat/completions：多模态LLM与对话LLM
+- POST /v1/embeddings：向量模型
+
+请求体（JSON，键排序后）的哈希作为录制键。录制模式下请求会转发到上游服务并保存响应；
+回放模式下未录制的对话请求返回错误，未录制的向量请求返回由内容哈希生成的确定性向量。
+图片预处理或提示词变化后请求体也会变化，需要重新录制。
+
+单独运行: python bench/replay_server.py --recordings bench/data/recordings.jsonl --port 18080
+录制:     python bench/replay_server.py --recordings ... --upstream http://127.0.0.1:11434/v1
+"""
+
+import json
+import time
+import hashlib
+import argparse
+import threading
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from loguru import logger as log
+
+# 没有录制时生成的向量维度
+fallback_embedding_dim = 256
+
+
+def request_key(path: str, body: dict) -> str:
+    data = json.dumps(body, sort_keys=True, ensure_ascii=False).encode()
+    return hashlib.sha256(path.encode() + b"\0" + data).hexdigest()
+
+
+def fallback_embedding(item) -> list[float]:
+    """
+    由输入内容生成的确定性单位向量，相同内容得到相同向量
+    """
+    seed = json.dumps(item, ensure_ascii=False).encode()
+    values = []
+    counter = 0
+    while len(values) < fallback_embedding_dim:
+        digest = hashlib.sha256(seed + counter.to_bytes(4, "little")).digest()
+        values += [b / 255 - 0.5 for b in digest]
+        counter += 1
+    norm = sum(v * v for v in values[:fallback_embedding_dim]) ** 0.5
+    return [v / norm for v in values[:fallback_embedding_dim]]
+
+
+class Recordings:
+    """
+    以JSONL保存的录制内容，每行为 {"key", "path", "response"}
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._items: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        if path.exists():
+            for line in path.read_text(encoding="utf-8").splitlines():
+                if line.strip():
+                    item = json.loads(line)
+                    self._items[item["key"]] = item["response"]
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def get(self, key: str) -> dict | None:
+        return self._items.get(key)
+
+    def put(self, key: str, path: str, response: dict):
+        with self._lock:
+            self._items[key] = response
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(
+                    json.dumps(
+                        {"key": key, "path": path, "response": response},
+                        ensure_ascii=False,
+                    )
+                    + "\n"
+                )
+
+
+class ReplayServer:
+    def __init__(
+        self,
+        recordings: Recordings,
+        upstream: str | None = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ):
+        self.recordings = recordings
+        self.upstream = upstream.rstrip("/") if upstream else None
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    body = json.loads(self.rfile.read(length) or b"{}")
+                except json.JSONDecodeError:
+                    self.reply(400, {"error": {"message": "invalid json"}})
+                    return
+                status, response = server.handle(self.path, body)
+                self.reply(status, response)
+
+            def reply(self, status: int, response: dict):
+                data = json.dumps(response, ensure_ascii=False).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        mode = f"录制，上游 {self.upstream}" if self.upstream else "回放"
+        log.info(f"LLM回放服务已启动: {self.base_url}（{mode}，已有{len(self.recordings)}条录制）")
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def handle(self, path: str, body: dict) -> tuple[int, dict]:
+        # 去掉 /v1 前缀，上游地址本身已包含
+        endpoint = path.split("?")[0].removeprefix("/v1")
+        if endpoint not in ("/chat/completions", "/embeddings"):
+            return 404, {"error": {"message": f"unsupported endpoint: {path}"}}
+
+        key = request_key(endpoint, body)
+        if (response := self.recordings.get(key)) is not None:
+            self.hits += 1
+            return 200, response
+
+        if self.upstream:
+            try:
+                response = self.forward(endpoint, body)
+            except (urllib.error.URLError, OSError) as e:
+                return 502, {"error": {"message": f"upstream error: {e}"}}
+            self.recordings.put(key, endpoint, response)
+            self.recorded += 1
+            return 200, response
+
+        self.misses += 1
+        if endpoint == "/embeddings":
+            return 200, self.embeddings(body)
+        log.warning(f"没有录制的LLM请求: {key[:12]}，模型 {body.get('model')}")
+        return 500, {"error": {"message": f"no recording for request {key}"}}
+
+    def forward(self, endpoint: str, body: dict) -> dict:
+        request = urllib.request.Request(
+            self.upstream + endpoint,
+            data=json.dumps(body).encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=600) as response:
+            return json.loads(response.read())
+
+    @staticmethod
+    def embeddings(body: dict) -> dict:
+        inputs = body.get("input", [])
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        return {
+            "object": "list",
+            "model": body.get("model"),
+            "data": [
+                {"object": "embedding", "index": i, "embedding": fallback_embedding(item)}
+                for i, item in enumerate(inputs)
+            ],
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--recordings", type=Path, required=True)
+    parser.add_argument("--upstream", help="录制模式下转发到的上游地址，例如 http://127.0.0.1:11434/v1")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18080)
+    args = parser.parse_args()
+
+    server = ReplayServer(Recordings(args.recordings), args.upstream, args.host, args.port)
+    server.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+比较静态文件服务的吞吐量与延迟：
+旧方法单线程处理请求，每次从磁盘读取且不压缩；新方法使用多线程服务器，文件预先载入内存并按需返回gzip/br版本。
+不指定目录时生成与前端构建产物大小相近的模拟文件。
+
+用法: python bench/static_server.py --resource resource/ --clients 8 --requests 400
+"""
+
+import os
+import time
+import random
+import string
+import argparse
+import mimetypes
+import tempfile
+import threading
+import urllib.request
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.simple_server import make_server, WSGIRequestHandler, WSGIServer
+
+import bench_env  # noqa: F401  仓库根目录加入sys.path，运行产物写入临时目录
+
+from metrics import percentiles
+from static_server import StaticFiles, ThreadingWSGIServer
+
+
+class SilentHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def legacy_app(root: Path):
+    """
+    改动前的静态文件服务
+    """
+
+    def app(environ, start_response):
+        path = environ["PATH_INFO"].lstrip("/") or "index.html"
+        file_path = (root / path).resolve()
+        if not file_path.is_file():
+            start_response("404 Not Found", [])
+            return [b"404 Not Found"]
+        mime_type, _ = mimetypes.guess_type(str(file_path))
+        content = file_path.read_bytes()
+        start_response(
+            "200 OK",
+            [
+                ("Content-Type", mime_type or "application/octet-stream"),
+                ("Content-Length", str(len(content))),
+            ],
+        )
+        return [content]
+
+    return app
+
+
+def fake_source(size: int) -> bytes:
+    """
+    类似压缩后JS代码的文本，压缩率与真实构建产物接近
+    """
+    words = ["function", "return", "const", "this", "null", "=>", "{", "}", "(", ")"]
+    words += ["".join(random.choices(string.ascii_letters, k=6)) for _ in range(400)]
+    text = " ".join(random.choices(words, k=size // 5))
+    return text.encode()[:size]
+
+
+def make_resource(root: Path):
+    random.seed(0)
+    (root / "assets").mkdir()
+    (root / "index.html").write_bytes(fake_source(2 * 1024))
+    (root / "assets" / "index-a1b2c3.js").write_bytes(fake_source(900 * 1024))
+    (root / "assets" / "index-d4e5f6.css").write_bytes(fake_source(60 * 1024))
+    (root / "pdf.worker.min.mjs").write_bytes(fake_source(1000 * 1024))
+    (root / "assets" / "logo-0a1b2c.png").write_bytes(os.urandom(40 * 1024))
+
+
+def serve(app, server_class):
+    httpd = make_server(
+        "127.0.0.1", 0, app, server_class=server_class, handler_class=SilentHandler
+    )
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
+
+
+def fetch(url: str) -> tuple[float, int]:
+    """
+    :return: (耗时s, 传输的字节数)
+    """
+    request = urllib.request.Request(url, headers={"Accept-Encoding": "gzip, br"})
+    start = time.perf_counter()
+    with urllib.request.urlopen(request) as response:
+        size = len(response.read())
+    return time.perf_counter() - start, size
+
+
+def run(base_url: str, paths: list[str], clients: int, requests: int) -> dict:
+    urls = [base_url + path for path in random.choices(paths, k=requests)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(clients) as executor:
+        results = list(executor.map(fetch, urls))
+    elapsed = time.perf_counter() - start
+    stats = percentiles([latency for latency, _ in results])
+    stats["throughput"] = requests / elapsed
+    stats["bytes"] = sum(size for _, size in results)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--resource", type=Path, help="前端构建产物目录")
+    parser.add_argument("--clients", type=int, default=8, help="并发客户端数量")
+    parser.add_argument("--requests", type=int, default=400)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp:
+        root = args.resource
+        if root is None:
+            root = Path(temp)
+            make_resource(root)
+        paths = [
+            path.relative_to(root).as_posix()
+            for path in root.rglob("*")
+            if path.is_file() and path.suffix not in (".br", ".gz")
+        ]
+
+        print(f"{len(paths)}个文件, {args.clients}个并发客户端, {args.requests}次请求")
+        print(f"{'方法':>8} {'req/s':>8} {'p50 ms':>8} {'p90 ms':>8} {'max ms':>8} {'传输 MB':>8}")
+        for name, app, server_class in (
+            ("legacy", legacy_app(root), WSGIServer),
+            ("new", StaticFiles(root), ThreadingWSGIServer),
+        ):
+            httpd = serve(app, server_class)
+            random.seed(0)
+            stats = run(
+                f"http://127.0.0.1:{httpd.server_port}/",
+                paths,
+                args.clients,
+                args.requests,
+            )
+            httpd.shutdown()
+            httpd.server_close()
+            print(
+                f"{name:>8} {stats['throughput']:8.1f}"
+                f" {stats['p50'] * 1000:8.1f} {stats['p90'] * 1000:8.1f}"
+                f" {stats['max'] * 1000:8.1f} {stats['bytes'] / 1024 / 1024:8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
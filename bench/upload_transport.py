@@ -0,0 +1,80 @@
+"""
+比较两种图片传输方式的延迟和峰值内存：
+- base64：前端生成 data URL，经 pywebview 桥以 JSON 传输，后端用 get_img_bytes 解码
+- upload：前端将原始字节 POST 到本地服务器的 /api/upload，桥上只传输句柄
+
+用法: python bench/upload_transport.py --size-mb 8 --repeat 10
+"""
+
+import os
+import json
+import time
+import base64
+import argparse
+import threading
+import tracemalloc
+import urllib.request
+from wsgiref.simple_server import make_server, WSGIRequestHandler
+
+import bench_env  # noqa: F401  仓库根目录加入sys.path，运行产物写入临时目录
+
+from api import get_img_bytes
+from upload import upload_app, upload_store
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def measure(func, repeat: int) -> tuple[float, float]:
+    """
+    :return: (平均耗时ms, 峰值内存MB)
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    elapsed = (time.perf_counter() - start) / repeat * 1000
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--size-mb", type=float, default=8, help="模拟图片大小")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    # 随机字节无法压缩，接近扫描件 PNG/JPEG 的特性
+    img_bytes = os.urandom(int(args.size_mb * 1024 * 1024))
+
+    def base64_path():
+        data_url = "data:image/png;base64," + base64.b64encode(img_bytes).decode()
+        # pywebview 通过 JSON 序列化 JS 调用参数
+        message = json.loads(json.dumps({"args": [data_url]}))
+        assert get_img_bytes(message["args"][0]) == img_bytes
+
+    httpd = make_server("127.0.0.1", 0, upload_app, handler_class=QuietHandler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{httpd.server_port}/api/upload"
+
+    def upload_path():
+        request = urllib.request.Request(url, data=img_bytes, method="POST")
+        with urllib.request.urlopen(request) as response:
+            handle = json.loads(response.read())["handle"]
+        message = json.loads(json.dumps({"args": [handle]}))
+        assert get_img_bytes(message["args"][0]) == img_bytes
+        upload_store.remove(handle)
+
+    print(f"图片大小: {args.size_mb} MB, 重复 {args.repeat} 次")
+    for name, func in [("base64", base64_path), ("upload", upload_path)]:
+        elapsed, peak = measure(func, args.repeat)
+        print(f"{name:>8}: {elapsed:8.2f} ms/次, 峰值内存 {peak:8.2f} MB")
+
+    httpd.shutdown()
+
+
+if __name__ == "__main__":
+    main()
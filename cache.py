@@ -0,0 +1,141 @@
+import os
+import json
+import pickle
+import hashlib
+import threading
+from pathlib import Path
+from typing import Any
+
+from loguru import logger as log
+
+from config import config, self_dir
+
+
+def cache_key(*parts: Any) -> str:
+    """
+    计算缓存键，parts中的每一部分都会被序列化后参与哈希
+    :param parts: 字节串或可JSON序列化的对象
+    :return: 十六进制哈希字符串
+    """
+    sha = hashlib.sha256()
+    for part in parts:
+        if not isinstance(part, bytes):
+            part = json.dumps(part, sort_keys=True, ensure_ascii=False).encode()
+        sha.update(len(part).to_bytes(8, "little"))
+        sha.update(part)
+    return sha.hexdigest()
+
+
+class ResultCache:
+    """
+    基于文件的持久化缓存，按阶段分目录存储，总大小超过上限时按最近使用时间淘汰。
+    多个工作进程共用同一个缓存目录，各进程只能估计总大小，
+    估计值超过上限时重新统计磁盘上的实际大小再淘汰。
+    """
+
+    def __init__(self, cache_dir: Path, max_size: int):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self._lock = threading.Lock()
+
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        entries = self._scan()
+        # 上次统计的总大小加上本进程之后写入的大小
+        self._total_size = sum(size for _, size, _ in entries)
+        log.debug(
+            f"缓存目录: {self.cache_dir}，已有{len(entries)}项，"
+            f"共{self._total_size / 1024 / 1024:.2f} MB"
+        )
+
+    def _path(self, stage: str, key: str) -> Path:
+        return self.cache_dir / stage / f"{key}.pkl"
+
+    def _scan(self) -> list[tuple[float, int, Path]]:
+        """
+        统计磁盘上的缓存文件
+        :return: 按修改时间从早到晚排列的(修改时间, 大小, 路径)
+        """
+        entries = []
+        for path in self.cache_dir.glob("*/*.pkl"):
+            try:
+                stat = path.stat()
+            except OSError:
+                # 已被其他进程删除
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return sorted(entries)
+
+    def get(self, stage: str, key: str) -> Any | None:
+        path = self._path(stage, key)
+        try:
+            with open(path, "rb") as f:
+                value = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            log.warning(f"读取缓存失败，已丢弃: {path}: {e}")
+            path.unlink(missing_ok=True)
+            return None
+
+        # 更新修改时间，作为LRU淘汰依据
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        log.debug(f"缓存命中: {stage}/{key[:12]}")
+        return value
+
+    def put(self, stage: str, key: str, value: Any):
+        path = self._path(stage, key)
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_size:
+            log.warning(f"缓存项过大，跳过缓存: {stage}/{key[:12]}")
+            return
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            log.warning(f"写入缓存失败: {path}: {e}")
+            tmp_path.unlink(missing_ok=True)
+            return
+
+        with self._lock:
+            self._total_size += len(data)
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            if self._total_size <= self.max_size:
+                return
+
+            # 其他进程写入和淘汰的文件都不在估计值中，以磁盘上的实际大小为准
+            entries = self._scan()
+            total = sum(size for _, size, _ in entries)
+            if total > self.max_size:
+                # 一次淘汰到上限的90%，避免每次写入都触发
+                target = self.max_size * 0.9
+                for _, size, path in entries:
+                    if total <= target:
+                        break
+                    log.debug(f"缓存淘汰: {path.parent.name}/{path.stem[:12]}")
+                    path.unlink(missing_ok=True)
+                    total -= size
+            self._total_size = total
+
+    def clear(self):
+        with self._lock:
+            for _, _, path in self._scan():
+                path.unlink(missing_ok=True)
+            self._total_size = 0
+
+
+result_cache: ResultCache | None = None
+if config.cache.enabled:
+    result_cache = ResultCache(
+        cache_dir=self_dir.joinpath(config.cache.cache_dir).resolve(),
+        max_size=int(config.cache.max_size_mb * 1024 * 1024),
+    )
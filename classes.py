@@ -1,3 +1,8 @@
+from typing import List
+
+from numpy import ndarray
+
+
 class invoice_content:
     date: str
     program: str
@@ -36,15 +41,21 @@ class invoice_content:
 class api_invoice_return:
     success = True
     content: invoice_content
+    documents: List[dict] | None
 
-    def __init__(self, content: invoice_content):
+    def __init__(self, content: invoice_content, documents: List[dict] | None = None):
         self.content = content
+        # 一张图片中有多张票据时，每张票据的结果，content为其中第一张识别成功的
+        self.documents = documents
 
     def to_dict(self):
-        return {
+        result = {
             "success": self.success,
             "content": self.content.to_dict(),
         }
+        if self.documents is not None:
+            result["documents"] = self.documents
+        return result
 
 
 class api_invoice_error:
@@ -59,3 +70,29 @@ class api_invoice_error:
             "success": self.success,
             "error": self.error,
         }
+
+
+class ocr_image:
+    """
+    送入批量识别管道的单张图片
+    """
+
+    img_ndarray: ndarray
+    img_hash: str | None
+    qr_codes: List[str] | None
+    visual_info_list: List[dict] | None
+
+    def __init__(
+        self,
+        img_ndarray: ndarray,
+        img_hash: str | None = None,
+        qr_codes: List[str] | None = None,
+        visual_info_list: List[dict] | None = None,
+    ):
+        self.img_ndarray = img_ndarray
+        # 图片内容的哈希，为None时不使用缓存
+        self.img_hash = img_hash
+        # 通过invoice_verify校验的二维码内容
+        self.qr_codes = qr_codes
+        # 已知的OCR结果（例如PDF文字层），提供时跳过visual_predict
+        self.visual_info_list = visual_info_list
@@ -0,0 +1,69 @@
+import sys
+import json
+import time
+import argparse
+import threading
+
+from loguru import logger as log
+from log import log_init
+
+log_init()
+
+from config import config
+from api import batch_ocr
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="BxOCR 命令行批量识别工具")
+    parser.add_argument("paths", nargs="+", help="图片文件或包含图片的文件夹")
+    parser.add_argument(
+        "-o", "--output", help="识别结果输出文件(JSON Lines)，默认输出到标准输出"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=config.batch.batch_size,
+        help="每批送入visual_predict的图片数量",
+    )
+    parser.add_argument(
+        "--llm-concurrency",
+        type=int,
+        default=config.batch.llm_concurrency,
+        help="同时进行的LLM请求数量",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    config.batch.batch_size = args.batch_size
+    config.batch.llm_concurrency = args.llm_concurrency
+
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+
+    lock = threading.Lock()
+
+    def on_result(index: int, total: int, result: dict):
+        with lock:
+            output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+        log.info(f"[{index + 1}/{total}] {result['source']}: {result['success']}")
+
+    start = time.perf_counter()
+    try:
+        results = batch_ocr(args.paths, callback=on_result)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    elapsed = time.perf_counter() - start
+
+    succeeded = sum(1 for result in results if result.get("success"))
+    log.info(
+        f"识别完成: {succeeded}/{len(results)} 成功，耗时 {elapsed:.2f}s，"
+        f"吞吐量 {len(results) / elapsed if elapsed > 0 else 0:.3f} 张/秒"
+    )
+    return 0 if succeeded == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,4 @@
+import os
 import sys
 from pathlib import Path
 from typing import Optional
@@ -6,6 +7,9 @@ import yaml
 
 self_exe = Path(sys.argv[0]).resolve()
 self_dir = self_exe.parent
+# 从其他目录运行的脚本（例如bench/中的基准测试）通过该变量指定程序目录
+if home := os.environ.get("BXOCR_HOME"):
+    self_dir = Path(home).resolve()
 
 
 def is_debug() -> bool:
@@ -27,6 +31,9 @@ def is_debug() -> bool:
 
 default_config = {
     "model_dir": "model/",
+    "qr_fast_path": True,
+    "rule_extraction": True,
+    "speculative_mllm": True,
     "retriever_config": {
         "module_name": "retriever",
         "model_name": "zyw0605688/gte-large-zh:latest",
@@ -48,6 +55,92 @@ default_config = {
         "api_type": "openai",
         "api_key": "null",
     },
+    "batch": {
+        "batch_size": 4,
+        "llm_concurrency": 2,
+    },
+    "cache": {
+        "enabled": True,
+        "cache_dir": "cache/",
+        "max_size_mb": 512,
+    },
+    "worker_pool": {
+        "size": 0,
+        "job_timeout": 300,
+    },
+    "pdf": {
+        "dpi": 200,
+        "render_workers": 2,
+        "min_text_chars": 20,
+    },
+    "preprocess": {
+        "enabled": True,
+        "max_side": 2048,
+        "mllm_max_side": 1024,
+        "grayscale": False,
+        "auto_crop": True,
+        "crop_margin": 16,
+    },
+    "metrics": {
+        "enabled": True,
+        "metrics_dir": "metrics/",
+        "max_size_mb": 16,
+        "backups": 3,
+        "window": 1000,
+        "profile": False,
+    },
+    "llm_client": {
+        "enabled": True,
+        "max_connections": 8,
+        "keepalive_expiry": 60,
+        "connect_timeout": 5,
+        "max_retries": 3,
+        "backoff": 0.5,
+        "retriever_concurrency": 4,
+        "retriever_timeout": 60,
+        "mllm_concurrency": 2,
+        "mllm_timeout": 300,
+        "chat_concurrency": 2,
+        "chat_timeout": 120,
+        "embedding_batch_size": 64,
+        "embedding_batch_wait_ms": 20,
+    },
+    "vector_cache": {
+        "enabled": True,
+        "path": "cache/vectors.sqlite3",
+        "max_size_mb": 256,
+    },
+    "invoice_store": {
+        "path": "data/invoices.sqlite3",
+        "thumbnail_size": 256,
+        "max_page_size": 200,
+    },
+    "duplicate": {
+        "enabled": True,
+        "path": "data/image_hashes.sqlite3",
+        "threshold": 16,
+        "exact_threshold": 4,
+    },
+    "inference": {
+        "profile": "accurate",
+        "enable_hpi": False,
+    },
+    "cpu": {
+        "threads": 0,
+        "enable_mkldnn": True,
+        "pin_cores": False,
+        "cores": "",
+    },
+    "table_recognition": {
+        "gating": True,
+        "document_types": {"train_ticket": False},
+    },
+    "segmentation": {
+        "enabled": False,
+        "gap": 0.03,
+        "min_area": 0.02,
+        "max_documents": 12,
+    },
 }
 
 
@@ -74,11 +167,246 @@ class BotConfig:
         self.base_url = base_url
 
 
+class BatchConfig:
+    batch_size: int
+    llm_concurrency: int
+
+    def __init__(self, batch_size: int, llm_concurrency: int):
+        self.batch_size = batch_size
+        self.llm_concurrency = llm_concurrency
+
+
+class CacheConfig:
+    enabled: bool
+    cache_dir: str
+    max_size_mb: float
+
+    def __init__(self, enabled: bool, cache_dir: str, max_size_mb: float):
+        self.enabled = enabled
+        self.cache_dir = cache_dir
+        self.max_size_mb = max_size_mb
+
+
+class WorkerPoolConfig:
+    size: int
+    job_timeout: float
+
+    def __init__(self, size: int, job_timeout: float):
+        self.size = size
+        self.job_timeout = job_timeout
+
+
+class PdfConfig:
+    dpi: int
+    render_workers: int
+    min_text_chars: int
+
+    def __init__(self, dpi: int, render_workers: int, min_text_chars: int):
+        self.dpi = dpi
+        self.render_workers = render_workers
+        self.min_text_chars = min_text_chars
+
+
+class PreprocessConfig:
+    enabled: bool
+    max_side: int
+    mllm_max_side: int
+    grayscale: bool
+    auto_crop: bool
+    crop_margin: int
+
+    def __init__(
+        self,
+        enabled: bool,
+        max_side: int,
+        mllm_max_side: int,
+        grayscale: bool,
+        auto_crop: bool,
+        crop_margin: int,
+    ):
+        self.enabled = enabled
+        self.max_side = max_side
+        self.mllm_max_side = mllm_max_side
+        self.grayscale = grayscale
+        self.auto_crop = auto_crop
+        self.crop_margin = crop_margin
+
+
+class MetricsConfig:
+    enabled: bool
+    metrics_dir: str
+    max_size_mb: float
+    backups: int
+    window: int
+    profile: bool
+
+    def __init__(
+        self,
+        enabled: bool,
+        metrics_dir: str,
+        max_size_mb: float,
+        backups: int,
+        window: int,
+        profile: bool,
+    ):
+        self.enabled = enabled
+        self.metrics_dir = metrics_dir
+        self.max_size_mb = max_size_mb
+        self.backups = backups
+        self.window = window
+        self.profile = profile
+
+
+class LlmClientConfig:
+    enabled: bool
+    max_connections: int
+    keepalive_expiry: float
+    connect_timeout: float
+    max_retries: int
+    backoff: float
+    retriever_concurrency: int
+    retriever_timeout: float
+    mllm_concurrency: int
+    mllm_timeout: float
+    chat_concurrency: int
+    chat_timeout: float
+    embedding_batch_size: int
+    embedding_batch_wait_ms: float
+
+    def __init__(
+        self,
+        enabled: bool,
+        max_connections: int,
+        keepalive_expiry: float,
+        connect_timeout: float,
+        max_retries: int,
+        backoff: float,
+        retriever_concurrency: int,
+        retriever_timeout: float,
+        mllm_concurrency: int,
+        mllm_timeout: float,
+        chat_concurrency: int,
+        chat_timeout: float,
+        embedding_batch_size: int,
+        embedding_batch_wait_ms: float,
+    ):
+        self.enabled = enabled
+        self.max_connections = max_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.connect_timeout = connect_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.retriever_concurrency = retriever_concurrency
+        self.retriever_timeout = retriever_timeout
+        self.mllm_concurrency = mllm_concurrency
+        self.mllm_timeout = mllm_timeout
+        self.chat_concurrency = chat_concurrency
+        self.chat_timeout = chat_timeout
+        self.embedding_batch_size = embedding_batch_size
+        self.embedding_batch_wait_ms = embedding_batch_wait_ms
+
+
+class VectorCacheConfig:
+    enabled: bool
+    path: str
+    max_size_mb: float
+
+    def __init__(self, enabled: bool, path: str, max_size_mb: float):
+        self.enabled = enabled
+        self.path = path
+        self.max_size_mb = max_size_mb
+
+
+class InvoiceStoreConfig:
+    path: str
+    thumbnail_size: int
+    max_page_size: int
+
+    def __init__(self, path: str, thumbnail_size: int, max_page_size: int):
+        self.path = path
+        self.thumbnail_size = thumbnail_size
+        self.max_page_size = max_page_size
+
+
+class DuplicateConfig:
+    enabled: bool
+    path: str
+    threshold: int
+    exact_threshold: int
+
+    def __init__(self, enabled: bool, path: str, threshold: int, exact_threshold: int):
+        self.enabled = enabled
+        self.path = path
+        self.threshold = threshold
+        self.exact_threshold = exact_threshold
+
+
+class InferenceConfig:
+    profile: str
+    enable_hpi: bool
+
+    def __init__(self, profile: str, enable_hpi: bool):
+        self.profile = profile
+        self.enable_hpi = enable_hpi
+
+
+class CpuConfig:
+    threads: int
+    enable_mkldnn: bool
+    pin_cores: bool
+    cores: str
+
+    def __init__(self, threads: int, enable_mkldnn: bool, pin_cores: bool, cores: str):
+        self.threads = threads
+        self.enable_mkldnn = enable_mkldnn
+        self.pin_cores = pin_cores
+        self.cores = cores
+
+
+class TableRecognitionConfig:
+    gating: bool
+    document_types: dict[str, bool]
+
+    def __init__(self, gating: bool, document_types: dict[str, bool]):
+        self.gating = gating
+        self.document_types = document_types
+
+
+class SegmentationConfig:
+    enabled: bool
+    gap: float
+    min_area: float
+    max_documents: int
+
+    def __init__(self, enabled: bool, gap: float, min_area: float, max_documents: int):
+        self.enabled = enabled
+        self.gap = gap
+        self.min_area = min_area
+        self.max_documents = max_documents
+
+
 class Config:
     model_dir: str
+    qr_fast_path: bool
+    rule_extraction: bool
+    speculative_mllm: bool
     retriever_config: BotConfig
     mllm_chat_bot_config: BotConfig
     chat_bot_config: BotConfig
+    batch: BatchConfig
+    cache: CacheConfig
+    worker_pool: WorkerPoolConfig
+    pdf: PdfConfig
+    preprocess: PreprocessConfig
+    metrics: MetricsConfig
+    llm_client: LlmClientConfig
+    vector_cache: VectorCacheConfig
+    invoice_store: InvoiceStoreConfig
+    duplicate: DuplicateConfig
+    inference: InferenceConfig
+    cpu: CpuConfig
+    table_recognition: TableRecognitionConfig
+    segmentation: SegmentationConfig
 
     def __init__(
         self,
@@ -101,6 +429,15 @@ class Config:
                 config_data = yaml.safe_load(f)
 
             self.model_dir = config_data.get("model_dir", default_config["model_dir"])
+            self.qr_fast_path = config_data.get(
+                "qr_fast_path", default_config["qr_fast_path"]
+            )
+            self.rule_extraction = config_data.get(
+                "rule_extraction", default_config["rule_extraction"]
+            )
+            self.speculative_mllm = config_data.get(
+                "speculative_mllm", default_config["speculative_mllm"]
+            )
             self.retriever_config = BotConfig(
                 **config_data.get(
                     "retriever_config", default_config["retriever_config"]
@@ -114,8 +451,80 @@ class Config:
             self.chat_bot_config = BotConfig(
                 **config_data.get("chat_bot_config", default_config["chat_bot_config"])
             )
+            self.batch = BatchConfig(
+                **{**default_config["batch"], **config_data.get("batch", {})}
+            )
+            self.cache = CacheConfig(
+                **{**default_config["cache"], **config_data.get("cache", {})}
+            )
+            self.worker_pool = WorkerPoolConfig(
+                **{
+                    **default_config["worker_pool"],
+                    **config_data.get("worker_pool", {}),
+                }
+            )
+            self.pdf = PdfConfig(
+                **{**default_config["pdf"], **config_data.get("pdf", {})}
+            )
+            self.preprocess = PreprocessConfig(
+                **{
+                    **default_config["preprocess"],
+                    **config_data.get("preprocess", {}),
+                }
+            )
+            self.metrics = MetricsConfig(
+                **{**default_config["metrics"], **config_data.get("metrics", {})}
+            )
+            self.llm_client = LlmClientConfig(
+                **{
+                    **default_config["llm_client"],
+                    **config_data.get("llm_client", {}),
+                }
+            )
+            self.vector_cache = VectorCacheConfig(
+                **{
+                    **default_config["vector_cache"],
+                    **config_data.get("vector_cache", {}),
+                }
+            )
+            self.invoice_store = InvoiceStoreConfig(
+                **{
+                    **default_config["invoice_store"],
+                    **config_data.get("invoice_store", {}),
+                }
+            )
+            self.duplicate = DuplicateConfig(
+                **{
+                    **default_config["duplicate"],
+                    **config_data.get("duplicate", {}),
+                }
+            )
+            self.inference = InferenceConfig(
+                **{
+                    **default_config["inference"],
+                    **config_data.get("inference", {}),
+                }
+            )
+            self.cpu = CpuConfig(
+                **{**default_config["cpu"], **config_data.get("cpu", {})}
+            )
+            self.table_recognition = TableRecognitionConfig(
+                **{
+                    **default_config["table_recognition"],
+                    **config_data.get("table_recognition", {}),
+                }
+            )
+            self.segmentation = SegmentationConfig(
+                **{
+                    **default_config["segmentation"],
+                    **config_data.get("segmentation", {}),
+                }
+            )
         else:
             self.model_dir = model_dir or default_config["model_dir"]
+            self.qr_fast_path = default_config["qr_fast_path"]
+            self.rule_extraction = default_config["rule_extraction"]
+            self.speculative_mllm = default_config["speculative_mllm"]
             self.retriever_config = retriever_config or BotConfig(
                 **default_config["retriever_config"]
             )
@@ -125,6 +534,22 @@ class Config:
             self.chat_bot_config = chat_bot_config or BotConfig(
                 **default_config["chat_bot_config"]
             )
+            self.batch = BatchConfig(**default_config["batch"])
+            self.cache = CacheConfig(**default_config["cache"])
+            self.worker_pool = WorkerPoolConfig(**default_config["worker_pool"])
+            self.pdf = PdfConfig(**default_config["pdf"])
+            self.preprocess = PreprocessConfig(**default_config["preprocess"])
+            self.metrics = MetricsConfig(**default_config["metrics"])
+            self.llm_client = LlmClientConfig(**default_config["llm_client"])
+            self.vector_cache = VectorCacheConfig(**default_config["vector_cache"])
+            self.invoice_store = InvoiceStoreConfig(**default_config["invoice_store"])
+            self.duplicate = DuplicateConfig(**default_config["duplicate"])
+            self.inference = InferenceConfig(**default_config["inference"])
+            self.cpu = CpuConfig(**default_config["cpu"])
+            self.table_recognition = TableRecognitionConfig(
+                **default_config["table_recognition"]
+            )
+            self.segmentation = SegmentationConfig(**default_config["segmentation"])
 
 
 config = Config(config_path=self_dir.joinpath("config.yaml").resolve().__str__())
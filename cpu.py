@@ -0,0 +1,100 @@
+import os
+import sys
+
+from loguru import logger as log
+
+from config import config
+
+# apply_cpu_settings确定的推理线程数，未调用时为None
+_threads: int | None = None
+
+
+def available_cores() -> list[int]:
+    """
+    当前进程可以使用的CPU核心编号
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def parse_core_set(text: str) -> list[int]:
+    """
+    解析核心集合，例如 "0-3,6,8-9"
+    :return: 为空时返回空列表
+    """
+    cores = set()
+    for part in str(text or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        start, _, end = part.partition("-")
+        cores.update(range(int(start), int(end or start) + 1))
+    return sorted(cores)
+
+
+def worker_cores(index: int, workers: int) -> list[int]:
+    """
+    将核心集合平均分给各工作进程
+    :param index: 工作进程序号
+    :param workers: 工作进程数量
+    :return: 该工作进程使用的核心，核心数少于工作进程数时多个进程共用核心
+    """
+    cores = parse_core_set(config.cpu.cores) or available_cores()
+    workers = max(workers, 1)
+    if len(cores) < workers:
+        return [cores[index % len(cores)]]
+    size = len(cores) // workers
+    return cores[index * size : (index + 1) * size]
+
+
+def pin_process(cores: list[int]) -> bool:
+    """
+    将当前进程绑定到指定核心
+    :return: 当前平台不支持或绑定失败时返回False
+    """
+    try:
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, cores)
+            return True
+        if sys.platform == "win32":
+            import ctypes
+
+            mask = sum(1 << core for core in cores)
+            kernel32 = ctypes.windll.kernel32
+            return bool(
+                kernel32.SetProcessAffinityMask(kernel32.GetCurrentProcess(), mask)
+            )
+    except (OSError, ValueError) as e:
+        log.warning(f"无法将进程绑定到核心 {cores}: {e}")
+        return False
+    log.warning("当前平台不支持绑定CPU核心")
+    return False
+
+
+def apply_cpu_settings(index: int = 0, workers: int = 1) -> int:
+    """
+    按cpu配置绑定核心并确定推理线程数，必须在导入paddle之前调用
+    :param index: 工作进程序号，在界面进程中识别时为0
+    :param workers: 工作进程数量
+    :return: 推理线程数
+    """
+    global _threads
+    cores = worker_cores(index, workers)
+    if config.cpu.pin_cores and pin_process(cores):
+        log.info(f"OCR进程已绑定到核心 {cores}")
+
+    threads = config.cpu.threads or max(len(cores), 1)
+    # OpenMP与MKL的线程池在首次使用时按这些变量创建
+    for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ.setdefault(name, str(threads))
+    _threads = threads
+    log.info(f"推理线程数: {threads}, oneDNN: {config.cpu.enable_mkldnn}")
+    return threads
+
+
+def cpu_threads() -> int:
+    """
+    推理线程数，尚未调用apply_cpu_settings时按单进程计算
+    """
+    return _threads or apply_cpu_settings()
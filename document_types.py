@@ -0,0 +1,197 @@
+import re
+from typing import List
+
+from loguru import logger as log
+
+# 文档类型分类器：在调用LLM之前，根据OCR文字中的关键词和发票二维码中的发票种类代码判断文档类型，
+# 从而只向LLM请求该类型需要的字段。新增文档类型只需在document_types中注册。
+
+base_key_words = [
+    "invoice_date",
+    "invoice_number",
+]
+
+# 二维码中的发票种类代码得分，足以压过文字特征
+qr_kind_score = 10
+
+
+class document_type:
+    """
+    一种文档类型的识别特征与字段
+    """
+
+    name: str
+    label: str
+    key_words: List[str]
+    markers: List[tuple[str, float]]
+    qr_kinds: List[str]
+    date_key: str
+    amount_key: str
+    program_key: str | None
+    content_keys: List[str]
+
+    def __init__(
+        self,
+        name: str,
+        label: str,
+        key_words: List[str],
+        markers: List[tuple[str, float]],
+        date_key: str = "invoice_date",
+        amount_key: str = "total_amount",
+        program_key: str | None = None,
+        content_keys: List[str] | None = None,
+        qr_kinds: List[str] | None = None,
+    ):
+        """
+        :param name: 类型名称，用于配置和缓存
+        :param label: 结果中的invoice_type
+        :param key_words: 需要提取的字段
+        :param markers: (正则表达式, 得分)，在OCR文字中每找到一个加上对应得分
+        :param date_key: 作为结果date的字段
+        :param amount_key: 作为结果amount的字段
+        :param program_key: 作为结果program的字段，为None时使用label
+        :param content_keys: 以JSON写入结果content的字段
+        :param qr_kinds: 发票二维码第2段的发票种类代码
+        """
+        self.name = name
+        self.label = label
+        self.key_words = key_words
+        self.markers = markers
+        self.date_key = date_key
+        self.amount_key = amount_key
+        self.program_key = program_key
+        self.content_keys = content_keys or []
+        self.qr_kinds = qr_kinds or []
+
+    def score(self, text: str, qr_codes: List[str] | None = None) -> float:
+        score = sum(
+            weight for pattern, weight in self.markers if re.search(pattern, text)
+        )
+        if qr_codes and len(qr_codes) > 1 and qr_codes[1] in self.qr_kinds:
+            score += qr_kind_score
+        return score
+
+
+# 没有任何特征时使用的类型
+default_type = "common_invoice"
+
+document_types: dict[str, document_type] = {}
+
+
+def register(doc_type: document_type):
+    document_types[doc_type.name] = doc_type
+
+
+register(
+    document_type(
+        name="common_invoice",
+        label="普通发票",
+        key_words=base_key_words + ["total_amount", "program_name"],
+        markers=[(r"普通发票", 2), (r"价税合计", 1), (r"开票日期", 1)],
+        program_key="program_name",
+        qr_kinds=["04", "10", "11", "32"],
+    )
+)
+register(
+    document_type(
+        name="train_ticket",
+        label="火车票",
+        key_words=[
+            "first_station",
+            "second_station",
+            "passenger_name",
+            "price",
+            "departure_time",
+            "seat_class",
+            "train_service",
+            "travel_date",
+        ]
+        + base_key_words,
+        markers=[
+            (r"中国铁路祝您旅途愉快", 5),
+            (r"铁路电子客票", 5),
+            (r"\d{1,2}:\d{2}\s*开", 2),
+            (r"[一二]等座|商务座|硬卧|软卧|硬座|无座", 1),
+        ],
+        date_key="travel_date",
+        amount_key="price",
+        content_keys=[
+            "passenger_name",
+            "first_station",
+            "second_station",
+            "seat_class",
+        ],
+        qr_kinds=["51"],
+    )
+)
+register(
+    document_type(
+        name="vat_special_invoice",
+        label="增值税专用发票",
+        key_words=base_key_words
+        + ["total_amount", "program_name", "tax_amount", "seller_name"],
+        markers=[(r"专用发票", 4), (r"价税合计", 1)],
+        program_key="program_name",
+        content_keys=["seller_name", "tax_amount"],
+        qr_kinds=["01", "08", "31"],
+    )
+)
+register(
+    document_type(
+        name="flight_itinerary",
+        label="航空行程单",
+        key_words=base_key_words
+        + [
+            "passenger_name",
+            "flight_number",
+            "first_station",
+            "second_station",
+            "total_amount",
+        ],
+        markers=[
+            (r"航空运输电子客票行程单", 5),
+            (r"航班号", 2),
+            (r"承运人", 1),
+            (r"民航发展基金", 2),
+            (r"燃油附加费", 1),
+        ],
+        content_keys=[
+            "passenger_name",
+            "flight_number",
+            "first_station",
+            "second_station",
+        ],
+        qr_kinds=["61"],
+    )
+)
+register(
+    document_type(
+        name="taxi_receipt",
+        label="出租车票",
+        key_words=base_key_words
+        + ["total_amount", "boarding_time", "alighting_time", "mileage"],
+        markers=[
+            (r"出租汽车|出租车", 3),
+            (r"上车", 1),
+            (r"下车", 1),
+            (r"里程", 1),
+            (r"等候|候时", 1),
+        ],
+        content_keys=["boarding_time", "alighting_time", "mileage"],
+    )
+)
+
+
+def classify(text: str, qr_codes: List[str] | None = None) -> str:
+    """
+    按关键词和二维码发票种类代码为各文档类型打分，返回得分最高的类型
+    :param text: visual_info中的全部OCR文字
+    :param qr_codes: 通过invoice_verify校验的二维码内容
+    :return: 文档类型名称，没有任何特征时返回default_type
+    """
+    scores = {name: t.score(text, qr_codes) for name, t in document_types.items()}
+    name = max(scores, key=scores.get)
+    if scores[name] <= 0:
+        name = default_type
+    log.info(f"文档类型: {name}，得分: {scores}")
+    return name
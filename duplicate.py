@@ -0,0 +1,180 @@
+import json
+import time
+import sqlite3
+import threading
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+from loguru import logger as log
+
+from config import config, self_dir
+from preprocess import auto_crop, normalize_mode
+
+# 32x32 DCT变换矩阵，取左上角16x16的低频系数得到256位哈希。
+# 常见的8x8（64位）哈希分不开版式相同、只有文字不同的两张发票
+_dct_size = 32
+_hash_size = 16
+_dct = np.cos(
+    np.pi
+    * np.outer(np.arange(_dct_size), 2 * np.arange(_dct_size) + 1)
+    / (2 * _dct_size)
+)
+
+
+def phash(img: Image.Image) -> bytes:
+    """
+    计算图片的感知哈希（pHash）。
+    先裁到文档区域，再取灰度缩略图DCT变换后的低频系数与中位数比较，
+    对重新扫描、缩放、轻微裁剪和不同的压缩质量不敏感
+    :param img: 解码后的图片
+    :return: 256位哈希，32字节
+    """
+    # JPEG可以在解码时直接缩小，避免为计算哈希解码整张大图
+    img.draft("RGB", (512, 512))
+    img = auto_crop(normalize_mode(img))
+    gray = np.asarray(
+        img.convert("L").resize((_dct_size, _dct_size), Image.LANCZOS),
+        dtype=np.float64,
+    )
+    low = (_dct @ gray @ _dct.T)[:_hash_size, :_hash_size].flatten()
+    # 直流分量只反映整体亮度，不参与中位数
+    bits = low > np.median(low[1:])
+    return np.packbits(bits).tobytes()
+
+
+class DuplicateIndex:
+    """
+    已识别图片与已保存发票图片的感知哈希索引，用于在OCR前发现重复提交的发票。
+    哈希持久化在SQLite中，查询时在内存数组上计算汉明距离。
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS image_hashes ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, phash BLOB, "
+                "invoice_number TEXT, result TEXT, created REAL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS image_hashes_invoice_number "
+                "ON image_hashes (invoice_number)"
+            )
+            rows = self._conn.execute(
+                "SELECT id, phash FROM image_hashes ORDER BY id"
+            ).fetchall()
+        self._ids = np.array([row["id"] for row in rows], dtype=np.int64)
+        self._hashes = np.frombuffer(
+            b"".join(row["phash"] for row in rows), dtype=np.uint64
+        ).reshape(-1, _hash_size**2 // 64)
+        log.debug(f"重复发票索引已加载{len(self._ids)}项")
+
+    def add(
+        self,
+        phash: bytes,
+        invoice_number: str | None = None,
+        result: dict | None = None,
+    ):
+        """
+        :param phash: 图片的感知哈希
+        :param invoice_number: 图片中发票的号码
+        :param result: 图片的识别结果，重复提交时直接返回；已保存的发票图片为None
+        """
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO image_hashes "
+                "(phash, invoice_number, result, created) VALUES (?, ?, ?, ?)",
+                (
+                    phash,
+                    str(invoice_number) if invoice_number else None,
+                    json.dumps(result, ensure_ascii=False) if result else None,
+                    time.time(),
+                ),
+            )
+            self._ids = np.append(self._ids, cursor.lastrowid)
+            self._hashes = np.vstack(
+                [self._hashes, np.frombuffer(phash, dtype=np.uint64)]
+            )
+
+    def find(
+        self, phash: bytes, threshold: int, invoice_number: str | None = None
+    ) -> list[dict]:
+        """
+        查找汉明距离不超过threshold的图片
+        :param invoice_number: 已知的发票号码（例如来自二维码），号码不同的图片是版式相同的另一张发票，不视为重复
+        :return: 按距离从近到远排列的匹配项，包含distance、invoice_number、result和created
+        """
+        with self._lock:
+            distances = np.bitwise_count(
+                self._hashes ^ np.frombuffer(phash, dtype=np.uint64)
+            ).sum(axis=1)
+            candidates = np.flatnonzero(distances <= threshold)
+            ids = self._ids[candidates].tolist()
+            distance_of = dict(zip(ids, distances[candidates].tolist()))
+            if not ids:
+                return []
+            rows = self._conn.execute(
+                "SELECT * FROM image_hashes "
+                f"WHERE id IN ({','.join('?' * len(ids))})",
+                ids,
+            ).fetchall()
+
+        matches = []
+        for row in rows:
+            if invoice_number and row["invoice_number"] not in (
+                None,
+                str(invoice_number),
+            ):
+                continue
+            matches.append(
+                {
+                    "distance": distance_of[row["id"]],
+                    "invoice_number": row["invoice_number"],
+                    "result": json.loads(row["result"]) if row["result"] else None,
+                    "created": row["created"],
+                }
+            )
+        # 距离相同时优先返回较新的记录
+        return sorted(matches, key=lambda match: (match["distance"], -match["created"]))
+
+    def _remove(self, where: str, params: tuple):
+        with self._lock, self._conn:
+            removed = [
+                row["id"]
+                for row in self._conn.execute(
+                    f"SELECT id FROM image_hashes WHERE {where}", params
+                ).fetchall()
+            ]
+            self._conn.execute(f"DELETE FROM image_hashes WHERE {where}", params)
+            keep = ~np.isin(self._ids, removed)
+            self._ids = self._ids[keep]
+            self._hashes = self._hashes[keep]
+
+    def remove_invoice(self, invoice_number: str):
+        """
+        删除已保存发票图片的哈希，识别结果的哈希保留
+        """
+        self._remove("invoice_number = ? AND result IS NULL", (str(invoice_number),))
+
+    def clear_results(self):
+        """
+        删除识别结果的哈希，保留已保存发票图片的哈希
+        """
+        self._remove("result IS NOT NULL", ())
+
+    def __len__(self):
+        return len(self._ids)
+
+
+duplicate_index: DuplicateIndex | None = None
+if config.duplicate.enabled:
+    duplicate_index = DuplicateIndex(
+        path=self_dir.joinpath(config.duplicate.path).resolve()
+    )
@@ -0,0 +1,139 @@
+import io
+import csv
+import zipfile
+import mimetypes
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+from loguru import logger as log
+
+from invoice_store import invoice_store
+
+# 导出的列：(字段名, 表头)
+export_columns = [
+    ("invoice_number", "发票号码"),
+    ("invoice_type", "发票类型"),
+    ("date", "日期"),
+    ("program", "项目名称"),
+    ("amount", "金额"),
+    ("content", "备注"),
+]
+
+export_formats = ["csv", "xlsx", "zip"]
+
+ExportProgress = Callable[[int, int], None]
+
+
+def export_row(invoice: dict) -> list:
+    return [invoice.get(key) for key, _ in export_columns]
+
+
+def image_name(invoice: dict) -> str:
+    """
+    ZIP包中图片的文件名，以发票号码命名
+    """
+    suffix = mimetypes.guess_extension(invoice.get("mime") or "") or ".png"
+    if suffix == ".jpe":
+        suffix = ".jpg"
+    return f"images/{invoice['invoice_number']}{suffix}"
+
+
+def write_csv(file, invoices: Iterable[dict], on_row: Callable[[dict], None]):
+    """
+    :param file: 以文本模式打开的文件
+    :param on_row: 每写入一行后调用
+    """
+    writer = csv.writer(file)
+    writer.writerow([title for _, title in export_columns])
+    for invoice in invoices:
+        writer.writerow(export_row(invoice))
+        on_row(invoice)
+
+
+def write_xlsx(path: Path, invoices: Iterable[dict], on_row: Callable[[dict], None]):
+    """
+    使用openpyxl的只写模式逐行写出，内存占用与行数无关
+    """
+    # openpyxl随paddlex安装
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("发票")
+    sheet.append([title for _, title in export_columns])
+    for invoice in invoices:
+        sheet.append(export_row(invoice))
+        on_row(invoice)
+    workbook.save(path)
+
+
+def write_zip(path: Path, invoices: Iterable[dict], on_row: Callable[[dict], None]):
+    """
+    报销包：invoices.csv与images目录下的发票原图。
+    图片逐张写入ZIP，本身已压缩的图片直接存储不再压缩；
+    表格内容很小，先写在内存中，最后写入ZIP
+    """
+    rows = io.StringIO()
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_STORED) as bundle:
+
+        def on_invoice(invoice: dict):
+            if invoice.get("image"):
+                bundle.writestr(image_name(invoice), invoice["image"])
+            on_row(invoice)
+
+        write_csv(rows, invoices, on_invoice)
+        # 加BOM，Excel才能正确识别UTF-8编码的中文
+        bundle.writestr(
+            "invoices.csv",
+            "\ufeff" + rows.getvalue(),
+            compress_type=zipfile.ZIP_DEFLATED,
+        )
+
+
+def export_invoices(
+    path: Path,
+    fmt: str,
+    filters: dict | None = None,
+    order_by: str = "date",
+    descending: bool = False,
+    progress: ExportProgress | None = None,
+) -> int:
+    """
+    将发票数据库中符合条件的发票导出为CSV、XLSX或ZIP报销包。
+    发票逐条从数据库读出并写入文件，先写入临时文件，完成后再替换目标文件
+    :param path: 导出文件路径
+    :param fmt: csv、xlsx或zip
+    :param filters: 与InvoiceStore.query相同的查询条件
+    :param progress: 以(已导出数量, 总数)调用
+    :return: 导出的发票数量
+    """
+    if fmt not in export_formats:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+
+    total = invoice_store.count(**(filters or {}))
+    invoices: Iterator[dict] = invoice_store.iter_invoices(
+        filters, order_by, descending, with_images=fmt == "zip"
+    )
+    exported = 0
+
+    def on_row(invoice: dict):
+        nonlocal exported
+        exported += 1
+        if progress and (exported % 100 == 0 or exported == total):
+            progress(exported, total)
+
+    temp = path.with_name(path.name + ".part")
+    try:
+        match fmt:
+            case "csv":
+                with open(temp, "w", encoding="utf-8-sig", newline="") as f:
+                    write_csv(f, invoices, on_row)
+            case "xlsx":
+                write_xlsx(temp, invoices, on_row)
+            case "zip":
+                write_zip(temp, invoices, on_row)
+        temp.replace(path)
+    finally:
+        temp.unlink(missing_ok=True)
+
+    log.info(f"已导出{exported}张发票到{path}")
+    return exported
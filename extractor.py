@@ -0,0 +1,187 @@
+import re
+from datetime import datetime
+from typing import Callable
+
+# 规则提取器：直接从OCR文字中按锚点和正则提取字段。
+# 每条规则只在结果唯一确定时返回值，无法确定的字段仍交给LLM。
+
+_date = r"(\d{4})\s*年\s*(\d{1,2})\s*月\s*(\d{1,2})\s*日"
+
+seat_classes = [
+    "商务座",
+    "特等座",
+    "一等座",
+    "二等座",
+    "高级软卧",
+    "软卧",
+    "动卧",
+    "硬卧",
+    "软座",
+    "硬座",
+    "无座",
+]
+
+
+def _unique(values: list[str]) -> str | None:
+    """
+    去重后只有一个取值时返回该值
+    """
+    values = list(dict.fromkeys(values))
+    return values[0] if len(values) == 1 else None
+
+
+def _format_date(match: tuple[str, str, str]) -> str:
+    # 与二维码中的开票日期一致，格式为YYYYMMDD
+    year, month, day = match
+    return f"{year}{int(month):02d}{int(day):02d}"
+
+
+def invoice_number(text: str) -> str | None:
+    # 发票号码:24332000000012345678
+    if value := _unique(re.findall(r"发票号码\s*[:：]?\s*(\d{8,20})", text)):
+        return value
+    # 锚点与号码被识别为不同文本框时，取唯一的20位全电发票号码
+    return _unique(re.findall(r"(?<!\d)(\d{20})(?!\d)", text))
+
+
+def invoice_date(text: str) -> str | None:
+    values = re.findall(r"开票日期\s*[:：]?\s*" + _date, text)
+    return _unique([_format_date(value) for value in values])
+
+
+def total_amount(text: str) -> str | None:
+    # 价税合计(大写) 壹佰元整 (小写) ¥100.00
+    values = re.findall(r"[（(]\s*小写\s*[)）]\s*[¥￥]?\s*(\d[\d,]*\.\d{2})", text)
+    return _unique([value.replace(",", "") for value in values])
+
+
+def program_name(text: str) -> str | None:
+    # 发票明细中的项目名称形如 "*餐饮服务*餐费"，多个项目时取第一个
+    if match := re.search(r"\*[^*\s]+\*[^\s*]*", text):
+        return match.group()
+    return None
+
+
+def travel_date(text: str) -> str | None:
+    values = re.findall(_date + r"\s*\d{1,2}:\d{2}\s*开", text)
+    return _unique([_format_date(value) for value in values])
+
+
+def departure_time(text: str) -> str | None:
+    return _unique(re.findall(r"日\s*(\d{1,2}:\d{2})\s*开", text))
+
+
+def train_service(text: str) -> str | None:
+    return _unique(re.findall(r"(?<![A-Za-z0-9])([GDCZTKSYL]\d{1,4})(?!\d)", text))
+
+
+def _stations(text: str) -> list[str]:
+    return list(dict.fromkeys(re.findall(r"[一-龥]{1,8}站", text)))
+
+
+def first_station(text: str) -> str | None:
+    stations = _stations(text)
+    return stations[0] if len(stations) == 2 else None
+
+
+def second_station(text: str) -> str | None:
+    stations = _stations(text)
+    return stations[1] if len(stations) == 2 else None
+
+
+def price(text: str) -> str | None:
+    values = re.findall(r"[¥￥]\s*(\d+(?:\.\d{1,2})?)", text)
+    return _unique(values)
+
+
+def seat_class(text: str) -> str | None:
+    pattern = "|".join(seat_classes)
+    return _unique(re.findall(pattern, text))
+
+
+def passenger_name(text: str) -> str | None:
+    # 3301061990****1234 张三
+    values = re.findall(r"\d{6,10}\*{2,8}\d{3}[\dXx]\s*([一-龥·]{2,8})", text)
+    return _unique(values)
+
+
+field_rules: dict[str, Callable[[str], str | None]] = {
+    "invoice_number": invoice_number,
+    "invoice_date": invoice_date,
+    "total_amount": total_amount,
+    "program_name": program_name,
+    "travel_date": travel_date,
+    "departure_time": departure_time,
+    "train_service": train_service,
+    "first_station": first_station,
+    "second_station": second_station,
+    "price": price,
+    "seat_class": seat_class,
+    "passenger_name": passenger_name,
+}
+
+
+def _valid_invoice_number(value: str) -> bool:
+    # 全电发票号码为20位，旧版纸质发票为8位
+    return value.isdigit() and 8 <= len(value) <= 20
+
+
+def _valid_date(value: str) -> bool:
+    if not (value.isdigit() and len(value) == 8):
+        return False
+    try:
+        datetime.strptime(value, "%Y%m%d")
+    except ValueError:
+        return False
+    return True
+
+
+def _valid_time(value: str) -> bool:
+    hour, _, minute = value.partition(":")
+    return hour.isdigit() and minute.isdigit() and int(hour) < 24 and int(minute) < 60
+
+
+def _valid_amount(value: str) -> bool:
+    # 0.00 也是合法的金额
+    try:
+        return float(value) >= 0
+    except ValueError:
+        return False
+
+
+# 规则提取与二维码字段的校验，不经过针对LLM输出的ocr_llm_verify
+field_checks: dict[str, Callable[[str], bool]] = {
+    "invoice_number": _valid_invoice_number,
+    "invoice_date": _valid_date,
+    "travel_date": _valid_date,
+    "departure_time": _valid_time,
+    "total_amount": _valid_amount,
+    "price": _valid_amount,
+}
+
+
+def check_fields(fields: dict[str, str]) -> dict[str, str]:
+    """
+    按field_checks校验字段，去掉格式不正确的字段
+    :param fields: 字段名到内容的映射
+    :return: 通过校验的字段
+    """
+    return {
+        key: value
+        for key, value in fields.items()
+        if (check := field_checks.get(key)) is None or check(value)
+    }
+
+
+def extract_fields(text: str, key_words: list[str]) -> dict[str, str]:
+    """
+    从OCR文字中提取能唯一确定的字段
+    :param text: visual_info中的全部OCR文字
+    :param key_words: 需要提取的字段
+    :return: 字段名到内容的映射，只包含成功提取且通过field_checks校验的字段
+    """
+    fields = {}
+    for key in key_words:
+        if (rule := field_rules.get(key)) and (value := rule(text)):
+            fields[key] = value
+    return check_fields(fields)
@@ -1,3 +1,41 @@
+interface MetricsPercentiles {
+  count: number;
+  mean?: number;
+  p50?: number;
+  p90?: number;
+  p99?: number;
+  max?: number;
+}
+
+export interface OcrProgressDetail {
+  request_id: string | null;
+  event: "queued" | "started" | "stage" | "fields";
+  position?: number;
+  worker?: number;
+  stage?: string;
+  duration?: number;
+  fields?: {
+    date?: string;
+    program?: string;
+    amount?: string;
+    invoice_number?: string;
+  };
+}
+
+export interface InvoiceRecord {
+  invoice_id?: number;
+  invoice_number: string;
+  invoice_type: string | null;
+  date: string;
+  program: string;
+  amount: number;
+  content: string;
+  image?: string;
+  thumbnail?: string;
+  created?: number;
+  updated?: number;
+}
+
 declare global {
   interface Window {
     pywebview: {
@@ -29,7 +67,11 @@ declare global {
           };
           error?: string;
         }>;
-        img_ocr: (image: string) => Promise<{
+        img_ocr: (
+          image: string,
+          requestId?: string,
+          allowDuplicate?: boolean
+        ) => Promise<{
           success: boolean;
           content?: {
             date: string;
@@ -38,6 +80,195 @@ declare global {
             content: string;
             invoice_number: number;
           };
+          duplicate?: {
+            distance: number;
+            invoice_number: string | null;
+            saved: boolean;
+            confirmed: boolean;
+          };
+          documents?: {
+            success: boolean;
+            content?: {
+              date: string;
+              program: string;
+              amount: string;
+              content: string;
+              invoice_number: number;
+            };
+            error?: string;
+            region: [number, number, number, number];
+          }[];
+          error?: string;
+        }>;
+        find_duplicates: (image: string, threshold?: number) => Promise<{
+          success: boolean;
+          matches?: {
+            distance: number;
+            invoice_number: string | null;
+            saved: boolean;
+            created: number;
+          }[];
+          error?: string;
+        }>;
+        get_model_status: () => Promise<{
+          state: "idle" | "loading" | "ready" | "error";
+          error: string | null;
+          load_time: number | null;
+          profile: "accurate" | "fast" | "tiny";
+          workers?: number;
+          ready_workers?: number;
+          queued?: number;
+        }>;
+        submit_ocr: (image: string, requestId?: string) => Promise<{
+          success: boolean;
+          job_id?: string;
+          error?: string;
+        }>;
+        get_ocr_job: (jobId: string) => Promise<{
+          success: boolean;
+          job?: {
+            job_id: string;
+            state: "queued" | "running" | "done" | "failed" | "cancelled" | "timeout";
+            result: {
+              success: boolean;
+              content?: {
+                date: string;
+                program: string;
+                amount: string;
+                content: string;
+                invoice_number: number;
+              };
+              error?: string;
+            } | null;
+            position: number | null;
+            submitted: number;
+            started: number | null;
+            finished: number | null;
+          };
+          error?: string;
+        }>;
+        cancel_ocr_job: (jobId: string) => Promise<{
+          success: boolean;
+          error?: string;
+        }>;
+        batch_ocr: (items: string[]) => Promise<{
+          success: boolean;
+          results: {
+            success: boolean;
+            source: string | number;
+            content?: {
+              date: string;
+              program: string;
+              amount: string;
+              content: string;
+              invoice_number: number;
+            };
+            documents?: {
+              success: boolean;
+              content?: {
+                date: string;
+                program: string;
+                amount: string;
+                content: string;
+                invoice_number: number;
+              };
+              error?: string;
+              region: [number, number, number, number];
+            }[];
+            error?: string;
+          }[];
+          elapsed: number;
+          throughput: number;
+        }>;
+        get_metrics: (limit?: number) => Promise<{
+          success: boolean;
+          requests: Record<string, MetricsPercentiles>;
+          spans: Record<string, MetricsPercentiles>;
+          gates: Record<string, Record<string, number>>;
+          vector_cache: {
+            hits: number;
+            misses: number;
+            hit_rate: number | null;
+            entries: number;
+            size_mb: number;
+          } | null;
+        }>;
+        pdf_ocr: (pdfData: string) => Promise<{
+          success: boolean;
+          results?: {
+            success: boolean;
+            page: number;
+            content?: {
+              date: string;
+              program: string;
+              amount: string;
+              content: string;
+              invoice_number: number;
+            };
+            error?: string;
+          }[];
+          elapsed?: number;
+          error?: string;
+        }>;
+        add_invoice: (item: InvoiceRecord) => Promise<{
+          success: boolean;
+          invoice?: InvoiceRecord;
+          error?: string;
+        }>;
+        update_invoice: (item: InvoiceRecord) => Promise<{
+          success: boolean;
+          invoice?: InvoiceRecord;
+          error?: string;
+        }>;
+        delete_invoice: (invoiceNumber: string) => Promise<{
+          success: boolean;
+          error?: string;
+        }>;
+        get_invoice: (invoiceNumber: string) => Promise<{
+          success: boolean;
+          invoice?: InvoiceRecord;
+          error?: string;
+        }>;
+        list_invoices: (
+          page?: number,
+          pageSize?: number,
+          filters?: {
+            invoice_type?: string;
+            date_from?: string;
+            date_to?: string;
+            min_amount?: number;
+            max_amount?: number;
+            keyword?: string;
+          } | null,
+          orderBy?: "date" | "amount" | "invoice_number" | "invoice_type" | "created",
+          descending?: boolean,
+          thumbnails?: boolean
+        ) => Promise<{
+          success: boolean;
+          total: number;
+          page: number;
+          page_size: number;
+          items: InvoiceRecord[];
+          error?: string;
+        }>;
+        export_invoices: (
+          fmt?: "csv" | "xlsx" | "zip",
+          filters?: {
+            invoice_type?: string;
+            date_from?: string;
+            date_to?: string;
+            min_amount?: number;
+            max_amount?: number;
+            keyword?: string;
+          } | null,
+          path?: string | null,
+          orderBy?: "date" | "amount" | "invoice_number" | "invoice_type" | "created",
+          descending?: boolean
+        ) => Promise<{
+          success: boolean;
+          path?: string;
+          count?: number;
+          elapsed?: number;
           error?: string;
         }>;
       };
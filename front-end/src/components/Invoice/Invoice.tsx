@@ -11,16 +11,29 @@ import pdfjsWorkerUrl from "pdfjs-dist/build/pdf.worker.mjs?url";
 import { updateDateFromStr } from "../../utils/conver";
 import { verifyInvoiceItem } from "./verify";
 import { useNavigate, useParams } from "react-router-dom";
-import { useAtom } from "jotai";
-import { invoiceListAtom } from "../../store/invoiceList";
-import { addInvoiceItem, deleteInvoiceItem, updateInvoiceItem } from "./crud";
+import {
+  addInvoiceItem,
+  deleteInvoiceItem,
+  getInvoiceItem,
+  updateInvoiceItem,
+} from "./crud";
 import { handlePyApi } from "../../script/handlePyApi";
+import { uploadImage } from "../../script/uploadImage";
+import type { OcrProgressDetail } from "../../api";
 
 pdfjsLib.GlobalWorkerOptions.workerSrc = pdfjsWorkerUrl;
 
+const stageLabels: Record<string, string> = {
+  visual: "文字识别",
+  rules: "规则提取",
+  plan: "字段规划",
+  vector: "文本向量化",
+  mllm: "多模态识别",
+  chat: "字段提取",
+};
+
 export function Invoice() {
   const navigate = useNavigate();
-  const [invoiceList] = useAtom(invoiceListAtom);
 
   const [snakebarState, setSnakebarState] = useState({
     severity: "error" as "success" | "error",
@@ -35,6 +48,11 @@ export function Invoice() {
   const pdfInputRef = useRef<HTMLInputElement>(null);
   const [padding, setPadding] = useState(false);
   const { invoiceNumber } = useParams<{ invoiceNumber?: string }>();
+  const [modelState, setModelState] = useState<string>("loading");
+  const [ocrStatus, setOcrStatus] = useState("");
+  // 已上传到本地服务器的图片句柄，优先于 base64 data URL 传给后端
+  const [imageHandle, setImageHandle] = useState<string | undefined>();
+  const uploadSeqRef = useRef(0);
 
   const [invoice, setInvoice] = useState<InvoiceItem>(
     new InvoiceItem({
@@ -49,12 +67,13 @@ export function Invoice() {
   );
 
   useEffect(() => {
-    try {
-      if (invoiceNumber) {
-        const parsedInvoiceNumber = parseInt(invoiceNumber, 10);
-        const existingInvoice = invoiceList.find(
-          (item: InvoiceItem) => item.invoice_number === parsedInvoiceNumber
-        );
+    if (!invoiceNumber) {
+      return;
+    }
+    const parsedInvoiceNumber = parseInt(invoiceNumber, 10);
+    handlePyApi(
+      async () => {
+        const existingInvoice = await getInvoiceItem(parsedInvoiceNumber);
         if (existingInvoice) {
           setInvoice(existingInvoice);
         } else {
@@ -63,11 +82,35 @@ export function Invoice() {
           );
           navigate(`/invoice`, { replace: false });
         }
+      },
+      (error) => {
+        console.error("Error fetching invoice:", error);
       }
-    } catch (error) {
-      console.error("Error fetching invoice:", error);
-    }
-  }, [invoiceNumber, invoiceList]);
+    );
+  }, [invoiceNumber]);
+
+  useEffect(() => {
+    // 模型在后台加载，轮询加载状态直到完成
+    let timer: ReturnType<typeof setTimeout> | undefined;
+    const poll = () => {
+      handlePyApi(
+        async () => {
+          const status = await window.pywebview.api.get_model_status();
+          setModelState(status.state);
+          if (status.state === "error") {
+            showAlert("error", `模型加载失败: ${status.error}`);
+          } else if (status.state !== "ready") {
+            timer = setTimeout(poll, 1000);
+          }
+        },
+        () => {
+          timer = setTimeout(poll, 1000);
+        }
+      );
+    };
+    poll();
+    return () => clearTimeout(timer);
+  }, []);
 
   async function showAlert(
     type: "success" | "error",
@@ -92,6 +135,20 @@ export function Invoice() {
     }));
   }
 
+  function updateImageHandle(image: Blob) {
+    const seq = ++uploadSeqRef.current;
+    setImageHandle(undefined);
+    uploadImage(image).then((handle) => {
+      // 忽略已被新图片替换的上传结果
+      if (seq === uploadSeqRef.current) setImageHandle(handle);
+    });
+  }
+
+  // 传给后端的图片：优先使用上传句柄，避免通过 JS 桥传输 base64 字符串
+  function imagePayload(): string {
+    return imageHandle || invoice.image;
+  }
+
   function handleImageUpload(event: React.ChangeEvent<HTMLInputElement>) {
     const file = event.target.files?.[0];
     if (file) {
@@ -105,6 +162,7 @@ export function Invoice() {
         }
       };
       reader.readAsDataURL(file);
+      updateImageHandle(file);
     } else {
       showAlert("error", "请选择有效的文件！");
     }
@@ -138,6 +196,9 @@ export function Invoice() {
         }, 3000);
         const dataUrl = canvas.toDataURL("image/png");
         updateImage(dataUrl);
+        canvas.toBlob((blob) => {
+          if (blob) updateImageHandle(blob);
+        }, "image/png");
       };
       reader.readAsArrayBuffer(file);
     } else {
@@ -180,7 +241,7 @@ export function Invoice() {
 
     handlePyApi(
       async () => {
-        const result = await window.pywebview.api.scan_qrcode(invoice.image);
+        const result = await window.pywebview.api.scan_qrcode(imagePayload());
         if (result.success) {
           setInvoice((prev) => ({
             ...prev,
@@ -212,35 +273,94 @@ export function Invoice() {
       return;
     }
 
+    // 识别过程中后端通过 ocr_progress 事件推送排队位置、已完成的阶段与提前得到的字段
+    const requestId = `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+    const onProgress = (event: Event) => {
+      const detail = (event as CustomEvent<OcrProgressDetail>).detail;
+      if (detail.request_id !== requestId) {
+        return;
+      }
+      switch (detail.event) {
+        case "queued":
+          setOcrStatus(`排队中，第 ${detail.position} 位`);
+          break;
+        case "started":
+          setOcrStatus("开始识别");
+          break;
+        case "stage":
+          setOcrStatus(
+            `${stageLabels[detail.stage ?? ""] ?? detail.stage} 完成`
+          );
+          break;
+        case "fields": {
+          const fields = detail.fields ?? {};
+          setInvoice((prev) => ({
+            ...prev,
+            program: fields.program || prev.program,
+            amount: fields.amount ? parseFloat(fields.amount) : prev.amount,
+            date: updateDateFromStr(fields.date, prev.date),
+            invoice_number: fields.invoice_number
+              ? parseInt(fields.invoice_number, 10)
+              : prev.invoice_number,
+          }));
+          break;
+        }
+      }
+    };
+    window.addEventListener("ocr_progress", onProgress);
+
     handlePyApi(
       async () => {
-        window.pywebview.api.img_ocr(invoice.image).then((result) => {
-          if (result.success) {
-            console.log("OCR result:", result.content);
-            setInvoice((prev) => ({
-              ...prev,
-              program: result.content?.program || invoice.program,
-              amount: result.content?.amount
-                ? parseFloat(
-                    result.content?.amount || invoice.amount.toString()
-                  )
-                : invoice.amount,
-              date: updateDateFromStr(result.content?.date, invoice.date),
-              content: result.content?.content || invoice.content,
-              invoice_number: result.content?.invoice_number
-                ? result.content?.invoice_number
-                : invoice.invoice_number,
-            }));
-            showAlert("success", "OCR识别成功");
+        const result = await window.pywebview.api.img_ocr(
+          imagePayload(),
+          requestId
+        );
+        if (result.success) {
+          console.log("OCR result:", result.content);
+          setInvoice((prev) => ({
+            ...prev,
+            program: result.content?.program || prev.program,
+            amount: result.content?.amount
+              ? parseFloat(result.content?.amount)
+              : prev.amount,
+            date: updateDateFromStr(result.content?.date, prev.date),
+            content: result.content?.content || prev.content,
+            invoice_number: result.content?.invoice_number
+              ? result.content?.invoice_number
+              : prev.invoice_number,
+          }));
+          if (result.duplicate && !result.duplicate.confirmed) {
+            showAlert(
+              "error",
+              result.duplicate.saved
+                ? `疑似重复发票：与已保存的发票 ${result.duplicate.invoice_number} 的图片相近，请核对`
+                : "疑似重复发票：与之前识别过的图片相近，请核对"
+            );
+          } else if (result.duplicate?.saved) {
+            showAlert(
+              "error",
+              `疑似重复发票：与已保存的发票 ${result.duplicate.invoice_number} 的图片相同`
+            );
+          } else if (result.duplicate) {
+            showAlert("success", "与之前识别过的图片相同，已直接使用之前的识别结果");
+          } else if (result.documents) {
+            showAlert(
+              "success",
+              `图片中有${result.documents.length}张票据，已填入第一张识别成功的票据`
+            );
           } else {
-            showAlert("error", result.error || "OCR识别失败");
+            showAlert("success", "OCR识别成功");
           }
-        });
+        } else {
+          showAlert("error", result.error || "OCR识别失败");
+        }
       },
       (error) => {
         showAlert("error", error);
       }
     ).finally(() => {
+      window.removeEventListener("ocr_progress", onProgress);
+      setOcrStatus("");
       setPadding(false);
     });
   }
@@ -250,6 +370,8 @@ export function Invoice() {
   }
 
   function cleanFields() {
+    uploadSeqRef.current++;
+    setImageHandle(undefined);
     setInvoice(
       new InvoiceItem({
         date: new Date(),
@@ -268,36 +390,51 @@ export function Invoice() {
 
   function handleAdd() {
     if (verifyInvoiceItem(invoice, (error) => showAlert("error", error))) {
-      const errMsg = addInvoiceItem(invoice);
-      if (errMsg) {
-        showAlert("error", errMsg);
-      } else {
-        showAlert("success", "发票添加成功");
-        cleanFields();
-      }
+      handlePyApi(
+        async () => {
+          const errMsg = await addInvoiceItem(invoice, imagePayload());
+          if (errMsg) {
+            showAlert("error", errMsg);
+          } else {
+            showAlert("success", "发票添加成功");
+            cleanFields();
+          }
+        },
+        (error) => showAlert("error", error)
+      );
     }
   }
 
   function handleUpdate() {
     if (verifyInvoiceItem(invoice, (error) => showAlert("error", error))) {
-      const errorMsg = updateInvoiceItem(invoice);
-      if (errorMsg) {
-        showAlert("error", errorMsg);
-      } else {
-        showAlert("success", "发票更新成功");
-        cleanFields();
-      }
+      handlePyApi(
+        async () => {
+          const errorMsg = await updateInvoiceItem(invoice, imagePayload());
+          if (errorMsg) {
+            showAlert("error", errorMsg);
+          } else {
+            showAlert("success", "发票更新成功");
+            cleanFields();
+          }
+        },
+        (error) => showAlert("error", error)
+      );
     }
   }
 
   function handleDelete() {
-    const errorMsg = deleteInvoiceItem(invoice.invoice_number);
-    if (!errorMsg) {
-      showAlert("success", "发票删除成功");
-      cleanFields();
-    } else {
-      showAlert("error", errorMsg);
-    }
+    handlePyApi(
+      async () => {
+        const errorMsg = await deleteInvoiceItem(invoice.invoice_number);
+        if (!errorMsg) {
+          showAlert("success", "发票删除成功");
+          cleanFields();
+        } else {
+          showAlert("error", errorMsg);
+        }
+      },
+      (error) => showAlert("error", error)
+    );
   }
 
   function handleClean() {
@@ -397,7 +534,15 @@ export function Invoice() {
                 识别二维码
               </Button>
             </Grid>
-            <Grid size={3}>{padding && <CircularProgress size="30px" />}</Grid>
+            <Grid size={3}>
+              {padding && <CircularProgress size="30px" />}
+              {padding && ocrStatus && (
+                <span style={{ color: "#999", marginLeft: 8 }}>{ocrStatus}</span>
+              )}
+              {!padding && modelState !== "ready" && modelState !== "error" && (
+                <span style={{ color: "#999" }}>模型加载中...</span>
+              )}
+            </Grid>
           </Grid>
           <Grid container spacing={4}>
             <Grid size={6}>
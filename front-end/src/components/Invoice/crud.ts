@@ -1,56 +1,109 @@
-import type { InvoiceItem } from "../../classes";
-import { invoiceListAtom } from "../../store/invoiceList";
+import { InvoiceItem } from "../../classes";
+import { invoiceListAtom, invoiceTotalAtom } from "../../store/invoiceList";
 import { getDefaultStore } from "jotai";
+import type { InvoiceRecord } from "../../api";
+import { dateConver } from "../../utils/conver";
 
 const store = getDefaultStore();
+const pageSize = 50;
 
-export function addInvoiceItem(item: InvoiceItem): string | undefined {
-  if (
-    store
-      .get(invoiceListAtom)
-      .some(
-        (existingItem) => existingItem.invoice_number === item.invoice_number
-      )
-  ) {
-    return `发票号 ${item.invoice_number} 已存在。`;
-  }
-  store.set(invoiceListAtom, (prev) => [...prev, item]);
-  return;
+function formatDate(date: Date): string {
+  const month = `${date.getMonth() + 1}`.padStart(2, "0");
+  const day = `${date.getDate()}`.padStart(2, "0");
+  return `${date.getFullYear()}-${month}-${day}`;
 }
 
-export function updateInvoiceItem(item: InvoiceItem): string | undefined {
-  if (
-    !store
-      .get(invoiceListAtom)
-      .some(
-        (existingItem) => existingItem.invoice_number === item.invoice_number
-      )
-  ) {
-    return `发票号 ${item.invoice_number} 不存在。`;
+function toRecord(item: InvoiceItem, image?: string): InvoiceRecord {
+  return {
+    invoice_number: item.invoice_number.toString(),
+    invoice_type: item.invoice_type ?? null,
+    date: formatDate(item.date),
+    program: item.program,
+    amount: item.amount,
+    content: item.content,
+    image: image ?? item.image,
+  };
+}
+
+function fromRecord(record: InvoiceRecord): InvoiceItem {
+  const item = new InvoiceItem({
+    date: dateConver(record.date?.replaceAll("-", "") ?? "") ?? new Date(),
+    program: record.program ?? "",
+    amount: record.amount ?? 0,
+    content: record.content ?? "",
+    image: record.image ?? record.thumbnail ?? "",
+    invoice_id: record.invoice_id ?? 0,
+    invoice_number: Number(record.invoice_number),
+  });
+  item.invoice_type = record.invoice_type ?? undefined;
+  return item;
+}
+
+export async function refreshInvoiceList(): Promise<void> {
+  const result = await window.pywebview.api.list_invoices(1, pageSize);
+  if (result.success) {
+    store.set(invoiceListAtom, result.items.map(fromRecord));
+    store.set(invoiceTotalAtom, result.total);
   }
-  store.set(invoiceListAtom, (prev) =>
-    prev.map((prevItem) =>
-      prevItem.invoice_number === item.invoice_number ? item : prevItem
-    )
+}
+
+export async function loadMoreInvoices(): Promise<void> {
+  const loaded = store.get(invoiceListAtom);
+  const result = await window.pywebview.api.list_invoices(
+    Math.floor(loaded.length / pageSize) + 1,
+    pageSize
   );
-  return;
+  if (result.success) {
+    store.set(invoiceListAtom, [
+      ...loaded.slice(0, (result.page - 1) * pageSize),
+      ...result.items.map(fromRecord),
+    ]);
+    store.set(invoiceTotalAtom, result.total);
+  }
+}
+
+export async function getInvoiceItem(
+  number: number
+): Promise<InvoiceItem | undefined> {
+  const result = await window.pywebview.api.get_invoice(number.toString());
+  return result.success && result.invoice
+    ? fromRecord(result.invoice)
+    : undefined;
 }
 
-export function deleteInvoiceItem(number: number): string | undefined {
-  if (
-    !store
-      .get(invoiceListAtom)
-      .some((item) => item.invoice_number === number)
-  ) {
-    return `发票号 ${number} 不存在。`;
+export async function addInvoiceItem(
+  item: InvoiceItem,
+  image?: string
+): Promise<string | undefined> {
+  const result = await window.pywebview.api.add_invoice(toRecord(item, image));
+  if (!result.success) {
+    return result.error;
   }
-  store.set(invoiceListAtom, (prev) =>
-    prev.filter((item) => item.invoice_number !== number)
+  await refreshInvoiceList();
+  return;
+}
+
+export async function updateInvoiceItem(
+  item: InvoiceItem,
+  image?: string
+): Promise<string | undefined> {
+  const result = await window.pywebview.api.update_invoice(
+    toRecord(item, image)
   );
+  if (!result.success) {
+    return result.error;
+  }
+  await refreshInvoiceList();
   return;
 }
 
-export function clearInvoiceList(): string | undefined {
-  store.set(invoiceListAtom, []);
+export async function deleteInvoiceItem(
+  number: number
+): Promise<string | undefined> {
+  const result = await window.pywebview.api.delete_invoice(number.toString());
+  if (!result.success) {
+    return result.error;
+  }
+  await refreshInvoiceList();
   return;
 }
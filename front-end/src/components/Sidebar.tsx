@@ -1,11 +1,58 @@
-import { Divider, List, ListItemButton, ListItemText } from "@mui/material";
+import { useEffect, useState } from "react";
+import {
+  Button,
+  Divider,
+  List,
+  ListItemButton,
+  ListItemText,
+} from "@mui/material";
 import { useAtom } from "jotai";
-import { invoiceListAtom } from "../store/invoiceList";
+import { invoiceListAtom, invoiceTotalAtom } from "../store/invoiceList";
+import { loadMoreInvoices, refreshInvoiceList } from "./Invoice/crud";
+import { handlePyApi } from "../script/handlePyApi";
 
 export function Sidebar() {
   const [invoiceList] = useAtom(invoiceListAtom);
-  const list_prompt = "当前发票数量: " + invoiceList.length;
+  const [invoiceTotal] = useAtom(invoiceTotalAtom);
+  const list_prompt = "当前发票数量: " + invoiceTotal;
   const hint = "当前还没有添加发票";
+  const [exportStatus, setExportStatus] = useState("");
+
+  useEffect(() => {
+    // pywebview 的 API 在页面加载后才注入
+    const load = () =>
+      handlePyApi(refreshInvoiceList, (error) => console.error(error));
+    if (window.pywebview?.api) {
+      load();
+    } else {
+      window.addEventListener("pywebviewready", load, { once: true });
+      return () => window.removeEventListener("pywebviewready", load);
+    }
+  }, []);
+
+  function onClickExport(fmt: "xlsx" | "zip") {
+    const onProgress = (event: Event) => {
+      const { finished, total } = (
+        event as CustomEvent<{ finished: number; total: number }>
+      ).detail;
+      setExportStatus(`正在导出 ${finished}/${total}`);
+    };
+    window.addEventListener("export_progress", onProgress);
+    setExportStatus("正在导出...");
+    handlePyApi(
+      async () => {
+        const result = await window.pywebview.api.export_invoices(fmt);
+        setExportStatus(
+          result.success
+            ? `已导出 ${result.count} 张发票`
+            : result.error || "导出失败"
+        );
+      },
+      (error) => setExportStatus(error)
+    ).finally(() => {
+      window.removeEventListener("export_progress", onProgress);
+    });
+  }
 
   return (
     <>
@@ -15,8 +62,18 @@ export function Sidebar() {
         <List component="nav">
           <ListItemText
             primary={list_prompt}
-            secondary={invoiceList.length > 0 ? "" : hint}
+            secondary={invoiceTotal > 0 ? exportStatus : hint}
           />
+          {invoiceTotal > 0 && (
+            <>
+              <Button size="small" onClick={() => onClickExport("xlsx")}>
+                导出表格
+              </Button>
+              <Button size="small" onClick={() => onClickExport("zip")}>
+                导出报销包
+              </Button>
+            </>
+          )}
           {invoiceList.map((invoice, index) => (
             <ListItemButton
               key={index}
@@ -41,6 +98,16 @@ export function Sidebar() {
               <Divider />
             </ListItemButton>
           ))}
+          {invoiceList.length < invoiceTotal && (
+            <Button
+              fullWidth
+              onClick={() =>
+                handlePyApi(loadMoreInvoices, (error) => console.error(error))
+              }
+            >
+              加载更多
+            </Button>
+          )}
         </List>
       </div>
     </>
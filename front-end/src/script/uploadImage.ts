@@ -0,0 +1,24 @@
+/**
+ * 将图片以二进制形式上传到本地服务器，返回供 pywebview API 使用的句柄。
+ * 上传失败（例如在 vite 开发服务器中运行）时返回 undefined，调用方应回退到 data URL。
+ */
+export const uploadImage = async (
+  image: Blob
+): Promise<string | undefined> => {
+  try {
+    const response = await fetch("/api/upload", {
+      method: "POST",
+      headers: { "Content-Type": image.type || "application/octet-stream" },
+      body: image,
+    });
+    if (!response.ok) {
+      console.warn(`Upload failed: ${response.status}`);
+      return;
+    }
+    const result: { handle: string } = await response.json();
+    return result.handle;
+  } catch (err) {
+    console.warn("Upload failed:", err);
+    return;
+  }
+};
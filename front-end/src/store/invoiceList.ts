@@ -1,4 +1,7 @@
 import {atom} from "jotai";
 import type { InvoiceItem } from "../classes";
 
+// 已从后端发票数据库加载的发票，按页追加
 export const invoiceListAtom = atom<InvoiceItem[]>([]);
+// 发票数据库中的发票总数
+export const invoiceTotalAtom = atom<number>(0);
@@ -0,0 +1,196 @@
+import io
+import time
+import hashlib
+from typing import List
+
+from loguru import logger as log
+
+from PIL import Image
+from numpy import array
+
+from config import config
+from metrics import span, trace
+from qr import find_invoice_qrcode
+from preprocess import preprocess_documents
+from utils import ocr_batch_pipline, ocr_pipline
+
+from classes import api_invoice_error, api_invoice_return, invoice_content, ocr_image
+
+
+def bytes_to_img(img_bytes: bytes | None) -> Image.Image | None:
+    """
+    Opens encoded image file bytes as a PIL Image object.
+    """
+    if not img_bytes:
+        return
+
+    image_stream = io.BytesIO(img_bytes)
+
+    try:
+        img = Image.open(image_stream)
+    except (IOError, ValueError) as e:
+        log.error(f"Cannot identify image file: {e}")
+        return
+
+    return img
+
+
+def img_hash(img_bytes: bytes) -> str:
+    """
+    Content hash of the encoded image bytes, used as the result cache key.
+    """
+    return hashlib.sha256(img_bytes).hexdigest()
+
+
+def invoice_qr_codes(img: Image.Image, force: bool = False) -> List[str] | None:
+    """
+    Decodes the invoice QR code of an image, by default only for the OCR fast path.
+    Args:
+        img (Image.Image): The decoded image.
+        force (bool): Decode even when `qr_fast_path` is disabled.
+    Returns:
+        List[str] | None: The verified, comma-split QR code fields, or None when the
+            fast path is disabled and `force` is not set, or no single valid invoice
+            QR code is found.
+    """
+    if not (force or config.qr_fast_path):
+        return
+
+    try:
+        with span("qr_decode") as attrs:
+            return find_invoice_qrcode(img, attrs)
+    except Exception as e:
+        log.warning(f"二维码识别失败: {e}")
+        return
+
+
+def check_img(img: Image.Image | None) -> api_invoice_error | None:
+    """
+    Checks that a decoded image can be sent to the OCR pipeline.
+    """
+    if not img:
+        return api_invoice_error("Cannot identify image file")
+
+    if img.format not in ["JPEG", "PNG", "BMP", "TIFF"]:
+        return api_invoice_error(f"Unsupported image format: {img.format}")
+
+
+def pipline_result(result) -> api_invoice_return | api_invoice_error:
+    if isinstance(result, invoice_content):
+        return api_invoice_return(content=result)
+
+    if isinstance(result, str):
+        return api_invoice_error(error=result)
+
+    return api_invoice_error(error="Unknow pipline result！请联系管理员！")
+
+
+def decode_documents(
+    img_bytes: bytes | None, qr_codes: List[str] | None = None
+) -> List[tuple[tuple[int, int, int, int] | None, ocr_image]] | api_invoice_error:
+    """
+    Decodes and preprocesses encoded image file bytes, recorded as the `decode` metrics span,
+    and splits a scan of several receipts into one pipeline input per receipt.
+    Args:
+        img_bytes (bytes | None): The encoded image file.
+        qr_codes (List[str] | None): Invoice QR code fields already decoded from the image,
+            an empty list if it has none. Decoded here when None.
+    Returns:
+        List[tuple[tuple[int, int, int, int] | None, ocr_image]] | api_invoice_error:
+            The region of each document in the upright image (None when the image
+            was not split) and its pipeline input, or an error if the image cannot be used.
+    """
+    with span("decode", bytes=len(img_bytes or b"")) as attrs:
+        img = bytes_to_img(img_bytes)
+        if error := check_img(img):
+            return error
+        attrs["width"], attrs["height"] = img.size
+        documents = preprocess_documents(img)
+        attrs["documents"] = len(documents)
+
+    if len(documents) == 1:
+        img_ndarray = array(documents[0][1])
+        if img_ndarray.size == 0:
+            return api_invoice_error("Image size is zero")
+        if qr_codes is None:
+            qr_codes = invoice_qr_codes(img)
+        return [(None, ocr_image(img_ndarray, img_hash(img_bytes), qr_codes or None))]
+
+    page_hash = img_hash(img_bytes)
+    return [
+        (
+            region,
+            ocr_image(
+                array(document),
+                img_hash(f"{page_hash}:{region}".encode()),
+                invoice_qr_codes(document),
+            ),
+        )
+        for region, document in documents
+    ]
+
+
+def documents_result(
+    regions: List[tuple[int, int, int, int]],
+    results: List[api_invoice_return | api_invoice_error],
+) -> api_invoice_return | api_invoice_error:
+    """
+    Combines the results of the documents split from one image.
+    Returns:
+        api_invoice_return | api_invoice_error: The first successful result, carrying every
+            document's result dict with its `region` as `documents`, or the first error
+            if no document was recognized.
+    """
+    first = next((result for result in results if result.success), None)
+    if first is None:
+        return results[0]
+    documents = [
+        {**result.to_dict(), "region": list(region)}
+        for region, result in zip(regions, results)
+    ]
+    return api_invoice_return(first.content, documents)
+
+
+def ocr_img_bytes(
+    img_bytes: bytes | None, qr_codes: List[str] | None = None
+) -> api_invoice_return | api_invoice_error:
+    """
+    Runs the whole OCR pipeline on encoded image file bytes.
+    A scan of several receipts is split and the receipts are recognized as one batch.
+    Args:
+        img_bytes (bytes | None): The encoded image file.
+        qr_codes (List[str] | None): Invoice QR code fields already decoded from the image,
+            see `decode_documents`.
+    Returns:
+        api_invoice_return | api_invoice_error: The OCR result, with a `documents` list
+            when the image held several receipts.
+    """
+    with trace("img_ocr", bytes=len(img_bytes or b"")) as current:
+        documents = decode_documents(img_bytes, qr_codes)
+        if isinstance(documents, api_invoice_error):
+            return documents
+
+        start = time.perf_counter()
+        if len(documents) > 1:
+            results: List[api_invoice_return | api_invoice_error] = [
+                api_invoice_error("识别失败") for _ in documents
+            ]
+
+            def finish(index: int, result: invoice_content | str):
+                results[index] = pipline_result(result)
+
+            ocr_batch_pipline((image for _, image in documents), callback=finish)
+            log.info(
+                f"识别{len(documents)}张票据耗时{time.perf_counter() - start:.2f}s"
+            )
+            return documents_result([region for region, _ in documents], results)
+
+        image = documents[0][1]
+        result = ocr_pipline(image.img_ndarray, image.img_hash, image.qr_codes)
+        if current:
+            current.attrs["qr_fast_path"] = bool(image.qr_codes)
+        log.info(
+            f"识别耗时{time.perf_counter() - start:.2f}s"
+            f"{'（二维码快速路径）' if image.qr_codes else ''}"
+        )
+        return pipline_result(result)
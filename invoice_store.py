@@ -0,0 +1,338 @@
+import io
+import time
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Iterator
+
+from PIL import Image
+from loguru import logger as log
+
+from config import config, self_dir
+
+# 可以用于排序的列，防止把任意字符串拼接进SQL
+order_columns = {"date", "amount", "invoice_number", "invoice_type", "created"}
+
+invoice_columns = [
+    "invoice_number",
+    "invoice_type",
+    "date",
+    "program",
+    "amount",
+    "content",
+]
+
+
+class InvoiceStoreError(Exception):
+    pass
+
+
+def make_thumbnail(img_bytes: bytes, size: int) -> bytes | None:
+    """
+    生成JPEG缩略图
+    :param img_bytes: 原图文件字节
+    :param size: 缩略图长边像素数
+    :return: 无法识别图片时返回None
+    """
+    try:
+        with Image.open(io.BytesIO(img_bytes)) as img:
+            img.thumbnail((size, size))
+            buffer = io.BytesIO()
+            img.convert("RGB").save(buffer, format="JPEG", quality=80)
+    except (IOError, ValueError) as e:
+        log.warning(f"无法生成缩略图: {e}")
+        return None
+    return buffer.getvalue()
+
+
+class InvoiceStore:
+    """
+    基于SQLite的发票数据库。
+    发票字段、原图和缩略图分表保存，列表查询只读取字段表，不会加载图片。
+    """
+
+    def __init__(self, path: Path, thumbnail_size: int, max_page_size: int):
+        self.path = path
+        self.thumbnail_size = thumbnail_size
+        self.max_page_size = max_page_size
+        self._lock = threading.Lock()
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA foreign_keys=ON")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS invoices ("
+                "invoice_id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "invoice_number TEXT NOT NULL UNIQUE, invoice_type TEXT, "
+                "date TEXT, program TEXT, amount REAL, content TEXT, "
+                "created REAL, updated REAL)"
+            )
+            # UNIQUE约束已为invoice_number建立索引
+            for column in ("date", "amount", "invoice_type"):
+                self._conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS invoices_{column} "
+                    f"ON invoices ({column})"
+                )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS images ("
+                "invoice_id INTEGER PRIMARY KEY "
+                "REFERENCES invoices (invoice_id) ON DELETE CASCADE, "
+                "mime TEXT, image BLOB)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS thumbnails ("
+                "invoice_id INTEGER PRIMARY KEY "
+                "REFERENCES invoices (invoice_id) ON DELETE CASCADE, "
+                "thumbnail BLOB)"
+            )
+
+    @staticmethod
+    def _fields(item: dict) -> dict:
+        fields = {key: item.get(key) for key in invoice_columns}
+        fields["invoice_number"] = str(fields["invoice_number"] or "").strip()
+        if not fields["invoice_number"]:
+            raise InvoiceStoreError("发票号不能为空。")
+        if fields["amount"] is not None:
+            fields["amount"] = float(fields["amount"])
+        return fields
+
+    def _put_image(self, invoice_id: int, image: tuple[str, bytes] | None):
+        if image is None:
+            return
+        mime, img_bytes = image
+        self._conn.execute(
+            "INSERT OR REPLACE INTO images (invoice_id, mime, image) VALUES (?, ?, ?)",
+            (invoice_id, mime, img_bytes),
+        )
+        self._conn.execute(
+            "INSERT OR REPLACE INTO thumbnails (invoice_id, thumbnail) VALUES (?, ?)",
+            (invoice_id, make_thumbnail(img_bytes, self.thumbnail_size)),
+        )
+
+    def add(self, item: dict, image: tuple[str, bytes] | None = None) -> dict:
+        """
+        :param item: 发票字段，invoice_number不能与已有发票重复
+        :param image: 原图的MIME类型和文件字节
+        :return: 保存后的发票字段
+        """
+        fields = self._fields(item)
+        now = time.time()
+        with self._lock, self._conn:
+            try:
+                cursor = self._conn.execute(
+                    f"INSERT INTO invoices ({', '.join(invoice_columns)}, created, updated) "
+                    f"VALUES ({', '.join('?' * len(invoice_columns))}, ?, ?)",
+                    [*fields.values(), now, now],
+                )
+            except sqlite3.IntegrityError:
+                raise InvoiceStoreError(f"发票号 {fields['invoice_number']} 已存在。")
+            self._put_image(cursor.lastrowid, image)
+        return self.get(fields["invoice_number"])
+
+    def update(self, item: dict, image: tuple[str, bytes] | None = None) -> dict:
+        """
+        按invoice_number更新发票字段，image为None时保留原图
+        """
+        fields = self._fields(item)
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT invoice_id FROM invoices WHERE invoice_number = ?",
+                (fields["invoice_number"],),
+            ).fetchone()
+            if row is None:
+                raise InvoiceStoreError(f"发票号 {fields['invoice_number']} 不存在。")
+            self._conn.execute(
+                f"UPDATE invoices SET {', '.join(f'{k} = ?' for k in invoice_columns)}, "
+                "updated = ? WHERE invoice_id = ?",
+                [*fields.values(), time.time(), row["invoice_id"]],
+            )
+            self._put_image(row["invoice_id"], image)
+        return self.get(fields["invoice_number"])
+
+    def delete(self, invoice_number: str):
+        with self._lock, self._conn:
+            cursor = self._conn.execute(
+                "DELETE FROM invoices WHERE invoice_number = ?", (str(invoice_number),)
+            )
+        if cursor.rowcount == 0:
+            raise InvoiceStoreError(f"发票号 {invoice_number} 不存在。")
+
+    def get(self, invoice_number: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM invoices WHERE invoice_number = ?",
+                (str(invoice_number),),
+            ).fetchone()
+        return dict(row) if row else None
+
+    def image(self, invoice_number: str) -> tuple[str, bytes] | None:
+        """
+        :return: 原图的MIME类型和文件字节
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT mime, image FROM images JOIN invoices USING (invoice_id) "
+                "WHERE invoice_number = ?",
+                (str(invoice_number),),
+            ).fetchone()
+        return (row["mime"], row["image"]) if row else None
+
+    def thumbnails(self, invoice_numbers: list[str]) -> dict[str, bytes]:
+        """
+        :return: 发票号到JPEG缩略图的映射，没有图片的发票不包含在内
+        """
+        invoice_numbers = [str(number) for number in invoice_numbers]
+        result = {}
+        with self._lock:
+            for i in range(0, len(invoice_numbers), 500):
+                chunk = invoice_numbers[i : i + 500]
+                result.update(
+                    self._conn.execute(
+                        "SELECT invoice_number, thumbnail FROM thumbnails "
+                        "JOIN invoices USING (invoice_id) "
+                        f"WHERE thumbnail IS NOT NULL AND invoice_number IN "
+                        f"({','.join('?' * len(chunk))})",
+                        chunk,
+                    ).fetchall()
+                )
+        return result
+
+    def query(
+        self,
+        page: int = 1,
+        page_size: int = 50,
+        invoice_type: str | None = None,
+        date_from: str | None = None,
+        date_to: str | None = None,
+        min_amount: float | None = None,
+        max_amount: float | None = None,
+        keyword: str | None = None,
+        order_by: str = "date",
+        descending: bool = True,
+    ) -> dict:
+        """
+        分页查询发票字段
+        :param page: 页码，从1开始
+        :param page_size: 每页条数，不超过max_page_size
+        :param date_from: 起始日期（含），YYYY-MM-DD
+        :param date_to: 截止日期（含），YYYY-MM-DD
+        :param keyword: 在项目名称中搜索，或按发票号前缀匹配
+        :param order_by: 排序列，见order_columns
+        :return: {"total", "page", "page_size", "items"}
+        """
+        page = max(int(page), 1)
+        page_size = min(max(int(page_size), 1), self.max_page_size)
+        where, params = self._where(
+            invoice_type, date_from, date_to, min_amount, max_amount, keyword
+        )
+        order = self._order(order_by, descending)
+
+        with self._lock:
+            total = self._conn.execute(
+                f"SELECT COUNT(*) FROM invoices {where}", params
+            ).fetchone()[0]
+            rows = self._conn.execute(
+                f"SELECT * FROM invoices {where} {order} LIMIT ? OFFSET ?",
+                [*params, page_size, (page - 1) * page_size],
+            ).fetchall()
+        return {
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "items": [dict(row) for row in rows],
+        }
+
+    @staticmethod
+    def _where(
+        invoice_type: str | None = None,
+        date_from: str | None = None,
+        date_to: str | None = None,
+        min_amount: float | None = None,
+        max_amount: float | None = None,
+        keyword: str | None = None,
+    ) -> tuple[str, list]:
+        """
+        将查询条件转换为WHERE子句与参数
+        """
+        conditions, params = [], []
+        if invoice_type:
+            conditions.append("invoice_type = ?")
+            params.append(invoice_type)
+        if date_from:
+            conditions.append("date >= ?")
+            params.append(date_from)
+        if date_to:
+            conditions.append("date <= ?")
+            params.append(date_to)
+        if min_amount is not None:
+            conditions.append("amount >= ?")
+            params.append(min_amount)
+        if max_amount is not None:
+            conditions.append("amount <= ?")
+            params.append(max_amount)
+        if keyword:
+            conditions.append("(program LIKE ? OR invoice_number LIKE ?)")
+            params += [f"%{keyword}%", f"{keyword}%"]
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return where, params
+
+    @staticmethod
+    def _order(order_by: str, descending: bool) -> str:
+        if order_by not in order_columns:
+            raise InvoiceStoreError(f"不支持的排序列: {order_by}")
+        direction = "DESC" if descending else "ASC"
+        return f"ORDER BY {order_by} {direction}, invoice_id {direction}"
+
+    def count(self, **filters) -> int:
+        where, params = self._where(**filters)
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT COUNT(*) FROM invoices {where}", params
+            ).fetchone()[0]
+
+    def iter_invoices(
+        self,
+        filters: dict | None = None,
+        order_by: str = "date",
+        descending: bool = False,
+        with_images: bool = False,
+    ) -> Iterator[dict]:
+        """
+        逐条读取符合条件的发票，用于导出大量发票。
+        使用单独的只读连接分批读取，不会长时间占用共享连接，也不会一次性载入所有图片
+        :param filters: 与query相同的查询条件
+        :param with_images: 是否同时读取原图，结果中增加mime和image
+        """
+        where, params = self._where(**(filters or {}))
+        order = self._order(order_by, descending)
+        columns = "invoices.*"
+        join = ""
+        if with_images:
+            columns += ", images.mime, images.image"
+            join = "LEFT JOIN images USING (invoice_id)"
+
+        conn = sqlite3.connect(f"{self.path.as_uri()}?mode=ro", uri=True, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            cursor = conn.execute(
+                f"SELECT {columns} FROM invoices {join} {where} {order}", params
+            )
+            while rows := cursor.fetchmany(50 if with_images else 500):
+                for row in rows:
+                    yield dict(row)
+        finally:
+            conn.close()
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM invoices")
+
+
+invoice_store = InvoiceStore(
+    path=self_dir.joinpath(config.invoice_store.path).resolve(),
+    thumbnail_size=config.invoice_store.thumbnail_size,
+    max_page_size=config.invoice_store.max_page_size,
+)
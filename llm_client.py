@@ -0,0 +1,398 @@
+import json
+import time
+import random
+import threading
+import functools
+
+import httpx
+from loguru import logger as log
+
+from config import config
+from vector_cache import decode_vector, embedding_cache, encode_vector
+
+# 可以重试的响应状态码
+retry_status_codes = {429, 502, 503, 504}
+
+_clients: dict[str, httpx.Client] = {}
+_clients_lock = threading.Lock()
+_installed = False
+
+
+def endpoint_kind(request: httpx.Request) -> str:
+    """
+    按请求判断对应的是哪个BotConfig：向量接口为retriever，带图片的对话请求为mllm，其余为chat
+    """
+    if request.url.path.endswith("/embeddings"):
+        return "retriever"
+    if b'"image_url"' in request.content:
+        return "mllm"
+    return "chat"
+
+
+def embedding_inputs(body: dict) -> list | None:
+    """
+    向量请求的输入列表，单条文本或单个token列表会被包装为列表
+    """
+    inputs = body.get("input")
+    if isinstance(inputs, str) or (
+        isinstance(inputs, list) and inputs and isinstance(inputs[0], int)
+    ):
+        return [inputs]
+    return inputs if isinstance(inputs, list) else None
+
+
+def json_request(request: httpx.Request, body: dict) -> httpx.Request:
+    """
+    以新的JSON请求体复制请求
+    """
+    return httpx.Request(
+        request.method,
+        request.url,
+        headers=[
+            (k, v)
+            for k, v in request.headers.items()
+            if k.lower() != "content-length"
+        ],
+        json=body,
+        extensions=request.extensions,
+    )
+
+
+def json_response(request: httpx.Request, status_code: int, body: dict):
+    return httpx.Response(
+        status_code,
+        headers={"Content-Type": "application/json"},
+        content=json.dumps(body).encode(),
+        request=request,
+    )
+
+
+class _EmbeddingBatch:
+    def __init__(self):
+        self.inputs: list = []
+        # 每个请求在合并后input中的起止位置
+        self.slices: list[tuple[int, int]] = []
+        self.closed = False
+        self.done = threading.Event()
+        self.status_code = 0
+        self.body: dict = {}
+
+
+class EmbeddingBatcher:
+    """
+    将短时间内到达的多个向量请求合并为一次上游请求，再按位置拆分响应。
+    只有除input外参数完全相同的请求才会合并。
+    没有其他向量请求正在发送时立即发送，只有并发请求时才等待后续请求加入。
+    """
+
+    def __init__(self, send, max_batch_size: int, wait: float):
+        self._send = send
+        self.max_batch_size = max_batch_size
+        self.wait = wait
+        self._batches: dict[str, _EmbeddingBatch] = {}
+        self._lock = threading.Lock()
+        # 正在发送给上游的合并请求数量
+        self._in_flight = 0
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        try:
+            body = json.loads(request.content)
+        except json.JSONDecodeError:
+            return self._send("retriever", request)
+
+        inputs = embedding_inputs(body)
+        if inputs is None or len(inputs) >= self.max_batch_size:
+            return self._send("retriever", request)
+
+        group = str(request.url) + json.dumps(
+            {k: v for k, v in body.items() if k != "input"}, sort_keys=True
+        )
+        with self._lock:
+            batch = self._batches.get(group)
+            leader = (
+                batch is None
+                or batch.closed
+                or len(batch.inputs) + len(inputs) > self.max_batch_size
+            )
+            if leader:
+                batch = _EmbeddingBatch()
+                self._batches[group] = batch
+            start = len(batch.inputs)
+            batch.inputs += inputs
+            batch.slices.append((start, len(batch.inputs)))
+
+        if leader:
+            with self._lock:
+                busy = self._in_flight > 0
+            if busy:
+                time.sleep(self.wait)
+            with self._lock:
+                batch.closed = True
+                if self._batches.get(group) is batch:
+                    del self._batches[group]
+                self._in_flight += 1
+            try:
+                self._flush(request, body, batch)
+            finally:
+                with self._lock:
+                    self._in_flight -= 1
+        else:
+            batch.done.wait()
+
+        return self._split(request, batch, start)
+
+    def _flush(self, request: httpx.Request, body: dict, batch: _EmbeddingBatch):
+        if len(batch.slices) > 1:
+            log.debug(f"合并{len(batch.slices)}个向量请求，共{len(batch.inputs)}条输入")
+        combined = json_request(request, {**body, "input": batch.inputs})
+        try:
+            response = self._send("retriever", combined)
+            response.read()
+            batch.status_code = response.status_code
+            batch.body = response.json()
+            response.close()
+        except Exception as e:
+            batch.status_code = 502
+            batch.body = {"error": {"message": f"embedding request failed: {e}"}}
+        finally:
+            batch.done.set()
+
+    @staticmethod
+    def _split(
+        request: httpx.Request, batch: _EmbeddingBatch, start: int
+    ) -> httpx.Response:
+        body = batch.body
+        if batch.status_code == 200 and isinstance(body.get("data"), list):
+            end = next(e for s, e in batch.slices if s == start)
+            data = sorted(body["data"], key=lambda item: item.get("index", 0))
+            body = {
+                **body,
+                "data": [
+                    {**item, "index": i} for i, item in enumerate(data[start:end])
+                ],
+            }
+        return json_response(request, batch.status_code, body)
+
+
+class LlmTransport(httpx.BaseTransport):
+    """
+    LLM接口的共享传输层：连接池与长连接复用、按接口限制并发、设置超时、失败后退避重试，
+    并合并并发的向量请求
+    """
+
+    def __init__(self):
+        settings = config.llm_client
+        self._transport = httpx.HTTPTransport(
+            limits=httpx.Limits(
+                max_connections=settings.max_connections,
+                max_keepalive_connections=settings.max_connections,
+                keepalive_expiry=settings.keepalive_expiry,
+            )
+        )
+        self._semaphores = {
+            "retriever": threading.BoundedSemaphore(settings.retriever_concurrency),
+            "mllm": threading.BoundedSemaphore(settings.mllm_concurrency),
+            "chat": threading.BoundedSemaphore(settings.chat_concurrency),
+        }
+        self._timeouts = {
+            "retriever": settings.retriever_timeout,
+            "mllm": settings.mllm_timeout,
+            "chat": settings.chat_timeout,
+        }
+        self._batcher = (
+            EmbeddingBatcher(
+                self._send,
+                settings.embedding_batch_size,
+                settings.embedding_batch_wait_ms / 1000,
+            )
+            if settings.embedding_batch_size > 1
+            else None
+        )
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request.read()
+        kind = endpoint_kind(request)
+        if kind == "retriever":
+            if embedding_cache:
+                return self._cached_embeddings(request)
+            return self._embed(request)
+        return self._send(kind, request)
+
+    def _embed(self, request: httpx.Request) -> httpx.Response:
+        if self._batcher:
+            return self._batcher.handle(request)
+        return self._send("retriever", request)
+
+    def _cached_embeddings(self, request: httpx.Request) -> httpx.Response:
+        """
+        先从向量缓存中查找每条输入，只把未命中的文本块发送给向量接口
+        """
+        try:
+            body = json.loads(request.content)
+        except json.JSONDecodeError:
+            return self._embed(request)
+        inputs = embedding_inputs(body)
+        if not inputs:
+            return self._embed(request)
+
+        model = body.get("model", "")
+        params = {
+            k: v
+            for k, v in body.items()
+            if k not in ("input", "encoding_format", "user")
+        }
+        keys = [embedding_cache.key(model, params, item) for item in inputs]
+        vectors = embedding_cache.get_many(keys)
+        missed = [i for i, vector in enumerate(vectors) if vector is None]
+        log.debug(f"向量缓存命中{len(inputs) - len(missed)}/{len(inputs)}")
+
+        usage = {"prompt_tokens": 0, "total_tokens": 0}
+        if missed:
+            response = self._embed(
+                json_request(request, {**body, "input": [inputs[i] for i in missed]})
+            )
+            response.read()
+            if response.status_code != 200:
+                return response
+            result = response.json()
+            data = sorted(
+                result.get("data", []), key=lambda item: item.get("index", 0)
+            )
+            if len(data) != len(missed):
+                log.warning("向量接口返回的数量与请求不一致，跳过缓存")
+                return response
+
+            new = [
+                (keys[i], encode_vector(item["embedding"]))
+                for i, item in zip(missed, data)
+            ]
+            embedding_cache.put_many(model, new)
+            for i, (_, vector) in zip(missed, new):
+                vectors[i] = vector
+            usage = result.get("usage") or usage
+
+        encoding_format = body.get("encoding_format")
+        return json_response(
+            request,
+            200,
+            {
+                "object": "list",
+                "model": model,
+                "data": [
+                    {
+                        "object": "embedding",
+                        "index": i,
+                        "embedding": decode_vector(vector, encoding_format),
+                    }
+                    for i, vector in enumerate(vectors)
+                ],
+                "usage": usage,
+            },
+        )
+
+    def _send(self, kind: str, request: httpx.Request) -> httpx.Response:
+        settings = config.llm_client
+        request.extensions["timeout"] = httpx.Timeout(
+            self._timeouts[kind], connect=settings.connect_timeout
+        ).as_dict()
+
+        with self._semaphores[kind]:
+            for attempt in range(settings.max_retries + 1):
+                last = attempt == settings.max_retries
+                try:
+                    response = self._transport.handle_request(request)
+                except (httpx.ConnectError, httpx.RemoteProtocolError) as e:
+                    if last:
+                        raise
+                    log.warning(f"{kind}接口连接失败，准备重试: {e}")
+                else:
+                    if response.status_code not in retry_status_codes or last:
+                        return response
+                    log.warning(f"{kind}接口返回{response.status_code}，准备重试")
+                    response.read()
+                    response.close()
+
+                delay = settings.backoff * 2**attempt
+                time.sleep(delay + random.uniform(0, delay / 2))
+
+    def close(self):
+        self._transport.close()
+
+
+def http_client(base_url: str) -> httpx.Client:
+    """
+    获取指定服务地址共享的HTTP客户端
+    """
+    with _clients_lock:
+        client = _clients.get(base_url)
+        if client is None or client.is_closed:
+            _clients[base_url] = httpx.Client(transport=LlmTransport())
+        return _clients[base_url]
+
+
+def llm_base_urls() -> set[str]:
+    return {
+        bot_config.base_url.rstrip("/")
+        for bot_config in (
+            config.retriever_config,
+            config.mllm_chat_bot_config,
+            config.chat_bot_config,
+        )
+    }
+
+
+def openai_client(bot_config: dict):
+    """
+    按PaddleX的bot配置创建使用共享HTTP客户端的OpenAI客户端，并关闭OpenAI SDK自带的重试
+    :param bot_config: 传给PaddleX的retriever_config或chat_bot_config
+    :return: 服务地址不是配置中的LLM服务时为None
+    """
+    import openai
+
+    base_url = str(bot_config.get("base_url") or "").rstrip("/")
+    if base_url not in llm_base_urls():
+        return None
+    return openai.OpenAI(
+        api_key=bot_config.get("api_key"),
+        base_url=base_url,
+        http_client=http_client(base_url),
+        max_retries=0,
+    )
+
+
+def install():
+    """
+    让管道内部创建的OpenAI客户端使用共享的HTTP客户端。
+    PaddleX每次调用build_vector、mllm_pred、chat时都会通过create_retriever、create_chat_bot
+    新建客户端，这里包装这两个工厂函数，为指向配置中LLM服务的客户端换上共享连接池。
+    """
+    global _installed
+    if _installed or not config.llm_client.enabled:
+        return
+
+    from paddlex.inference import pipelines
+
+    create_chat_bot = pipelines.create_chat_bot
+    create_retriever = pipelines.create_retriever
+
+    @functools.wraps(create_chat_bot)
+    def shared_chat_bot(bot_config: dict, *args, **kwargs):
+        chat_bot = create_chat_bot(bot_config, *args, **kwargs)
+        if hasattr(chat_bot, "client") and (client := openai_client(bot_config)):
+            chat_bot.client = client
+        return chat_bot
+
+    @functools.wraps(create_retriever)
+    def shared_retriever(bot_config: dict, *args, **kwargs):
+        retriever = create_retriever(bot_config, *args, **kwargs)
+        # langchain的OpenAIEmbeddings通过client属性（OpenAI客户端的embeddings）发送请求
+        embedding = getattr(retriever, "embedding", None)
+        if hasattr(embedding, "client") and (client := openai_client(bot_config)):
+            embedding.client = client.embeddings
+        return retriever
+
+    # 管道在调用时才从pipelines模块导入工厂函数，替换模块属性即可生效
+    pipelines.create_chat_bot = shared_chat_bot
+    pipelines.create_retriever = shared_retriever
+    _installed = True
+    log.info("LLM接口已使用共享连接池")
@@ -1,87 +1,28 @@
 import sys
 from pathlib import Path
-import mimetypes
 import threading
+import multiprocessing
 from wsgiref.simple_server import make_server
-from urllib.parse import unquote
 
 from loguru import logger as log
-import webview
 from log import log_init
 
-log_init()
+from static_server import QuietHandler, StaticFiles, ThreadingWSGIServer
+from upload import upload_app
 
-import config
-from api import API
+# OCR工作进程以spawn方式启动时会以__mp_main__重新导入本模块，
+# 因此模块级别只做轻量的导入，初始化、检查和界面相关的导入都在main()中进行
 
-# 确保正确的 MIME 类型映射
-mimetypes.add_type("application/javascript", ".js")
-mimetypes.add_type("text/css", ".css")
-mimetypes.add_type("application/json", ".json")
 
-# 获取应用程序的基础路径
-config.self_dir = Path(sys.argv[0]).resolve().parent
-
-# 构建好的前端文件路径
-resource_dir = Path.joinpath(config.self_dir, "resource")
-if not resource_dir.exists():
-    log.error(
-        f"Resource directory {resource_dir} does not exist. Please build the project first."
-    )
-    sys.exit(1)
-
-log.info(f"Using resource directory: {resource_dir}")
-
-
-def static_file_app(environ, start_response):
+def make_static_file_app(static_files: StaticFiles):
     """WSGI 应用程序，用于提供静态文件服务"""
-    path = environ["PATH_INFO"]
-
-    # 移除前导斜杠
-    if path.startswith("/"):
-        path = path[1:]
 
-    # 如果路径为空，默认返回 index.html
-    if not path:
-        path = "index.html"
+    def static_file_app(environ, start_response):
+        if environ["PATH_INFO"] == "/api/upload":
+            return upload_app(environ, start_response)
+        return static_files(environ, start_response)
 
-    # URL 解码
-    path = unquote(path)
-
-    # 构建完整的文件路径
-    file_path = resource_dir / path
-
-    try:
-        # 确保文件在资源目录内（安全检查）
-        file_path = file_path.resolve()
-        if not str(file_path).startswith(str(resource_dir.resolve())):
-            start_response("403 Forbidden", [])
-            return [b"403 Forbidden"]
-
-        if file_path.exists() and file_path.is_file():
-            # 获取文件的 MIME 类型
-            mime_type, _ = mimetypes.guess_type(str(file_path))
-            if mime_type is None:
-                mime_type = "application/octet-stream"
-
-            # 读取文件内容
-            with open(file_path, "rb") as f:
-                content = f.read()
-
-            headers = [
-                ("Content-Type", mime_type),
-                ("Content-Length", str(len(content))),
-            ]
-            start_response("200 OK", headers)
-            return [content]
-        else:
-            start_response("404 Not Found", [])
-            return [b"404 Not Found"]
-
-    except OSError as e:
-        log.error(f"Error serving file {path}: {e}")
-        start_response("500 Internal Server Error", [])
-        return [b"500 Internal Server Error"]
+    return static_file_app
 
 
 def find_free_port(start_port=8000, max_attempts=10):
@@ -100,10 +41,17 @@ def find_free_port(start_port=8000, max_attempts=10):
     )
 
 
-def start_static_server(port=8000):
+def start_static_server(resource_dir: Path, port=8000):
     """启动静态文件服务器"""
+    static_files = StaticFiles(resource_dir)
     try:
-        httpd = make_server("127.0.0.1", port, static_file_app)
+        httpd = make_server(
+            "127.0.0.1",
+            port,
+            make_static_file_app(static_files),
+            server_class=ThreadingWSGIServer,
+            handler_class=QuietHandler,
+        )
         log.info(f"Static file server started on http://127.0.0.1:{port}")
         httpd.serve_forever()
     except OSError as e:
@@ -111,7 +59,28 @@ def start_static_server(port=8000):
         raise
 
 
-if __name__ == "__main__":
+def main():
+    log_init()
+
+    import webview
+    import config
+    import model
+    from api import API
+    from worker_pool import OcrWorkerPool
+
+    # 获取应用程序的基础路径
+    config.self_dir = Path(sys.argv[0]).resolve().parent
+
+    # 构建好的前端文件路径
+    resource_dir = Path.joinpath(config.self_dir, "resource")
+    if not resource_dir.exists():
+        log.error(
+            f"Resource directory {resource_dir} does not exist. Please build the project first."
+        )
+        sys.exit(1)
+
+    log.info(f"Using resource directory: {resource_dir}")
+
     # 查找可用端口并启动静态文件服务器
     try:
         server_port = find_free_port()
@@ -120,11 +89,18 @@ if __name__ == "__main__":
         sys.exit(1)
 
     server_thread = threading.Thread(
-        target=start_static_server, args=(server_port,), daemon=True
+        target=start_static_server, args=(resource_dir, server_port), daemon=True
     )
     server_thread.start()
 
-    api = API()
+    pool = None
+    if config.config.worker_pool.size > 0:
+        pool = OcrWorkerPool(
+            size=config.config.worker_pool.size,
+            job_timeout=config.config.worker_pool.job_timeout,
+        )
+
+    api = API(pool)
 
     # 创建窗口并加载前端文件
     window = webview.create_window(
@@ -140,5 +116,20 @@ if __name__ == "__main__":
 
     api.set_window(window)
 
+    # 模型在后台加载，窗口无需等待
+    if pool:
+        pool.start()
+    else:
+        model.warm_up()
+
     # 启动应用并启用跨域支持
     webview.start(debug=config.is_debug())
+
+    if pool:
+        pool.shutdown()
+
+
+if __name__ == "__main__":
+    # 打包后的程序需要此调用才能正确启动OCR工作进程
+    multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,270 @@
+import os
+import json
+import time
+import uuid
+import cProfile
+import pstats
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Iterator
+
+from loguru import logger as log
+
+from config import config, self_dir
+
+
+class Trace:
+    """
+    一次识别请求的耗时记录，包含请求内各阶段的span
+    """
+
+    def __init__(self, name: str, attrs: dict):
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.attrs = attrs
+        self.start = time.time()
+        self.origin = time.perf_counter()
+        self.duration: float | None = None
+        self.spans: list[dict] = []
+        self.gates: list[dict] = []
+        self.profiles: list[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def add_span(self, span: dict):
+        with self._lock:
+            self.spans.append(span)
+
+    def add_gate(self, gate: dict):
+        with self._lock:
+            self.gates.append(gate)
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "start": self.start,
+            "duration": self.duration,
+            "attrs": self.attrs,
+            "spans": self.spans,
+            "gates": self.gates,
+        }
+
+
+_current_trace: ContextVar[Trace | None] = ContextVar("current_trace", default=None)
+# 当前线程是否已有profiler在运行，同一线程内不能同时启用两个cProfile
+_profiling = threading.local()
+
+
+class MetricsWriter:
+    """
+    将请求记录追加到JSONL文件，文件超过大小上限时轮换为.1、.2……
+    多个工作进程会写同一个文件，每条记录以单次追加写入。
+    """
+
+    def __init__(self, metrics_dir: Path, max_size: int, backups: int):
+        self.path = metrics_dir / "metrics.jsonl"
+        self.max_size = max_size
+        self.backups = backups
+        self._lock = threading.Lock()
+        metrics_dir.mkdir(parents=True, exist_ok=True)
+
+    def write(self, record: dict):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            try:
+                if self.path.exists() and self.path.stat().st_size >= self.max_size:
+                    self._rotate()
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line)
+            except OSError as e:
+                log.warning(f"写入性能记录失败: {e}")
+
+    def _rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            src = self.path.with_suffix(f".jsonl.{i}")
+            if src.exists():
+                os.replace(src, self.path.with_suffix(f".jsonl.{i + 1}"))
+        if self.backups > 0:
+            os.replace(self.path, self.path.with_suffix(".jsonl.1"))
+        else:
+            self.path.unlink(missing_ok=True)
+
+    def read(self, limit: int) -> list[dict]:
+        """
+        读取最近的limit条记录，按写入顺序返回
+        """
+        records: list[dict] = []
+        paths = [self.path] + [
+            self.path.with_suffix(f".jsonl.{i}") for i in range(1, self.backups + 1)
+        ]
+        for path in paths:
+            if len(records) >= limit:
+                break
+            try:
+                lines = path.read_text(encoding="utf-8").splitlines()
+            except OSError:
+                continue
+            for line in reversed(lines):
+                if len(records) >= limit:
+                    break
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        records.reverse()
+        return records
+
+
+metrics_writer: MetricsWriter | None = None
+if config.metrics.enabled:
+    metrics_writer = MetricsWriter(
+        metrics_dir=self_dir.joinpath(config.metrics.metrics_dir).resolve(),
+        max_size=int(config.metrics.max_size_mb * 1024 * 1024),
+        backups=config.metrics.backups,
+    )
+
+
+@contextmanager
+def _profile(trace: Trace | None) -> Iterator[None]:
+    """
+    config.metrics.profile开启时，在当前线程中运行cProfile，结果并入trace
+    """
+    if not trace or not config.metrics.profile or getattr(_profiling, "active", False):
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    _profiling.active = True
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        _profiling.active = False
+        trace.profiles.append(profiler)
+
+
+def _dump_profile(trace: Trace):
+    """
+    将请求内各线程的cProfile结果合并保存为pstats文件，可用snakeviz等工具查看
+    """
+    profile_dir = metrics_writer.path.parent / "profiles"
+    profile_dir.mkdir(exist_ok=True)
+    path = profile_dir / f"{trace.name}-{trace.trace_id}.prof"
+    stats = pstats.Stats(trace.profiles[0])
+    for profiler in trace.profiles[1:]:
+        stats.add(profiler)
+    stats.dump_stats(path)
+    log.info(f"性能分析结果已保存: {path}")
+
+
+@contextmanager
+def trace(name: str, **attrs: Any) -> Iterator[Trace | None]:
+    """
+    记录一次识别请求，请求内的span会归入该请求，结束时写入性能记录文件
+    :param name: 请求名称，例如img_ocr、batch_ocr
+    :param attrs: 附加信息
+    """
+    if metrics_writer is None:
+        yield None
+        return
+
+    current = Trace(name, attrs)
+    token = _current_trace.set(current)
+    try:
+        with _profile(current):
+            yield current
+    finally:
+        current.duration = time.perf_counter() - current.origin
+        _current_trace.reset(token)
+        metrics_writer.write(current.to_dict())
+        if current.profiles:
+            try:
+                _dump_profile(current)
+            except OSError as e:
+                log.warning(f"保存性能分析结果失败: {e}")
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[dict]:
+    """
+    记录当前请求中一个阶段的耗时，可在with块内向返回的dict补充信息
+    :param name: 阶段名称，例如visual_predict、mllm_pred
+    :param attrs: 附加信息，例如图片尺寸
+    """
+    current = _current_trace.get()
+    start = time.perf_counter()
+    try:
+        with _profile(current):
+            yield attrs
+    finally:
+        if current:
+            current.add_span(
+                {
+                    "name": name,
+                    "offset": start - current.origin,
+                    "duration": time.perf_counter() - start,
+                    "thread": threading.current_thread().name,
+                    "attrs": attrs,
+                }
+            )
+
+
+def gate(stage: str, decision: str, **attrs: Any):
+    """
+    记录当前请求中一个可跳过的阶段是否执行
+    :param stage: 阶段名称，例如table_recognition
+    :param decision: run表示执行，其他值为跳过的原因
+    :param attrs: 附加信息，例如文档类型
+    """
+    if current := _current_trace.get():
+        current.add_gate({"stage": stage, "decision": decision, "attrs": attrs})
+
+
+def percentiles(values: list[float]) -> dict:
+    values = sorted(values)
+    if not values:
+        return {"count": 0}
+
+    def pick(q: float) -> float:
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values),
+        "p50": pick(0.5),
+        "p90": pick(0.9),
+        "p99": pick(0.99),
+        "max": values[-1],
+    }
+
+
+def metrics_summary(limit: int | None = None) -> dict:
+    """
+    统计最近的性能记录
+    :param limit: 参与统计的请求数量，默认读取配置
+    :return: 按请求名称和阶段名称分组的耗时分位数（秒），
+        以及gates中各可跳过阶段按执行与跳过原因分组的次数
+    """
+    if metrics_writer is None:
+        return {"requests": {}, "spans": {}, "gates": {}}
+
+    records = metrics_writer.read(limit or config.metrics.window)
+    requests: dict[str, list[float]] = {}
+    spans: dict[str, list[float]] = {}
+    gates: dict[str, dict[str, int]] = {}
+    for record in records:
+        requests.setdefault(record["name"], []).append(record["duration"])
+        for item in record.get("spans", []):
+            spans.setdefault(item["name"], []).append(item["duration"])
+        for item in record.get("gates", []):
+            decisions = gates.setdefault(item["stage"], {})
+            decisions[item["decision"]] = decisions.get(item["decision"], 0) + 1
+
+    return {
+        "requests": {name: percentiles(values) for name, values in requests.items()},
+        "spans": {name: percentiles(values) for name, values in spans.items()},
+        "gates": gates,
+    }
@@ -1,25 +1,174 @@
-import paddle
-from paddleocr import PPChatOCRv4Doc
-from config import config
+import time
+import threading
+
+from config import config, self_dir
+from cpu import cpu_threads
 from loguru import logger as log
 
-if paddle.device.is_compiled_with_cuda():
-    log.info("PaddlePaddle supports CUDA, setting device to GPU")
-    device = paddle.device.set_device("gpu")
-else:
-    log.warning("PaddlePaddle does not support CUDA, setting device to CPU")
-    device = paddle.device.set_device("cpu")
-
-# model_dir = config.model_dir
-
-pipeline = PPChatOCRv4Doc(
-    layout_detection_model_name="RT-DETR-H_layout_3cls",
-    doc_orientation_classify_model_name="PP-LCNet_x1_0_doc_ori",
-    doc_unwarping_model_name="UVDoc",
-    text_detection_model_name="PP-OCRv5_server_det",
-    text_recognition_model_name="PP-OCRv5_server_rec",
-    textline_orientation_model_name="PP-LCNet_x1_0_textline_ori",
-    seal_text_recognition_model_name="PP-OCRv4_server_rec_doc",
-    seal_text_detection_model_name="PP-OCRv4_server_seal_det",
-    table_structure_recognition_model_name="SLANet_plus",
-)
+# 推理配置档：构建管道使用的子模型与参数。
+# ocr_pipline 关闭了文档方向分类、文档矫正和印章识别，这些子模型不会被加载
+inference_profiles = {
+    # 服务器级模型，准确度最高，适合有GPU的机器
+    "accurate": {
+        "layout_detection_model_name": "RT-DETR-H_layout_3cls",
+        "text_detection_model_name": "PP-OCRv5_server_det",
+        "text_recognition_model_name": "PP-OCRv5_server_rec",
+        "textline_orientation_model_name": "PP-LCNet_x1_0_textline_ori",
+        "table_structure_recognition_model_name": "SLANet_plus",
+    },
+    # 移动端检测模型与轻量版面模型，保留服务器级识别模型，适合普通办公电脑
+    "fast": {
+        "layout_detection_model_name": "PicoDet-L_layout_3cls",
+        "text_detection_model_name": "PP-OCRv5_mobile_det",
+        "text_recognition_model_name": "PP-OCRv5_server_rec",
+        "textline_orientation_model_name": "PP-LCNet_x0_25_textline_ori",
+        "table_structure_recognition_model_name": "SLANet_plus",
+        "text_det_limit_side_len": 960,
+        "text_det_limit_type": "max",
+    },
+    # 全部使用移动端模型，内存占用最小
+    "tiny": {
+        "layout_detection_model_name": "PicoDet-S_layout_3cls",
+        "text_detection_model_name": "PP-OCRv5_mobile_det",
+        "text_recognition_model_name": "PP-OCRv5_mobile_rec",
+        "textline_orientation_model_name": "PP-LCNet_x0_25_textline_ori",
+        "table_structure_recognition_model_name": "SLANet",
+        "text_det_limit_side_len": 736,
+        "text_det_limit_type": "max",
+    },
+}
+
+profile_name = config.inference.profile
+if profile_name not in inference_profiles:
+    log.warning(f"未知的推理配置档 {profile_name}，使用 accurate")
+    profile_name = "accurate"
+
+model_names = {
+    key: value
+    for key, value in inference_profiles[profile_name].items()
+    if key.endswith("_model_name")
+}
+# 影响识别结果的其他管道参数
+pipeline_args = {
+    key: value
+    for key, value in inference_profiles[profile_name].items()
+    if not key.endswith("_model_name")
+}
+
+
+def local_model_dirs() -> dict[str, str]:
+    """
+    model_dir下已有的模型目录，例如 model/PP-OCRv5_mobile_det，
+    找到时直接从该目录加载，不再下载到用户目录
+    :return: 形如 text_detection_model_dir 的参数
+    """
+    model_dir = self_dir.joinpath(config.model_dir)
+    model_dirs = {}
+    for key, name in model_names.items():
+        path = model_dir / name
+        if path.joinpath("inference.yml").exists():
+            model_dirs[key.removesuffix("_name") + "_dir"] = str(path)
+    return model_dirs
+
+
+_pipeline = None
+_state = "idle"
+_error: str | None = None
+_load_time: float | None = None
+_lock = threading.Lock()
+_loaded = threading.Event()
+
+
+def load_pipeline():
+    """
+    构建PP-ChatOCRv4管道，耗时较长
+    """
+    # 线程数相关的环境变量需要在导入paddle之前设置
+    threads = cpu_threads()
+
+    import paddle
+    from paddleocr import PPChatOCRv4Doc
+
+    import llm_client
+
+    llm_client.install()
+
+    if paddle.device.is_compiled_with_cuda():
+        log.info("PaddlePaddle supports CUDA, setting device to GPU")
+        paddle.device.set_device("gpu")
+    else:
+        log.warning("PaddlePaddle does not support CUDA, setting device to CPU")
+        paddle.device.set_device("cpu")
+
+    log.info(f"推理配置档: {profile_name}, 模型: {', '.join(model_names.values())}")
+    if config.inference.enable_hpi:
+        # 高性能推理插件会按设备自动选择ONNX Runtime、OpenVINO或TensorRT后端，
+        # 需要先执行 paddlex --install hpi-cpu（或hpi-gpu）安装
+        log.info("启用高性能推理插件")
+
+    return PPChatOCRv4Doc(
+        **model_names,
+        **local_model_dirs(),
+        **pipeline_args,
+        enable_hpi=config.inference.enable_hpi,
+        enable_mkldnn=config.cpu.enable_mkldnn,
+        cpu_threads=threads,
+        use_doc_orientation_classify=False,
+        use_doc_unwarping=False,
+        use_seal_recognition=False,
+    )
+
+
+def _warm_up():
+    global _pipeline, _state, _error, _load_time
+    start = time.perf_counter()
+    try:
+        _pipeline = load_pipeline()
+    except Exception as e:
+        log.exception(f"模型加载失败: {e}")
+        _error = str(e)
+        _state = "error"
+    else:
+        _load_time = time.perf_counter() - start
+        _state = "ready"
+        log.info(f"模型加载完成，耗时{_load_time:.2f}s")
+    finally:
+        _loaded.set()
+
+
+def warm_up():
+    """
+    在后台线程中加载模型，重复调用不会重复加载
+    """
+    global _state
+    with _lock:
+        if _state != "idle":
+            return
+        _state = "loading"
+    log.info("开始在后台加载模型...")
+    threading.Thread(target=_warm_up, name="model-warm-up", daemon=True).start()
+
+
+def get_pipeline():
+    """
+    获取已加载的管道，模型尚未加载完成时阻塞等待
+    :return: PPChatOCRv4Doc
+    """
+    warm_up()
+    _loaded.wait()
+    if _pipeline is None:
+        raise RuntimeError(f"模型加载失败: {_error}")
+    return _pipeline
+
+
+def model_status() -> dict:
+    """
+    模型加载状态
+    :return: state 为 idle、loading、ready 或 error 之一
+    """
+    return {
+        "state": _state,
+        "error": _error,
+        "load_time": _load_time,
+        "profile": profile_name,
+    }
@@ -0,0 +1,69 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterator
+
+from numpy import array, ndarray
+from loguru import logger as log
+
+# 渲染进程中当前处理的PDF文档
+_document = None
+
+
+def _init_render_worker(pdf_bytes: bytes):
+    global _document
+    import pypdfium2 as pdfium
+
+    _document = pdfium.PdfDocument(pdf_bytes)
+
+
+def _render_page(index: int, dpi: int) -> tuple[int, ndarray, str]:
+    """
+    在渲染进程中栅格化单页并提取文字层
+    :return: (页码, RGB图片数组, 文字层内容)
+    """
+    page = _document[index]
+    text = page.get_textpage().get_text_range()
+    img = page.render(scale=dpi / 72).to_pil().convert("RGB")
+    return index, array(img), text
+
+
+def pdf_page_count(pdf_bytes: bytes) -> int:
+    import pypdfium2 as pdfium
+
+    return len(pdfium.PdfDocument(pdf_bytes))
+
+
+def render_pdf_pages(
+    pdf_bytes: bytes, dpi: int, workers: int
+) -> Iterator[tuple[int, ndarray, str]]:
+    """
+    在进程池中并行栅格化PDF的所有页面，按完成顺序逐页产出
+    :param pdf_bytes: PDF文件内容
+    :param dpi: 栅格化分辨率
+    :param workers: 渲染进程数量
+    :return: (页码, RGB图片数组, 文字层内容)的迭代器
+    """
+    page_count = pdf_page_count(pdf_bytes)
+    log.info(f"开始栅格化PDF，共{page_count}页，DPI={dpi}")
+    with ProcessPoolExecutor(
+        max_workers=max(1, min(workers, page_count)),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_render_worker,
+        initargs=(pdf_bytes,),
+    ) as executor:
+        futures = [executor.submit(_render_page, i, dpi) for i in range(page_count)]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def text_visual_info(text: str) -> dict:
+    """
+    将PDF文字层包装为与visual_predict结果相同结构的visual_info，
+    以便跳过文字检测和识别直接进入LLM阶段
+    """
+    return {
+        "normal_text_dict": {"words in text": text},
+        "table_text_list": [],
+        "table_html_list": [],
+        "table_nei_text_list": [],
+    }
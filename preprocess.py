@@ -0,0 +1,303 @@
+from typing import List
+
+import numpy as np
+from loguru import logger as log
+from PIL import Image, ImageOps
+
+from config import config
+from metrics import span
+
+
+def normalize_mode(img: Image.Image) -> Image.Image:
+    """
+    按EXIF方向摆正图片，并统一转换为RGB。
+    带透明通道的图片以白色为背景合成，避免透明区域变成黑色。
+    """
+    img = ImageOps.exif_transpose(img)
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        img = img.convert("RGBA")
+        background = Image.new("RGBA", img.size, (255, 255, 255, 255))
+        img = Image.alpha_composite(background, img)
+    if config.preprocess.grayscale:
+        # 灰度化后仍保留三通道，文字检测模型只接受三通道输入
+        img = img.convert("L")
+    return img.convert("RGB")
+
+
+def foreground_mask(img: Image.Image) -> tuple[np.ndarray, float]:
+    """
+    以图片四边的中位颜色作为背景，在缩略图上找出与背景差异明显的像素
+    :param img: RGB图片
+    :return: (前景掩码, 缩略图到原图的缩放比例)
+    """
+    # 在缩略图上计算，避免大图逐像素运算
+    scale = max(img.size) / 512
+    thumb = img.convert("L")
+    if scale > 1:
+        thumb = thumb.resize(
+            (round(img.width / scale), round(img.height / scale)), Image.BILINEAR
+        )
+    else:
+        scale = 1
+    gray = np.asarray(thumb, dtype=np.int16)
+
+    border = np.concatenate([gray[0], gray[-1], gray[:, 0], gray[:, -1]])
+    background = np.median(border)
+    return np.abs(gray - background) > 32, scale
+
+
+def document_bbox(
+    img: Image.Image,
+    margin: int,
+    foreground: tuple[np.ndarray, float] | None = None,
+) -> tuple[int, int, int, int] | None:
+    """
+    估计文档所在区域：取与背景差异明显的像素的外接矩形
+    :param img: RGB图片
+    :param margin: 外扩的像素数
+    :param foreground: 已计算的foreground_mask结果，为None时重新计算
+    :return: (left, top, right, bottom)，无法确定文档区域时返回None
+    """
+    mask, scale = foreground or foreground_mask(img)
+    # 忽略零散的噪点：行列中前景像素需达到一定比例
+    rows = np.flatnonzero(mask.mean(axis=1) > 0.01)
+    cols = np.flatnonzero(mask.mean(axis=0) > 0.01)
+    if rows.size == 0 or cols.size == 0:
+        return
+
+    left = max(0, int(cols[0] * scale) - margin)
+    top = max(0, int(rows[0] * scale) - margin)
+    right = min(img.width, int((cols[-1] + 1) * scale) + margin)
+    bottom = min(img.height, int((rows[-1] + 1) * scale) + margin)
+    return left, top, right, bottom
+
+
+def dilate(mask: np.ndarray, radius: int) -> np.ndarray:
+    """
+    方形膨胀，用积分图计算每个像素周围 (2*radius+1)^2 范围内是否有前景
+    """
+    if radius <= 0:
+        return mask
+    size = 2 * radius + 1
+    padded = np.pad(mask, radius).astype(np.int32)
+    integral = np.zeros((padded.shape[0] + 1, padded.shape[1] + 1), dtype=np.int32)
+    integral[1:, 1:] = padded.cumsum(axis=0).cumsum(axis=1)
+    total = (
+        integral[size:, size:]
+        - integral[:-size, size:]
+        - integral[size:, :-size]
+        + integral[:-size, :-size]
+    )
+    return total > 0
+
+
+def component_boxes(region: np.ndarray, mask: np.ndarray) -> List[List[int]]:
+    """
+    按行程（每行中连续的前景像素）标记region的四连通区域，
+    返回每个区域内mask前景像素的外接矩形
+    :param region: 用于划分连通区域的掩码
+    :param mask: 计算外接矩形的掩码，前景应包含在region中
+    :return: [left, top, right, bottom]，不含mask前景的区域被忽略
+    """
+    height, width = region.shape
+    edges = np.diff(np.pad(region, ((0, 0), (1, 1))).astype(np.int8), axis=1)
+    run_rows, run_starts = np.nonzero(edges == 1)
+    run_ends = np.nonzero(edges == -1)[1]
+    row_index = np.searchsorted(run_rows, np.arange(height + 1))
+
+    parent = list(range(len(run_rows)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    # 相邻两行中列范围重叠的行程属于同一区域
+    for y in range(1, height):
+        i, i_end = row_index[y - 1], row_index[y]
+        j, j_end = row_index[y], row_index[y + 1]
+        while i < i_end and j < j_end:
+            if run_starts[i] < run_ends[j] and run_starts[j] < run_ends[i]:
+                parent[find(i)] = find(j)
+            if run_ends[i] < run_ends[j]:
+                i += 1
+            else:
+                j += 1
+
+    boxes: dict[int, List[int]] = {}
+    for i in range(len(run_rows)):
+        y = run_rows[i]
+        cols = np.flatnonzero(mask[y, run_starts[i] : run_ends[i]])
+        if cols.size == 0:
+            continue
+        left, right = run_starts[i] + cols[0], run_starts[i] + cols[-1] + 1
+        box = boxes.setdefault(find(i), [left, y, right, y + 1])
+        box[0], box[1] = min(box[0], left), min(box[1], y)
+        box[2], box[3] = max(box[2], right), max(box[3], y + 1)
+    return [[int(v) for v in box] for box in boxes.values()]
+
+
+def box_distance(a: List[int], b: List[int]) -> int:
+    return max(0, a[0] - b[2], b[0] - a[2], a[1] - b[3], b[1] - a[3])
+
+
+def merge_boxes(a: List[int], b: List[int]) -> List[int]:
+    return [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+
+
+def document_regions(
+    img: Image.Image,
+    foreground: tuple[np.ndarray, float] | None = None,
+) -> List[tuple[int, int, int, int]]:
+    """
+    找出一张扫描图片中彼此分开的多张票据：膨胀前景掩码，使同一张票据内的文字连成一片，
+    票据之间的空白间隔则保留下来，再取各连通区域的外接矩形
+    :param img: RGB图片
+    :param foreground: 已计算的foreground_mask结果，为None时重新计算
+    :return: 按从上到下、从左到右排列的 (left, top, right, bottom)，
+        少于两张或多于segmentation.max_documents张时返回空列表
+    """
+    mask, scale = foreground or foreground_mask(img)
+    long_side = max(mask.shape)
+    radius = max(1, round(long_side * config.segmentation.gap / 2))
+    boxes = component_boxes(dilate(mask, radius), mask)
+
+    min_area = config.segmentation.min_area * mask.size
+    documents = [b for b in boxes if (b[2] - b[0]) * (b[3] - b[1]) >= min_area]
+    if len(documents) < 2:
+        return []
+    # 较小的区域（印章、手写备注等）归入附近的票据，离所有票据都较远的视为噪点
+    for box in boxes:
+        if box in documents:
+            continue
+        nearest = min(documents, key=lambda d: box_distance(box, d))
+        if box_distance(box, nearest) <= 4 * radius:
+            documents[documents.index(nearest)] = merge_boxes(nearest, box)
+
+    # 合并互相重叠的区域
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(documents)):
+            for j in range(i + 1, len(documents)):
+                if box_distance(documents[i], documents[j]) == 0:
+                    documents[i] = merge_boxes(documents[i], documents.pop(j))
+                    merged = True
+                    break
+            if merged:
+                break
+
+    if len(documents) < 2:
+        return []
+    if len(documents) > config.segmentation.max_documents:
+        log.info(f"找到{len(documents)}个区域，超过票据数量上限，按单张票据识别")
+        return []
+
+    # 按行排列：上边缘在当前行最低上边缘之前的归入同一行
+    rows: List[List[List[int]]] = []
+    for box in sorted(documents, key=lambda b: b[1]):
+        if rows and box[1] < min(b[3] for b in rows[-1]):
+            rows[-1].append(box)
+        else:
+            rows.append([box])
+    margin = config.preprocess.crop_margin
+    return [
+        (
+            max(0, int(left * scale) - margin),
+            max(0, int(top * scale) - margin),
+            min(img.width, int(right * scale) + margin),
+            min(img.height, int(bottom * scale) + margin),
+        )
+        for row in rows
+        for left, top, right, bottom in sorted(row, key=lambda b: b[0])
+    ]
+
+
+def auto_crop(
+    img: Image.Image, foreground: tuple[np.ndarray, float] | None = None
+) -> Image.Image:
+    """
+    裁掉文档四周的背景。裁剪后面积变化不大时保持原图
+    """
+    bbox = document_bbox(img, config.preprocess.crop_margin, foreground)
+    if not bbox:
+        return img
+    left, top, right, bottom = bbox
+    if (right - left) * (bottom - top) > img.width * img.height * 0.9:
+        return img
+    return img.crop(bbox)
+
+
+def fit_size(img: Image.Image, max_side: int) -> Image.Image:
+    """
+    等比缩小图片，使长边不超过max_side，不会放大
+    """
+    if max_side <= 0 or max(img.size) <= max_side:
+        return img
+    scale = max_side / max(img.size)
+    return img.resize(
+        (round(img.width * scale), round(img.height * scale)), Image.LANCZOS
+    )
+
+
+def preprocess_image(img: Image.Image) -> Image.Image:
+    """
+    识别前的预处理：统一颜色模式、裁剪到文档区域并缩小到工作分辨率
+    :param img: 解码后的图片
+    :return: 供OCR管道使用的RGB图片
+    """
+    if not config.preprocess.enabled:
+        return img
+    img = normalize_mode(img)
+    if config.preprocess.auto_crop:
+        img = auto_crop(img)
+    return fit_size(img, config.preprocess.max_side)
+
+
+def preprocess_documents(
+    img: Image.Image,
+) -> List[tuple[tuple[int, int, int, int] | None, Image.Image]]:
+    """
+    与preprocess_image相同的预处理，并将一张图片中的多张票据分开
+    :param img: 解码后的图片
+    :return: 每张票据的 (在摆正后原图中的区域, 供OCR管道使用的图片)，
+        没有分开时只有一项，区域为None
+    """
+    if config.preprocess.enabled:
+        img = normalize_mode(img)
+    foreground = None
+    regions = []
+    if config.segmentation.enabled:
+        with span("segment") as attrs:
+            foreground = foreground_mask(img)
+            regions = document_regions(img, foreground)
+            attrs["documents"] = max(len(regions), 1)
+    if not config.preprocess.enabled:
+        return [(None, img)] if not regions else [(r, img.crop(r)) for r in regions]
+
+    if not regions:
+        if config.preprocess.auto_crop:
+            # 复用分割时计算的前景掩码
+            img = auto_crop(img, foreground)
+        return [(None, fit_size(img, config.preprocess.max_side))]
+    # 区域已经紧贴票据，不再单独裁剪
+    return [(r, fit_size(img.crop(r), config.preprocess.max_side)) for r in regions]
+
+
+def mllm_image(img_ndarray: np.ndarray) -> np.ndarray:
+    """
+    送给多模态LLM的图片，单独缩小到mllm_max_side以减少编码和上传的数据量
+    """
+    if not config.preprocess.enabled:
+        return img_ndarray
+    img = Image.fromarray(img_ndarray)
+    resized = fit_size(img, config.preprocess.mllm_max_side)
+    return img_ndarray if resized is img else np.asarray(resized)
+
+
+def preprocess_key() -> dict:
+    """
+    影响预处理结果的配置，计入缓存键
+    """
+    return config.preprocess.__dict__
@@ -0,0 +1,37 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Iterator
+
+from loguru import logger as log
+
+ProgressListener = Callable[[str, dict], None]
+
+_listener: ContextVar[ProgressListener | None] = ContextVar(
+    "progress_listener", default=None
+)
+
+
+@contextmanager
+def listen(listener: ProgressListener) -> Iterator[None]:
+    """
+    在with块内的识别过程中接收进度事件，包括由StageGraph启动的阶段线程
+    :param listener: 以事件名和事件内容为参数调用，可能在不同线程中被调用
+    """
+    token = _listener.set(listener)
+    try:
+        yield
+    finally:
+        _listener.reset(token)
+
+
+def report(event: str, **detail: Any):
+    """
+    向当前的监听者发送进度事件，没有监听者时忽略
+    :param event: 事件名，例如stage、fields
+    :param detail: 事件内容，需要可以JSON序列化
+    """
+    if listener := _listener.get():
+        try:
+            listener(event, detail)
+        except Exception as e:
+            log.warning(f"发送进度事件失败: {e}")
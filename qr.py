@@ -0,0 +1,134 @@
+from typing import Iterator, List
+
+import numpy as np
+from PIL import Image, ImageOps
+from pyzbar import pyzbar
+from pyzbar.pyzbar import ZBarSymbol
+
+from utils import invoice_verify
+
+# 发票二维码通常位于这些角落，按出现的可能性排序：(left, top, right, bottom)，占整图的比例。
+# 增值税发票与全电发票在左上角，纸质火车票在右下角
+corner_regions = [
+    ("top_left", (0.0, 0.0, 0.4, 0.5)),
+    ("bottom_right", (0.6, 0.5, 1.0, 1.0)),
+    ("top_right", (0.6, 0.0, 1.0, 0.5)),
+    ("bottom_left", (0.0, 0.5, 0.4, 1.0)),
+]
+
+# 角落区域放大后的长边上限，二维码过小时放大能提高识别率
+upscale_side = 1024
+# 整图缩小识别时的长边
+reduced_side = 1600
+
+
+def decode_qrcode(img: Image.Image) -> List[str]:
+    """
+    识别图片中的所有二维码
+    """
+    results = pyzbar.decode(img, symbols=[ZBarSymbol.QRCODE])
+    return [result.data.decode("utf-8") for result in results]
+
+
+def binarize(gray: Image.Image) -> Image.Image:
+    """
+    Otsu二值化，改善低对比度、背景不均匀的二维码
+    """
+    pixels = np.asarray(gray)
+    hist = np.bincount(pixels.ravel(), minlength=256).astype(np.float64)
+    weight = np.cumsum(hist)
+    mean = np.cumsum(hist * np.arange(256))
+    total, total_mean = weight[-1], mean[-1]
+    background = weight[:-1]
+    foreground = total - background
+    valid = (background > 0) & (foreground > 0)
+    between = np.zeros(255)
+    between[valid] = (
+        total_mean * background[valid] - total * mean[:-1][valid]
+    ) ** 2 / (background[valid] * foreground[valid])
+    threshold = int(np.argmax(between))
+    return Image.fromarray(np.where(pixels > threshold, 255, 0).astype(np.uint8))
+
+
+def scale_to(img: Image.Image, side: int) -> Image.Image:
+    scale = side / max(img.size)
+    return img.resize(
+        (max(1, round(img.width * scale)), max(1, round(img.height * scale))),
+        Image.BICUBIC if scale > 1 else Image.BILINEAR,
+    )
+
+
+def qr_variants(
+    img: Image.Image, exhaustive: bool = False
+) -> Iterator[tuple[str, Image.Image]]:
+    """
+    按计算量从小到大依次生成待识别的图片，调用方找到有效二维码后即可停止迭代
+    :param img: 解码后的图片
+    :param exhaustive: 是否在最后尝试原始分辨率的整图及其二值化版本。
+        识别流程中大多数图片没有二维码，这两步最慢，只在单独识别二维码时使用
+    :return: (变体名称, 灰度图片)
+    """
+    gray = ImageOps.exif_transpose(img).convert("L")
+    width, height = gray.size
+    corners = []
+    for name, (left, top, right, bottom) in corner_regions:
+        box = (
+            round(left * width),
+            round(top * height),
+            round(right * width),
+            round(bottom * height),
+        )
+        corners.append((name, gray.crop(box)))
+
+    # 1. 角落区域，原始分辨率（过大时缩小）
+    for name, corner in corners:
+        if max(corner.size) > upscale_side:
+            corner = scale_to(corner, upscale_side)
+        yield name, corner
+
+    # 2. 整图，过大时缩小
+    reduced = max(gray.size) > reduced_side
+    yield ("reduced", scale_to(gray, reduced_side)) if reduced else ("full", gray)
+
+    # 3. 角落区域放大并二值化，用于过小或对比度低的二维码
+    for name, corner in corners:
+        if max(corner.size) < upscale_side:
+            corner = scale_to(corner, upscale_side)
+        yield f"{name}_binarized", binarize(corner)
+
+    if not exhaustive:
+        return
+
+    # 4. 原始分辨率整图（第2步未缩小时已尝试过），与二值化的整图
+    if reduced:
+        yield "full", gray
+    yield "full_binarized", binarize(gray)
+
+
+def find_invoice_qrcode(
+    img: Image.Image, stats: dict | None = None, exhaustive: bool = False
+) -> List[str] | None:
+    """
+    查找图片中的发票二维码。
+    依次识别qr_variants生成的图片，返回第一个通过invoice_verify的二维码；
+    图片中有多个二维码时忽略无效的二维码
+    :param img: 解码后的图片
+    :param stats: 如果给出，写入attempts（尝试的变体数量）与variant（找到二维码的变体）
+    :param exhaustive: 参见qr_variants
+    :return: 二维码按逗号分割后的字段，未找到时返回None
+    """
+    seen = set()
+    attempts = 0
+    for name, variant in qr_variants(img, exhaustive):
+        attempts += 1
+        for code in decode_qrcode(variant):
+            if code in seen:
+                continue
+            seen.add(code)
+            if fields := invoice_verify(code):
+                if stats is not None:
+                    stats.update(attempts=attempts, variant=name)
+                return fields
+    if stats is not None:
+        stats.update(attempts=attempts, variant=None)
+    return None
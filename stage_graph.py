@@ -0,0 +1,94 @@
+import time
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable
+
+from loguru import logger as log
+
+from progress import report
+
+
+class StageError(Exception):
+    """
+    阶段执行失败，消息会作为识别结果的错误信息返回给前端
+    """
+
+
+class StageGraph:
+    """
+    按依赖关系执行识别管道的各个阶段。依赖都已完成的阶段会立即在线程中启动，
+    互不依赖的阶段（例如本地OCR与多模态LLM请求）并行执行。
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._stages: dict[str, tuple[Callable[..., Any], tuple[str, ...]]] = {}
+        # 阶段名 -> (相对开始时间, 相对结束时间)，单位秒
+        self.timings: dict[str, tuple[float, float]] = {}
+
+    def add(self, name: str, func: Callable[..., Any], *deps: str):
+        """
+        添加阶段
+        :param name: 阶段名
+        :param func: 阶段函数，按deps的顺序接收各依赖阶段的结果
+        :param deps: 依赖的阶段名
+        """
+        self._stages[name] = (func, deps)
+
+    def run(self) -> dict[str, Any]:
+        """
+        执行全部阶段。任一阶段抛出异常时，尚未开始的阶段不再执行，异常原样抛出
+        :return: 阶段名 -> 阶段结果
+        """
+        results: dict[str, Any] = {}
+        pending = dict(self._stages)
+        running: dict[Future, str] = {}
+        origin = time.perf_counter()
+
+        def run_stage(name: str, func: Callable[..., Any], args: list):
+            start = time.perf_counter() - origin
+            try:
+                return func(*args)
+            finally:
+                self.timings[name] = (start, time.perf_counter() - origin)
+
+        executor = ThreadPoolExecutor(
+            max_workers=max(1, len(self._stages)), thread_name_prefix=self.name
+        )
+        try:
+            while pending or running:
+                for name, (func, deps) in list(pending.items()):
+                    if all(dep in results for dep in deps):
+                        del pending[name]
+                        args = [results[dep] for dep in deps]
+                        # 阶段线程继承当前上下文，使性能记录的span归入同一请求
+                        future = executor.submit(
+                            contextvars.copy_context().run, run_stage, name, func, args
+                        )
+                        running[future] = name
+                if not running:
+                    raise RuntimeError(f"阶段依赖无法满足: {list(pending)}")
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    results[name] = future.result()
+                    start, end = self.timings[name]
+                    report("stage", stage=name, duration=end - start)
+        finally:
+            # 失败时不等待仍在执行的阶段（例如进行中的LLM请求）
+            executor.shutdown(wait=False, cancel_futures=True)
+            log.info(f"{self.name}阶段耗时: {self.format_timings()}")
+
+        return results
+
+    def format_timings(self) -> str:
+        """
+        按开始时间列出各阶段的起止时间，便于看出关键路径
+        """
+        return ", ".join(
+            f"{name} {start:.2f}-{end:.2f}s({end - start:.2f}s)"
+            for name, (start, end) in sorted(
+                self.timings.items(), key=lambda item: item[1]
+            )
+        )
@@ -0,0 +1,218 @@
+import gzip
+import mmap
+import hashlib
+import mimetypes
+from pathlib import Path
+from socketserver import ThreadingMixIn
+from urllib.parse import unquote
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+from loguru import logger as log
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 确保正确的 MIME 类型映射
+mimetypes.add_type("application/javascript", ".js")
+mimetypes.add_type("application/javascript", ".mjs")
+mimetypes.add_type("text/css", ".css")
+mimetypes.add_type("application/json", ".json")
+
+# 值得压缩的文件类型，图片和字体本身已经压缩
+compressible_types = {
+    "application/javascript",
+    "application/json",
+    "image/svg+xml",
+    "text/css",
+    "text/html",
+    "text/plain",
+}
+# 小于该大小的文件压缩收益不大
+min_compress_size = 1024
+# 超过该大小的文件不预先读入内存，改为内存映射
+max_preload_size = 16 * 1024 * 1024
+
+# vite构建的assets目录中的文件名带有内容哈希，可以长期缓存
+immutable_dirs = ("assets/",)
+
+
+class StaticFile:
+    """
+    一个静态文件及其压缩版本，启动时读入内存或映射到内存
+    """
+
+    def __init__(self, path: Path, rel_path: str):
+        self.rel_path = rel_path
+        mime_type, _ = mimetypes.guess_type(path.name)
+        self.mime_type = mime_type or "application/octet-stream"
+
+        size = path.stat().st_size
+        if size > max_preload_size:
+            with open(path, "rb") as f:
+                self.content = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.content = path.read_bytes()
+        self.etag = f'"{hashlib.sha1(self.content).hexdigest()[:20]}"'
+
+        # 编码名称到压缩内容，优先使用构建时预先压缩的 .br / .gz 文件
+        self.encodings: dict[str, bytes] = {}
+        for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+            precompressed = path.with_name(path.name + suffix)
+            if precompressed.is_file():
+                self.encodings[encoding] = precompressed.read_bytes()
+        if self.mime_type in compressible_types and min_compress_size <= size:
+            if "br" not in self.encodings and brotli:
+                self.encodings["br"] = brotli.compress(bytes(self.content))
+            if "gzip" not in self.encodings:
+                self.encodings["gzip"] = gzip.compress(bytes(self.content), mtime=0)
+        # 压缩后没有变小的版本没有意义
+        self.encodings = {
+            encoding: data
+            for encoding, data in self.encodings.items()
+            if len(data) < size
+        }
+
+    @property
+    def cache_control(self) -> str:
+        if self.rel_path.startswith(immutable_dirs):
+            return "public, max-age=31536000, immutable"
+        # index.html等文件名固定的文件每次都需要用ETag重新验证
+        return "no-cache"
+
+
+def accepted_encodings(header: str) -> set[str]:
+    """
+    解析Accept-Encoding，返回q值不为0的编码
+    """
+    accepted = set()
+    for item in header.split(","):
+        name, _, params = item.partition(";")
+        key, _, value = params.partition("=")
+        if key.strip() == "q":
+            try:
+                if float(value) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if name := name.strip().lower():
+            accepted.add(name)
+    return accepted
+
+
+def parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """
+    解析单个字节范围
+    :return: (start, end)，end包含在内；无法满足时返回None
+    """
+    start, _, end = header.removeprefix("bytes=").strip().partition("-")
+    if not start:
+        # bytes=-500 表示最后500字节
+        length = int(end)
+        if length <= 0:
+            return None
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = int(end) if end else size - 1
+    if start >= size or end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+class StaticFiles:
+    """
+    静态文件的WSGI应用。
+    启动时载入目录下的全部文件，按Accept-Encoding返回br/gzip压缩版本，
+    设置ETag和Cache-Control，支持If-None-Match与单个Range请求
+    """
+
+    def __init__(self, root: Path):
+        self.root = root.resolve()
+        self.files: dict[str, StaticFile] = {}
+        for path in sorted(self.root.rglob("*")):
+            if not path.is_file() or path.suffix in (".br", ".gz"):
+                continue
+            rel_path = path.relative_to(self.root).as_posix()
+            try:
+                self.files[rel_path] = StaticFile(path, rel_path)
+            except OSError as e:
+                log.error(f"无法读取静态文件 {path}: {e}")
+        log.info(
+            f"已载入{len(self.files)}个静态文件，"
+            f"共{sum(len(f.content) for f in self.files.values()) / 1024 / 1024:.2f} MB"
+        )
+
+    def __call__(self, environ, start_response):
+        method = environ["REQUEST_METHOD"]
+        if method not in ("GET", "HEAD"):
+            start_response("405 Method Not Allowed", [("Allow", "GET, HEAD")])
+            return [b"405 Method Not Allowed"]
+
+        # 只在预先载入的文件中查找，不会访问资源目录以外的路径
+        path = unquote(environ["PATH_INFO"]).lstrip("/") or "index.html"
+        file = self.files.get(path)
+        if file is None:
+            start_response("404 Not Found", [])
+            return [b"404 Not Found"]
+
+        headers = [
+            ("Content-Type", file.mime_type),
+            ("ETag", file.etag),
+            ("Cache-Control", file.cache_control),
+            ("Accept-Ranges", "bytes"),
+        ]
+        if file.encodings:
+            headers.append(("Vary", "Accept-Encoding"))
+
+        if_none_match = environ.get("HTTP_IF_NONE_MATCH", "")
+        if file.etag in [tag.strip() for tag in if_none_match.split(",")]:
+            start_response("304 Not Modified", headers)
+            return []
+
+        body = file.content
+        status = "200 OK"
+        range_header = environ.get("HTTP_RANGE", "")
+        if range_header.startswith("bytes=") and "," not in range_header:
+            # 范围请求返回未压缩的内容
+            try:
+                byte_range = parse_range(range_header, len(body))
+            except ValueError:
+                byte_range = None
+            if byte_range is None:
+                start_response(
+                    "416 Range Not Satisfiable",
+                    [("Content-Range", f"bytes */{len(body)}")],
+                )
+                return []
+            start, end = byte_range
+            headers.append(("Content-Range", f"bytes {start}-{end}/{len(body)}"))
+            body = body[start : end + 1]
+            status = "206 Partial Content"
+        else:
+            accepted = accepted_encodings(environ.get("HTTP_ACCEPT_ENCODING", ""))
+            for encoding in ("br", "gzip"):
+                if encoding in accepted and encoding in file.encodings:
+                    headers.append(("Content-Encoding", encoding))
+                    body = file.encodings[encoding]
+                    break
+
+        headers.append(("Content-Length", str(len(body))))
+        start_response(status, headers)
+        # 内存映射的大文件需要转换为bytes，bytes对象本身不会被复制
+        return [] if method == "HEAD" else [bytes(body)]
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    """
+    每个连接使用单独的线程处理，慢请求不会阻塞其他请求
+    """
+
+    daemon_threads = True
+    # 默认的监听队列只有5，前端并发加载资源时多余的连接会被丢弃并在1秒后重试
+    request_queue_size = 64
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        log.debug(f"{self.address_string()} - {format % args}")
@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# 被测模块导入时会在程序目录下打开数据库，测试时改为临时目录
+os.environ["BXOCR_HOME"] = tempfile.mkdtemp(prefix="bxocr-test-")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,94 @@
+import io
+import random
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from duplicate import DuplicateIndex, phash
+
+
+def receipt(seed: int) -> Image.Image:
+    """
+    放在深色桌面上的票据，文字块随机排布，seed不同的票据版式相同、内容不同
+    """
+    rng = random.Random(seed)
+    img = Image.new("RGB", (600, 800), (80, 80, 80))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((40, 40, 560, 760), fill="white")
+    for _ in range(40):
+        x, y = rng.randrange(60, 480), rng.randrange(60, 720)
+        draw.rectangle((x, y, x + rng.randrange(20, 80), y + 12), fill="black")
+    return img
+
+
+def reencode(img: Image.Image, scale: float = 1.0) -> Image.Image:
+    if scale != 1.0:
+        img = img.resize((int(img.width * scale), int(img.height * scale)))
+    buffer = io.BytesIO()
+    img.save(buffer, format="JPEG", quality=70)
+    return Image.open(io.BytesIO(buffer.getvalue()))
+
+
+def distance(a: bytes, b: bytes) -> int:
+    xor = np.frombuffer(a, dtype=np.uint8) ^ np.frombuffer(b, dtype=np.uint8)
+    return int(np.unpackbits(xor).sum())
+
+
+@pytest.fixture
+def index():
+    path = Path(tempfile.mkdtemp(prefix="bxocr-test-")) / "image_hashes.sqlite3"
+    return DuplicateIndex(path)
+
+
+def test_phash_is_stable_under_reencoding():
+    original = phash(receipt(1))
+    assert len(original) == 32
+    assert distance(original, phash(reencode(receipt(1)))) <= 4
+    assert distance(original, phash(reencode(receipt(1), scale=0.9))) <= 16
+    assert distance(original, phash(receipt(2))) > 16
+
+
+def test_find_by_distance(index):
+    index.add(phash(receipt(1)), "1", {"success": True})
+    index.add(phash(receipt(2)), "2", {"success": True})
+
+    matches = index.find(phash(reencode(receipt(1))), threshold=16)
+    assert [match["invoice_number"] for match in matches] == ["1"]
+    assert matches[0]["result"] == {"success": True}
+    assert index.find(phash(receipt(3)), threshold=16) == []
+
+
+def test_find_excludes_other_invoice_numbers(index):
+    img_phash = phash(receipt(1))
+    index.add(img_phash, "1", {"success": True})
+    index.add(img_phash, None, {"success": True})
+
+    assert len(index.find(img_phash, threshold=0)) == 2
+    # 二维码中的号码不同，说明是版式相同的另一张发票，只保留没有号码的记录
+    matches = index.find(img_phash, threshold=0, invoice_number="2")
+    assert [match["invoice_number"] for match in matches] == [None]
+
+
+def test_remove_invoice_and_clear_results(index):
+    img_phash = phash(receipt(1))
+    index.add(img_phash, "1")
+    index.add(img_phash, "1", {"success": True})
+    assert len(index) == 2
+
+    index.remove_invoice("1")
+    assert [match["result"] for match in index.find(img_phash, 0)] == [
+        {"success": True}
+    ]
+    index.add(img_phash, "1")
+    index.clear_results()
+    assert [match["result"] for match in index.find(img_phash, 0)] == [None]
+
+
+def test_index_is_persisted(index):
+    index.add(phash(receipt(1)), "1")
+    reloaded = DuplicateIndex(index.path)
+    assert len(reloaded) == 1
+    assert reloaded.find(phash(receipt(1)), 0)[0]["invoice_number"] == "1"
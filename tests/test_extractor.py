@@ -0,0 +1,107 @@
+from extractor import check_fields, extract_fields
+
+invoice_text = "\n".join(
+    [
+        "电子发票（普通发票）",
+        "发票号码：24332000000012345678",
+        "开票日期：2024年3月5日",
+        "*餐饮服务*餐费",
+        "价税合计（大写）壹佰元整 （小写）¥1,100.00",
+    ]
+)
+
+ticket_text = "\n".join(
+    [
+        "电子发票（铁路电子客票）",
+        "发票号码:24119000000098765432",
+        "开票日期:2024年01月20日",
+        "北京南站",
+        "G123",
+        "上海虹桥站",
+        "2024年01月21日 08:05开",
+        "二等座",
+        "￥553.00",
+        "3301061990****1234 张三",
+    ]
+)
+
+
+def test_invoice_fields():
+    fields = extract_fields(
+        invoice_text,
+        ["invoice_number", "invoice_date", "total_amount", "program_name"],
+    )
+    assert fields == {
+        "invoice_number": "24332000000012345678",
+        "invoice_date": "20240305",
+        "total_amount": "1100.00",
+        "program_name": "*餐饮服务*餐费",
+    }
+
+
+def test_train_ticket_fields():
+    fields = extract_fields(
+        ticket_text,
+        [
+            "invoice_number",
+            "travel_date",
+            "departure_time",
+            "train_service",
+            "first_station",
+            "second_station",
+            "price",
+            "seat_class",
+            "passenger_name",
+        ],
+    )
+    assert fields == {
+        "invoice_number": "24119000000098765432",
+        "travel_date": "20240121",
+        "departure_time": "08:05",
+        "train_service": "G123",
+        "first_station": "北京南站",
+        "second_station": "上海虹桥站",
+        "price": "553.00",
+        "seat_class": "二等座",
+        "passenger_name": "张三",
+    }
+
+
+def test_only_requested_fields():
+    assert extract_fields(invoice_text, ["invoice_number"]) == {
+        "invoice_number": "24332000000012345678"
+    }
+    assert extract_fields(invoice_text, ["unknown_field"]) == {}
+
+
+def test_ambiguous_values_are_left_to_llm():
+    text = "发票号码：12345678\n发票号码：87654321\n开票日期：2024年3月5日"
+    assert extract_fields(text, ["invoice_number", "invoice_date"]) == {
+        "invoice_date": "20240305"
+    }
+
+
+def test_invalid_values_are_dropped():
+    text = "发票号码：12345678\n开票日期：2024年13月05日"
+    assert extract_fields(text, ["invoice_number", "invoice_date"]) == {
+        "invoice_number": "12345678"
+    }
+
+
+def test_check_fields():
+    fields = {
+        "invoice_number": "",
+        "invoice_date": "20240230",
+        "travel_date": "2024年01月21日",
+        "departure_time": "25:00",
+        "total_amount": "abc",
+        "price": "0.00",
+        "program_name": "*餐饮服务*餐费",
+    }
+    assert check_fields(fields) == {
+        "price": "0.00",
+        "program_name": "*餐饮服务*餐费",
+    }
+    assert check_fields({"invoice_number": "1234567", "invoice_date": "20240229"}) == {
+        "invoice_date": "20240229"
+    }
@@ -0,0 +1,124 @@
+import io
+import tempfile
+from pathlib import Path
+
+import pytest
+from PIL import Image
+
+from invoice_store import InvoiceStore, InvoiceStoreError
+
+
+@pytest.fixture
+def store():
+    path = Path(tempfile.mkdtemp(prefix="bxocr-test-")) / "invoices.sqlite3"
+    return InvoiceStore(path, thumbnail_size=64, max_page_size=2)
+
+
+def invoice(number, date="2024-03-05", amount=100.0, **fields) -> dict:
+    return {
+        "invoice_number": number,
+        "invoice_type": "普通发票",
+        "date": date,
+        "program": "*餐饮服务*餐费",
+        "amount": amount,
+        "content": "",
+        **fields,
+    }
+
+
+def png(size=(200, 100)) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "white").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_add_and_get(store):
+    saved = store.add(invoice(12345678, amount="1.50"))
+    assert saved["invoice_number"] == "12345678"
+    assert saved["amount"] == 1.5
+    assert store.get("12345678") == saved
+    assert store.get("87654321") is None
+
+
+def test_invoice_number_is_required_and_unique(store):
+    with pytest.raises(InvoiceStoreError):
+        store.add(invoice(" "))
+    store.add(invoice("1"))
+    with pytest.raises(InvoiceStoreError):
+        store.add(invoice("1"))
+
+
+def test_update_and_delete(store):
+    store.add(invoice("1", amount=1))
+    assert store.update(invoice("1", amount=2))["amount"] == 2
+    with pytest.raises(InvoiceStoreError):
+        store.update(invoice("2"))
+
+    store.delete("1")
+    assert store.get("1") is None
+    with pytest.raises(InvoiceStoreError):
+        store.delete("1")
+
+
+def test_images_and_thumbnails(store):
+    store.add(invoice("1"), ("image/png", png()))
+    store.add(invoice("2"))
+
+    assert store.image("1") == ("image/png", png())
+    assert store.image("2") is None
+    thumbnails = store.thumbnails(["1", "2"])
+    assert list(thumbnails) == ["1"]
+    with Image.open(io.BytesIO(thumbnails["1"])) as thumbnail:
+        assert thumbnail.format == "JPEG"
+        assert max(thumbnail.size) == 64
+
+    # 更新时不提供图片则保留原图
+    store.update(invoice("1", amount=5))
+    assert store.image("1") is not None
+
+
+def test_query_filters_and_paging(store):
+    store.add(invoice("1", date="2024-01-01", amount=10, program="*餐饮服务*餐费"))
+    store.add(invoice("2", date="2024-02-01", amount=20, program="*运输服务*客运"))
+    store.add(invoice("3", date="2024-03-01", amount=30, invoice_type="火车票"))
+
+    page = store.query(page=1, page_size=10)
+    assert page["page_size"] == 2
+    assert page["total"] == 3
+    assert [item["invoice_number"] for item in page["items"]] == ["3", "2"]
+    assert [item["invoice_number"] for item in store.query(page=2)["items"]] == ["1"]
+
+    def numbers(**filters):
+        result = store.query(order_by="amount", descending=False, **filters)
+        return [item["invoice_number"] for item in result["items"]]
+
+    assert numbers(invoice_type="火车票") == ["3"]
+    assert numbers(date_from="2024-02-01", date_to="2024-02-28") == ["2"]
+    assert numbers(min_amount=15, max_amount=25) == ["2"]
+    assert numbers(keyword="运输") == ["2"]
+    assert numbers(keyword="1") == ["1"]
+    assert store.count(min_amount=15) == 2
+
+    with pytest.raises(InvoiceStoreError):
+        store.query(order_by="amount; DROP TABLE invoices")
+
+
+def test_iter_invoices(store):
+    store.add(invoice("1", date="2024-02-01"), ("image/png", png()))
+    store.add(invoice("2", date="2024-01-01"))
+
+    rows = list(store.iter_invoices(with_images=True))
+    assert [row["invoice_number"] for row in rows] == ["2", "1"]
+    assert rows[0]["image"] is None
+    assert rows[1]["mime"] == "image/png"
+
+    rows = list(store.iter_invoices({"date_from": "2024-02-01"}))
+    assert [row["invoice_number"] for row in rows] == ["1"]
+    assert "image" not in rows[0]
+
+
+def test_clear(store):
+    store.add(invoice("1"), ("image/png", png()))
+    store.clear()
+    assert store.count() == 0
+    assert store.image("1") is None
@@ -0,0 +1,63 @@
+import threading
+
+import pytest
+
+from progress import listen
+from stage_graph import StageError, StageGraph
+
+
+def test_results_are_passed_in_dependency_order():
+    graph = StageGraph("test")
+    graph.add("sum", lambda a, b: a + b, "a", "b")
+    graph.add("a", lambda: 1)
+    graph.add("b", lambda a: a + 1, "a")
+
+    results = graph.run()
+
+    assert results == {"a": 1, "b": 2, "sum": 3}
+    assert set(graph.timings) == {"a", "b", "sum"}
+    assert graph.timings["sum"][0] >= graph.timings["b"][1]
+
+
+def test_independent_stages_run_in_parallel():
+    # 两个阶段都要等到对方开始才能结束，串行执行时会超时
+    barrier = threading.Barrier(2, timeout=5)
+    graph = StageGraph("test")
+    graph.add("visual", lambda: barrier.wait() is not None)
+    graph.add("mllm", lambda: barrier.wait() is not None)
+    graph.add("chat", lambda visual, mllm: visual and mllm, "visual", "mllm")
+
+    assert graph.run()["chat"] is True
+
+
+def test_stage_error_skips_pending_stages():
+    ran = []
+
+    def fail():
+        raise StageError("OCR失败")
+
+    graph = StageGraph("test")
+    graph.add("visual", fail)
+    graph.add("chat", lambda visual: ran.append("chat"), "visual")
+
+    with pytest.raises(StageError, match="OCR失败"):
+        graph.run()
+    assert ran == []
+
+
+def test_unsatisfiable_dependencies():
+    graph = StageGraph("test")
+    graph.add("chat", lambda plan: plan, "plan")
+
+    with pytest.raises(RuntimeError):
+        graph.run()
+
+
+def test_progress_events():
+    events = []
+    graph = StageGraph("test")
+    graph.add("visual", lambda: None)
+    with listen(lambda event, detail: events.append((event, detail["stage"]))):
+        graph.run()
+
+    assert events == [("stage", "visual")]
@@ -0,0 +1,96 @@
+import json
+import time
+import uuid
+import threading
+from collections import OrderedDict
+
+from loguru import logger as log
+
+# 单次上传大小上限
+max_upload_size = 64 * 1024 * 1024
+
+# 上传句柄前缀，前端以 "upload:<id>" 的形式将句柄传给 API
+handle_prefix = "upload:"
+
+
+class UploadStore:
+    """
+    存放前端通过本地服务器上传的原始图片，按句柄取用。
+    超过存活时间或总大小上限时，最早上传的内容会被清理。
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._items: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._total_size = 0
+        self._lock = threading.Lock()
+
+    def put(self, data: bytes) -> str:
+        """
+        保存上传内容
+        :param data: 图片文件内容
+        :return: 上传句柄
+        """
+        handle = handle_prefix + uuid.uuid4().hex
+        with self._lock:
+            self._items[handle] = (time.monotonic(), data)
+            self._total_size += len(data)
+            self._evict()
+        log.debug(f"收到上传: {handle}, {len(data) / 1024:.1f} KB")
+        return handle
+
+    def get(self, handle: str) -> bytes | None:
+        with self._lock:
+            self._evict()
+            item = self._items.get(handle)
+        return item[1] if item else None
+
+    def remove(self, handle: str):
+        with self._lock:
+            if item := self._items.pop(handle, None):
+                self._total_size -= len(item[1])
+
+    def _evict(self):
+        now = time.monotonic()
+        while self._items:
+            handle, (created, data) = next(iter(self._items.items()))
+            if now - created < self.ttl and self._total_size <= self.max_size:
+                break
+            self._items.popitem(last=False)
+            self._total_size -= len(data)
+            log.debug(f"上传内容已过期: {handle}")
+
+
+upload_store = UploadStore(max_size=512 * 1024 * 1024, ttl=30 * 60)
+
+
+def is_upload_handle(value: str) -> bool:
+    return value.startswith(handle_prefix)
+
+
+def upload_app(environ, start_response):
+    """接收前端以原始二进制上传的图片，返回供 API 使用的句柄"""
+    if environ["REQUEST_METHOD"] != "POST":
+        start_response("405 Method Not Allowed", [("Allow", "POST")])
+        return [b"405 Method Not Allowed"]
+
+    try:
+        length = int(environ.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        length = 0
+    if length <= 0 or length > max_upload_size:
+        start_response("413 Payload Too Large", [])
+        return [b"413 Payload Too Large"]
+
+    data = environ["wsgi.input"].read(length)
+    if len(data) != length:
+        start_response("400 Bad Request", [])
+        return [b"400 Bad Request"]
+
+    body = json.dumps({"handle": upload_store.put(data)}).encode()
+    start_response(
+        "200 OK",
+        [("Content-Type", "application/json"), ("Content-Length", str(len(body)))],
+    )
+    return [body]
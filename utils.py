@@ -1,38 +1,25 @@
 import json
 import re
+import threading
+import contextvars
 
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Callable, Iterable, List
 from loguru import logger as log
-from tqdm import tqdm
 
 from numpy import ndarray
 
+from cache import cache_key, result_cache
 from config import config
-from model import pipeline
-from classes import invoice_content
-
-base_key_words = [
-    "invoice_date",
-    "invoice_number",
-]
-
-ticket_key_words = [
-    "first_station",
-    "second_station",
-    "passenger_name",
-    "price",
-    "departure_time",
-    "seat_class",
-    "train_service",
-    "travel_date",
-]
-
-invoice_key_words = [
-    "total_amount",
-    "program_name",
-]
-
-all_key_words = base_key_words + ticket_key_words + invoice_key_words
+from model import get_pipeline, model_names, pipeline_args
+from extractor import check_fields, extract_fields
+from metrics import gate, span
+from progress import report
+from preprocess import mllm_image, preprocess_key
+from stage_graph import StageError, StageGraph
+from classes import invoice_content, ocr_image
+from document_types import classify, document_types
 
 
 def invoice_verify(code: str) -> bool | List[str]:
@@ -69,9 +56,7 @@ def invoice_verify(code: str) -> bool | List[str]:
 
 
 def ocr_llm_verify(chat_result: dict) -> dict:
-    for key in tqdm(
-        list(chat_result.keys()), total=len(chat_result), desc="正在验证LLM结果"
-    ):
+    for key in list(chat_result.keys()):
         content = chat_result[key]
         log.debug(f"正在处理键: {key}, 内容: {content}")
         if "对不起" in content or "无法识别" in content:
@@ -97,10 +82,11 @@ def ocr_llm_verify(chat_result: dict) -> dict:
 
         if key == "invoice_number":
             try:
-                pattern = r"\b\d{10,}\b"
+                # 全电发票号码为20位，旧版纸质发票为8位
+                pattern = r"\b\d{8,}\b"
                 result = re.findall(pattern, chat_result[key])[0]
                 chat_result[key] = int(result)
-            except ValueError:
+            except (ValueError, IndexError):
                 log.error(f"无法将{key}转换为整数: {chat_result[key]}")
                 chat_result[key] = 0
 
@@ -115,24 +101,234 @@ def ocr_llm_verify(chat_result: dict) -> dict:
                 .strip()
             )
 
-            assert float(
-                chat_result[key]
+            assert re.fullmatch(
+                r"\d+(\.\d+)?", chat_result[key]
             ), f"{key} should be a valid float, but got '{chat_result[key]}'!"
 
     return chat_result
 
 
-def ocr_pipline(img_ndarray: ndarray) -> invoice_content | str:
-    log.info("开始进行OCR识别...")
-    visual_predict_res = pipeline.visual_predict(
-        input=img_ndarray,
-        use_doc_orientation_classify=False,
-        use_doc_unwarping=False,
-        use_common_ocr=True,
-        use_seal_recognition=False,
-        use_table_recognition=True,
+def verify_fields(fields: dict) -> dict:
+    with span("ocr_llm_verify", fields=len(fields)):
+        return ocr_llm_verify(fields)
+
+
+def known_field_values(known_fields: dict) -> dict:
+    """
+    二维码与规则提取得到的字段已经过check_fields校验，不经过ocr_llm_verify对LLM输出的清理，
+    只将发票号码转换为整数
+    :param known_fields: 字段名到内容的映射
+    :return: 新的映射
+    """
+    values = dict(known_fields)
+    if "invoice_number" in values:
+        values["invoice_number"] = int(values["invoice_number"])
+    return values
+
+
+def text_box_count(visual_predict_res: List[dict]) -> int | None:
+    """
+    统计visual_predict结果中OCR识别到的文本框数量
+    """
+    try:
+        return sum(
+            len(res["layout_parsing_result"]["overall_ocr_res"]["rec_texts"])
+            for res in visual_predict_res
+        )
+    except (KeyError, TypeError):
+        return None
+
+
+def response_chars(llm_result) -> int | None:
+    """
+    LLM返回内容的字符数。管道不提供token用量，以字符数近似
+    """
+    if not isinstance(llm_result, dict):
+        return None
+    return sum(len(str(value)) for value in llm_result.values())
+
+
+def visual_text(visual_info_list: List[dict]) -> str:
+    """
+    拼接visual_info中的全部OCR文字
+    :param visual_info_list: OCR识别得到的visual_info列表
+    :return: 以换行分隔的文字
+    """
+    texts = []
+    for visual_info in visual_info_list:
+        texts += list(visual_info.get("normal_text_dict", {}).values())
+        texts += visual_info.get("table_text_list", [])
+        texts += visual_info.get("table_nei_text_list", [])
+    return "\n".join(text for text in texts if isinstance(text, str))
+
+
+def qr_known_fields(
+    qr_codes: List[str], invoice_type: str, visual_info_list: List[dict]
+) -> dict:
+    """
+    从发票二维码及OCR文字中直接得到的字段，这些字段无需再交给LLM提取
+    :param qr_codes: 通过invoice_verify校验的二维码内容
+    :param invoice_type: 发票类型
+    :param visual_info_list: OCR识别得到的visual_info列表
+    :return: 字段名到内容的映射
+    """
+    doc_type = document_types[invoice_type]
+    known = {
+        "invoice_number": qr_codes[3],
+        "invoice_date": qr_codes[5],
+        doc_type.amount_key: qr_codes[4],
+    }
+    if doc_type.program_key == "program_name":
+        # 发票明细中的项目名称形如 "*餐饮服务*餐费"
+        if program := re.search(r"\*[^*\s]+\*[^\s*]*", visual_text(visual_info_list)):
+            known["program_name"] = program.group()
+    return known
+
+
+# 提前开始的多模态LLM预测，结果不再需要时不必等待其完成
+mllm_executor = ThreadPoolExecutor(thread_name_prefix="mllm")
+
+visual_predict_args = {
+    "use_doc_orientation_classify": False,
+    "use_doc_unwarping": False,
+    "use_common_ocr": True,
+    "use_seal_recognition": False,
+    "use_table_recognition": not config.table_recognition.gating,
+}
+
+
+def table_count(verified_result: dict) -> int:
+    """
+    版面检测找到的表格区域数量
+    """
+    try:
+        boxes = verified_result["layout_parsing_result"]["layout_det_res"]["boxes"]
+    except (KeyError, TypeError):
+        return 0
+    return sum(1 for box in boxes if box.get("label") == "table")
+
+
+def recognize_tables(img_ndarray: ndarray, verified_result: dict) -> dict:
+    """
+    复用第一遍visual_predict的版面检测与OCR结果，只对表格区域运行表格识别，
+    返回包含表格内容的visual_info
+    """
+    chat_ocr = get_pipeline().paddlex_pipeline
+    layout_parsing_result = verified_result["layout_parsing_result"]
+    try:
+        table_res = next(
+            chat_ocr.layout_parsing_pipeline.table_recognition_pipeline(
+                layout_parsing_result["doc_preprocessor_res"]["output_img"],
+                use_doc_orientation_classify=False,
+                use_doc_unwarping=False,
+                use_layout_detection=False,
+                use_ocr_model=False,
+                overall_ocr_res=layout_parsing_result["overall_ocr_res"],
+                layout_det_res=layout_parsing_result["layout_det_res"],
+            )
+        )
+    except (AttributeError, KeyError, TypeError) as e:
+        # 管道内部结构与预期不同（PaddleX版本变化）时关闭表格识别门控，
+        # 之后的visual_predict直接识别表格，当前图片重新完整识别一次
+        log.warning(f"无法单独运行表格识别，已关闭表格识别门控: {e!r}")
+        config.table_recognition.gating = False
+        visual_predict_args["use_table_recognition"] = True
+        return next(
+            get_pipeline().visual_predict(input=img_ndarray, **visual_predict_args)
+        )["visual_info"]
+    return chat_ocr.decode_visual_result(
+        {
+            "parsing_res_list": layout_parsing_result["parsing_res_list"],
+            "table_res_list": table_res["table_res_list"],
+        }
     )
 
+
+def gate_tables(img_ndarray: ndarray, verified_result: dict) -> dict:
+    """
+    第一遍visual_predict不识别表格，按文档类型和版面检测结果决定是否补充识别表格。
+    没有表格区域时表格识别不会产生内容，直接跳过
+    :param verified_result: visual_predict的单张结果
+    :return: visual_info
+    """
+    visual_info = verified_result["visual_info"]
+    if not config.table_recognition.gating:
+        return visual_info
+
+    invoice_type = classify(visual_text([visual_info]))
+    if not config.table_recognition.document_types.get(invoice_type, True):
+        gate("table_recognition", "disabled", invoice_type=invoice_type)
+        return visual_info
+    if not (tables := table_count(verified_result)):
+        gate("table_recognition", "no_table", invoice_type=invoice_type)
+        return visual_info
+
+    gate("table_recognition", "run", invoice_type=invoice_type, tables=tables)
+    with span("table_recognition", tables=tables):
+        return recognize_tables(img_ndarray, verified_result)
+
+
+def stage_cache_keys(img_hash: str) -> dict[str, str]:
+    """
+    计算各阶段的缓存键。后一阶段的键包含前一阶段的键，
+    因此只有受模型或配置变更影响的阶段及其后续阶段会失效。
+    :param img_hash: 图片内容的哈希
+    :return: visual、vector、result三个阶段的缓存键
+    """
+    visual = cache_key(
+        img_hash,
+        preprocess_key(),
+        model_names,
+        pipeline_args,
+        visual_predict_args,
+        config.table_recognition.document_types,
+    )
+    vector = cache_key(visual, config.retriever_config.model_name)
+    result = cache_key(
+        vector,
+        config.mllm_chat_bot_config.model_name,
+        config.chat_bot_config.model_name,
+        {name: t.key_words for name, t in document_types.items()},
+        config.qr_fast_path,
+        config.rule_extraction,
+    )
+    return {"visual": visual, "vector": vector, "result": result}
+
+
+def cache_get(stage: str, cache_keys: dict[str, str] | None):
+    if result_cache is None or not cache_keys:
+        return None
+    return result_cache.get(stage, cache_keys[stage])
+
+
+def cache_put(stage: str, cache_keys: dict[str, str] | None, value):
+    if result_cache is None or not cache_keys:
+        return
+    result_cache.put(stage, cache_keys[stage], value)
+
+
+def ocr_visual(
+    img_ndarray: ndarray, cache_keys: dict[str, str] | None = None
+) -> List[dict] | str:
+    """
+    对单张图片进行OCR识别，返回该图片的visual_info列表
+    :param img_ndarray: 图片数组
+    :param cache_keys: 各阶段的缓存键，为None时不使用缓存
+    :return: visual_info列表，失败时返回错误信息
+    """
+    if visual_info_list := cache_get("visual", cache_keys):
+        log.info("OCR识别结果命中缓存")
+        return visual_info_list
+
+    log.info("开始进行OCR识别...")
+    with span(
+        "visual_predict", width=img_ndarray.shape[1], height=img_ndarray.shape[0]
+    ) as attrs:
+        visual_predict_res = list(
+            get_pipeline().visual_predict(input=img_ndarray, **visual_predict_args)
+        )
+        attrs["text_boxes"] = text_box_count(visual_predict_res)
+
     if not visual_predict_res:
         return "OCR returned no results."
 
@@ -141,107 +337,452 @@ def ocr_pipline(img_ndarray: ndarray) -> invoice_content | str:
         if "visual_info" not in verified_result:
             log.warning("视觉预测结果中缺少visual_info字段")
             continue
-        visual_info_list.append(verified_result["visual_info"])
-        layout_parsing_result = verified_result.get("layout_parsing_result", None)
+        visual_info_list.append(gate_tables(img_ndarray, verified_result))
 
     if not visual_info_list:
         return "无法从OCR结果中提取视觉信息"
 
-    log.info(f"OCR提取完成，开始构建向量")
+    cache_put("visual", cache_keys, visual_info_list)
+    return visual_info_list
 
-    vector_info = pipeline.build_vector(
-        visual_info_list,
-        flag_save_bytes_vector=True,
-        retriever_config=config.retriever_config.__dict__,
-    )
 
-    log.info("向量构建完成，开始进行多模态LLM预测...")
+def ocr_visual_batch(
+    img_ndarrays: List[ndarray],
+    cache_keys_list: List[dict[str, str] | None] | None = None,
+) -> List[List[dict] | str]:
+    """
+    将多张图片一次性送入visual_predict，按输入顺序返回每张图片的visual_info列表。
+    已命中缓存的图片不会再送入visual_predict。
+    :param img_ndarrays: 图片数组列表
+    :param cache_keys_list: 与图片一一对应的缓存键
+    :return: 与输入一一对应的visual_info列表，失败的图片对应错误信息
+    """
+    cache_keys_list = cache_keys_list or [None] * len(img_ndarrays)
+    results: List[List[dict] | str | None] = [
+        cache_get("visual", cache_keys) for cache_keys in cache_keys_list
+    ]
+    missed = [i for i, result in enumerate(results) if not result]
+    if not missed:
+        return results
+
+    log.info(f"开始进行批量OCR识别，共{len(missed)}张图片...")
+    with span("visual_predict", images=len(missed)) as attrs:
+        predict_res = list(
+            get_pipeline().visual_predict(
+                input=[img_ndarrays[i] for i in missed], **visual_predict_args
+            )
+        )
+        attrs["text_boxes"] = text_box_count(predict_res)
+    for index, verified_result in zip(missed, predict_res):
+        if "visual_info" not in verified_result:
+            log.warning("视觉预测结果中缺少visual_info字段")
+            results[index] = "无法从OCR结果中提取视觉信息"
+            continue
+        results[index] = [gate_tables(img_ndarrays[index], verified_result)]
+        cache_put("visual", cache_keys_list[index], results[index])
+
+    for index in missed:
+        if results[index] is None:
+            log.error(f"批量OCR结果数量不匹配，第{index + 1}张图片没有结果")
+            results[index] = "OCR returned no results."
 
-    mllm_predict_res = pipeline.mllm_pred(
-        input=img_ndarray,
-        key_list=all_key_words,
-        mllm_chat_bot_config=config.mllm_chat_bot_config.__dict__,
+    return results
+
+
+def ocr_pipline(
+    img_ndarray: ndarray,
+    img_hash: str | None = None,
+    qr_codes: List[str] | None = None,
+) -> invoice_content | str:
+    """
+    识别单张发票。启用speculative_mllm时多模态LLM预测与本地OCR同时开始，
+    否则在判断文档类型之后进行，只请求该类型仍缺少的字段，与向量构建并行执行
+    :param img_ndarray: 图片数组
+    :param img_hash: 图片内容的哈希，用于查询和写入缓存；为None时不使用缓存
+    :param qr_codes: 通过invoice_verify校验的二维码内容，参见ocr_llm
+    :return: 识别结果，失败时返回错误信息
+    """
+    cache_keys = stage_cache_keys(img_hash) if img_hash else None
+    if result := cache_get("result", cache_keys):
+        log.info(f"识别结果命中缓存: {result}")
+        return result
+
+    def visual_stage():
+        visual_info_list = ocr_visual(img_ndarray, cache_keys)
+        if isinstance(visual_info_list, str):
+            raise StageError(visual_info_list)
+        return visual_info_list
+
+    graph = StageGraph("ocr")
+    graph.add("visual", visual_stage)
+    add_llm_stages(
+        graph, img_ndarray, cache_keys, qr_codes, speculate=config.speculative_mllm
     )
-    if "调用失败" in mllm_predict_res["mllm_res"]:
-        log.error("多模态LLM调用失败，请检查接口配置！")
-        return "多模态LLM调用失败，请检查接口配置！"
-
-    log.debug(f"mllm_predict_res: {mllm_predict_res}")
-
-    if not mllm_predict_res or "mllm_res" not in mllm_predict_res:
-        return "多模态LLM预测返回无效结果"
-
-    log.info("多模态LLM处理完成，正在整理结果")
-    invoice_type = "common_invoice"
-    key_words = base_key_words + invoice_key_words
-    for key in mllm_predict_res["mllm_res"].keys():
-        if "中国铁路祝您旅途愉快" in mllm_predict_res["mllm_res"][key]:
-            log.debug("当前发票类型为火车票")
-            key_words = ticket_key_words + base_key_words
-            invoice_type = "train_ticket"
-            break
+    try:
+        return graph.run()["chat"]
+    except StageError as e:
+        return str(e)
+
+
+def ocr_batch_pipline(
+    images: Iterable[ocr_image],
+    callback: Callable[[int, invoice_content | str], None],
+    batch_size: int | None = None,
+    llm_concurrency: int | None = None,
+):
+    """
+    批量识别发票。图片按batch_size分批送入visual_predict，
+    LLM阶段在线程池中以llm_concurrency的并发度执行，与下一批的OCR识别重叠进行。
+    图片按需从images中读取，等待LLM阶段的图片最多为llm_concurrency + batch_size张，
+    不会一次性全部载入内存。
+    :param images: 待识别图片的可迭代对象
+    :param callback: 每张图片完成时的回调，参数为图片序号和识别结果
+    :param batch_size: 每批送入visual_predict的图片数量，默认读取配置
+    :param llm_concurrency: 同时进行的LLM请求数量，默认读取配置
+    """
+    batch_size = max(1, batch_size or config.batch.batch_size)
+    llm_concurrency = max(1, llm_concurrency or config.batch.llm_concurrency)
+
+    def finish(index: int, result: invoice_content | str):
+        try:
+            callback(index, result)
+        except Exception as e:
+            log.error(f"批量识别回调出错: {e}")
+
+    def run_llm(
+        index: int,
+        image: ocr_image,
+        visual_info_list: List[dict],
+        cache_keys: dict[str, str] | None,
+    ):
+        try:
+            result = ocr_llm(
+                image.img_ndarray, visual_info_list, cache_keys, image.qr_codes
+            )
+        except Exception as e:
+            log.exception(f"第{index + 1}张图片识别失败: {e}")
+            result = f"识别失败: {e}"
+        finish(index, result)
+
+    # 限制已提交但未完成的LLM任务数量：LLM比本地OCR慢时，读取和识别下一批图片会在此等待，
+    # 避免图片数组和OCR结果在线程池队列中无限堆积。多出的一批使OCR仍能与LLM重叠进行
+    llm_slots = threading.BoundedSemaphore(llm_concurrency + batch_size)
+
+    img_iter = iter(images)
+    start = 0
+    with ThreadPoolExecutor(max_workers=llm_concurrency) as executor:
+        while batch := list(islice(img_iter, batch_size)):
+            ready = []
+            pending = []
+            for offset, image in enumerate(batch):
+                cache_keys = (
+                    stage_cache_keys(image.img_hash) if image.img_hash else None
+                )
+                if result := cache_get("result", cache_keys):
+                    finish(start + offset, result)
+                elif image.visual_info_list:
+                    ready.append((start + offset, image, cache_keys))
+                else:
+                    pending.append((start + offset, image, cache_keys))
+            start += len(batch)
+
+            visual_results = []
+            if pending:
+                try:
+                    visual_results = ocr_visual_batch(
+                        [image.img_ndarray for _, image, _ in pending],
+                        [cache_keys for _, _, cache_keys in pending],
+                    )
+                except Exception as e:
+                    log.exception(f"批量OCR识别失败: {e}")
+                    visual_results = [f"OCR识别失败: {e}"] * len(pending)
+
+            for (index, image, cache_keys), visual_info_list in zip(
+                ready + pending,
+                [image.visual_info_list for _, image, _ in ready] + visual_results,
+            ):
+                if isinstance(visual_info_list, str):
+                    finish(index, visual_info_list)
+                else:
+                    llm_slots.acquire()
+                    future = executor.submit(
+                        contextvars.copy_context().run,
+                        run_llm,
+                        index,
+                        image,
+                        visual_info_list,
+                        cache_keys,
+                    )
+                    future.add_done_callback(lambda _: llm_slots.release())
+
+
+def ocr_llm(
+    img_ndarray: ndarray,
+    visual_info_list: List[dict],
+    cache_keys: dict[str, str] | None = None,
+    qr_codes: List[str] | None = None,
+) -> invoice_content | str:
+    """
+    根据OCR结果调用LLM提取发票信息，向量构建与多模态LLM预测并行执行
+    :param img_ndarray: 图片数组
+    :param visual_info_list: OCR识别得到的visual_info列表
+    :param cache_keys: 各阶段的缓存键，为None时不使用缓存
+    :param qr_codes: 通过invoice_verify校验的二维码内容。提供时二维码已包含的字段不再交给LLM提取，
+        若所需字段均已得到则完全跳过LLM
+    :return: 识别结果，失败时返回错误信息
+    """
+    graph = StageGraph("llm")
+    graph.add("visual", lambda: visual_info_list)
+    add_llm_stages(graph, img_ndarray, cache_keys, qr_codes)
+    try:
+        return graph.run()["chat"]
+    except StageError as e:
+        return str(e)
+
+
+def add_llm_stages(
+    graph: StageGraph,
+    img_ndarray: ndarray,
+    cache_keys: dict[str, str] | None,
+    qr_codes: List[str] | None,
+    speculate: bool = False,
+):
+    """
+    在graph中添加visual阶段之后的LLM阶段：
+    rules（判断文档类型，从二维码和OCR文字中直接得到字段）、plan（确定需要LLM提取的字段）、
+    vector（构建向量）、mllm（多模态LLM预测）和chat（整理结果）。
+    LLM只提取该文档类型需要的字段，所需字段都已由rules得到时跳过全部LLM调用。
+    speculate为True时多模态LLM预测不等待OCR，立即按二维码发票种类或默认文档类型的全部字段开始，
+    与本地OCR重叠进行；plan得到的文档类型不同或需要其他字段时丢弃该结果，按plan的字段重新预测。
+    chat阶段的结果即为识别结果。
+    :param graph: 已包含visual阶段的StageGraph
+    :param img_ndarray: 图片数组
+    :param cache_keys: 各阶段的缓存键，为None时不使用缓存
+    :param qr_codes: 通过invoice_verify校验的二维码内容
+    :param speculate: 是否提前开始多模态LLM预测
+    """
+
+    def rules_stage(visual_info_list: List[dict]):
+        """
+        :return: (发票类型, 由二维码和规则提取得到的字段)
+        """
+        text = visual_text(visual_info_list)
+        invoice_type = classify(text, qr_codes)
+
+        known_fields = {}
+        if config.rule_extraction:
+            with span("rule_extract") as attrs:
+                known_fields = extract_fields(
+                    text, document_types[invoice_type].key_words
+                )
+                attrs["fields"] = len(known_fields)
+            log.info(f"规则提取到的字段: {list(known_fields)}")
+        if qr_codes:
+            # 二维码内容比OCR文字可靠，优先使用；格式不正确的字段仍交给LLM
+            known_fields.update(
+                check_fields(qr_known_fields(qr_codes, invoice_type, visual_info_list))
+            )
+        report("fields", fields=partial_content(invoice_type, known_fields))
+        return invoice_type, known_fields
+
+    def plan_stage(rules: tuple):
+        """
+        :return: (发票类型, 无需LLM提取的字段, 需要LLM提取的字段)
+        """
+        invoice_type, known_fields = rules
+        key_words = [
+            key
+            for key in document_types[invoice_type].key_words
+            if key not in known_fields
+        ]
+        log.info(f"已得到字段: {list(known_fields)}，仍需LLM提取: {key_words}")
+        return invoice_type, known_fields, key_words
+
+    def vector_stage(visual_info_list: List[dict], plan: tuple):
+        if not plan[2]:
+            return None
+
+        if vector_info := cache_get("vector", cache_keys):
+            log.info("向量命中缓存")
+            return vector_info
+
+        log.info("开始构建向量")
+        with span("build_vector", text_chars=len(visual_text(visual_info_list))):
+            vector_info = get_pipeline().build_vector(
+                visual_info_list,
+                flag_save_bytes_vector=True,
+                retriever_config=config.retriever_config.__dict__,
+            )
+        cache_put("vector", cache_keys, vector_info)
+        log.info("向量构建完成")
+        return vector_info
+
+    def mllm_predict(key_words: List[str]):
+        log.info("开始进行多模态LLM预测...")
+        mllm_input = mllm_image(img_ndarray)
+        with span(
+            "mllm_pred",
+            width=mllm_input.shape[1],
+            height=mllm_input.shape[0],
+            keys=len(key_words),
+        ) as attrs:
+            mllm_predict_res = get_pipeline().mllm_pred(
+                input=mllm_input,
+                key_list=key_words,
+                mllm_chat_bot_config=config.mllm_chat_bot_config.__dict__,
+            )
+            attrs["response_chars"] = response_chars(
+                (mllm_predict_res or {}).get("mllm_res")
+            )
+        log.debug(f"mllm_predict_res: {mllm_predict_res}")
+
+        if not mllm_predict_res or "mllm_res" not in mllm_predict_res:
+            raise StageError("多模态LLM预测返回无效结果")
+
+        if "调用失败" in mllm_predict_res["mllm_res"]:
+            log.error("多模态LLM调用失败，请检查接口配置！")
+            raise StageError("多模态LLM调用失败，请检查接口配置！")
+
+        log.info("多模态LLM处理完成")
+        return mllm_predict_res["mllm_res"]
+
+    speculation = None
+    if speculate:
+        # 看不到OCR文字时只能按二维码中的发票种类判断文档类型，没有二维码时为默认类型
+        speculative_type = classify("", qr_codes)
+        speculative_keys = document_types[speculative_type].key_words
+        speculation = (
+            speculative_type,
+            speculative_keys,
+            mllm_executor.submit(
+                contextvars.copy_context().run, mllm_predict, speculative_keys
+            ),
+        )
+
+    def mllm_stage(plan: tuple):
+        invoice_type, _, key_words = plan
+        if not key_words:
+            return None
+
+        if speculation:
+            speculative_type, speculative_keys, future = speculation
+            if invoice_type == speculative_type and set(key_words) <= set(
+                speculative_keys
+            ):
+                return future.result()
+            log.info(
+                f"文档类型为{invoice_type}，与提前预测的{speculative_type}字段不符，"
+                "重新进行多模态LLM预测"
+            )
+        return mllm_predict(key_words)
+
+    def chat_stage(
+        visual_info_list: List[dict],
+        plan: tuple,
+        vector_info: dict | None,
+        mllm_predict_info: dict | None,
+    ):
+        invoice_type, known_fields, key_words = plan
+        if not key_words:
+            log.info("二维码与规则提取的信息已足够，跳过LLM")
+            result = build_invoice_content(
+                invoice_type, known_field_values(known_fields)
+            )
+            if isinstance(result, invoice_content):
+                cache_put("result", cache_keys, result)
+            return result
+
+        log.info("正在整理结果")
+        with span("chat", keys=len(key_words)) as attrs:
+            chat_result = get_pipeline().chat(
+                key_list=key_words,
+                visual_info=visual_info_list,
+                vector_info=vector_info,
+                mllm_predict_info=mllm_predict_info,
+                chat_bot_config=config.chat_bot_config.__dict__,
+                retriever_config=config.retriever_config.__dict__,
+            )
+            attrs["response_chars"] = response_chars(chat_result.get("chat_res"))
+
+        if chat_result := chat_result["chat_res"]:
+            log.info(f"chat_result: {chat_result}")
         else:
-            continue
+            return "成果整理失败"
 
-    mllm_predict_info = mllm_predict_res["mllm_res"]
-    chat_result = pipeline.chat(
-        key_list=key_words,
-        visual_info=visual_info_list,
-        vector_info=vector_info,
-        mllm_predict_info=mllm_predict_info,
-        chat_bot_config=config.chat_bot_config.__dict__,
-        retriever_config=config.retriever_config.__dict__,
-    )
+        verified_result = {
+            **verify_fields(chat_result),
+            **known_field_values(known_fields),
+        }
+        log.info(f"OCR识别和多模态LLM处理完成:{verified_result}")
+
+        result = build_invoice_content(invoice_type, verified_result)
+        if isinstance(result, invoice_content):
+            cache_put("result", cache_keys, result)
+
+        return result
 
-    if chat_result := chat_result["chat_res"]:
-        log.info(f"chat_result: {chat_result}")
-    else:
-        return "成果整理失败"
+    graph.add("rules", rules_stage, "visual")
+    graph.add("plan", plan_stage, "rules")
+    graph.add("vector", vector_stage, "visual", "plan")
+    graph.add("mllm", mllm_stage, "plan")
+    graph.add("chat", chat_stage, "visual", "plan", "vector", "mllm")
 
-    verified_result = ocr_llm_verify(chat_result)
-    log.info(f"OCR识别和多模态LLM处理完成:{verified_result}")
 
+def partial_content(invoice_type: str, fields: dict) -> dict:
+    """
+    将尚未经过LLM的字段整理为invoice_content的部分字段，供前端提前填入
+    :param invoice_type: 发票类型
+    :param fields: 字段名到内容的映射
+    :return: 只包含已得到的invoice_content字段
+    """
+    doc_type = document_types[invoice_type]
+    content = {
+        "program": (
+            fields.get(doc_type.program_key) if doc_type.program_key else doc_type.label
+        ),
+        "date": fields.get(doc_type.date_key),
+        "amount": fields.get(doc_type.amount_key),
+        "invoice_number": fields.get("invoice_number"),
+    }
+    return {key: value for key, value in content.items() if value}
+
+
+def build_invoice_content(
+    invoice_type: str, verified_result: dict
+) -> invoice_content | str:
+    """
+    按文档类型将校验后的字段整理为invoice_content
+    :param invoice_type: 发票类型，document_types中的名称
+    :param verified_result: 经过ocr_llm_verify校验的字段
+    :return: 识别结果，失败时返回错误信息
+    """
     if not invoice_type:
         log.error("没有找到发票类型！")
         return "这是一个内部错误，请联系管理员！"
 
-    result = None
-    match invoice_type:
-        case "train_ticket":
-            verified_result["invoice_type"] = "火车票"
-            content = {
-                "passenger_name": verified_result.get("passenger_name", ""),
-                "first_station": verified_result.get("first_station", ""),
-                "second_station": verified_result.get("second_station", ""),
-                "seat_class": verified_result.get("seat_class", ""),
-            }
-            result = invoice_content(
-                program=verified_result["invoice_type"],
-                date=verified_result.get("travel_date", ""),
-                amount=verified_result.get("price", ""),
-                content=json.dumps(
-                    content,
-                    indent=2,
-                ),
-                invoice_number=verified_result.get("invoice_number", 0),
-                invoice_type=verified_result["invoice_type"],
-            )
-        case "common_invoice":
-            verified_result["invoice_type"] = "普通发票"
-            result = invoice_content(
-                date=verified_result.get("invoice_date", ""),
-                program=verified_result.get("program_name", ""),
-                amount=verified_result.get("total_amount", ""),
-                content="",
-                invoice_number=verified_result.get("invoice_number", 0),
-                invoice_type=verified_result["invoice_type"],
-            )
-
-        case _:
-            log.error(f"未知的发票类型: {invoice_type}")
-            return "未知的发票类型"
-
-    assert result, "result is None, Result should not be None at this point"
+    if (doc_type := document_types.get(invoice_type)) is None:
+        log.error(f"未知的发票类型: {invoice_type}")
+        return "未知的发票类型"
+
+    verified_result["invoice_type"] = doc_type.label
+    content = ""
+    if doc_type.content_keys:
+        content = json.dumps(
+            {key: verified_result.get(key, "") for key in doc_type.content_keys},
+            indent=2,
+        )
+    result = invoice_content(
+        date=verified_result.get(doc_type.date_key, ""),
+        program=(
+            verified_result.get(doc_type.program_key, "")
+            if doc_type.program_key
+            else doc_type.label
+        ),
+        amount=verified_result.get(doc_type.amount_key, ""),
+        content=content,
+        invoice_number=verified_result.get("invoice_number", 0),
+        invoice_type=verified_result["invoice_type"],
+    )
 
     log.info(f"最终结果: {result}")
 
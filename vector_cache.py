@@ -0,0 +1,181 @@
+import time
+import base64
+import sqlite3
+import threading
+from pathlib import Path
+
+import numpy as np
+from loguru import logger as log
+
+from cache import cache_key
+from config import config, self_dir
+
+
+class EmbeddingCache:
+    """
+    基于SQLite的文本向量缓存，以向量模型和文本块内容为键。
+    多个工作进程共用同一个数据库文件，总大小超过上限时按最近使用时间淘汰。
+    向量总大小记录在stats表中，与写入在同一事务中更新，只在启动时重新统计。
+    """
+
+    def __init__(self, path: Path, max_size: int):
+        self.path = path
+        self.max_size = max_size
+        self._lock = threading.Lock()
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, model TEXT, vector BLOB, last_used REAL)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_last_used "
+                "ON embeddings (last_used)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS stats ("
+                "id INTEGER PRIMARY KEY CHECK (id = 0), "
+                "hits INTEGER, misses INTEGER, size INTEGER)"
+            )
+            self._conn.execute(
+                "INSERT OR IGNORE INTO stats (id, hits, misses, size) "
+                "VALUES (0, 0, 0, 0)"
+            )
+            self._conn.execute(
+                "UPDATE stats SET size = "
+                "(SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings) WHERE id = 0"
+            )
+
+    @staticmethod
+    def key(model: str, params: dict, item) -> str:
+        """
+        :param model: 向量模型名称
+        :param params: 影响向量结果的其他请求参数，例如dimensions
+        :param item: 单条输入，文本或token列表
+        """
+        return cache_key(model, params, item)
+
+    def get_many(self, keys: list[str]) -> list[bytes | None]:
+        """
+        :return: 与keys一一对应的float32向量字节，未命中为None
+        """
+        if not keys:
+            return []
+        rows: dict[str, bytes] = {}
+        with self._lock:
+            # SQLite对单条语句的参数数量有限制，分批查询
+            for i in range(0, len(keys), 500):
+                chunk = keys[i : i + 500]
+                rows.update(
+                    self._conn.execute(
+                        "SELECT key, vector FROM embeddings "
+                        f"WHERE key IN ({','.join('?' * len(chunk))})",
+                        chunk,
+                    ).fetchall()
+                )
+            hits = [key for key in keys if key in rows]
+            with self._conn:
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                    [(time.time(), key) for key in hits],
+                )
+                self._conn.execute(
+                    "UPDATE stats SET hits = hits + ?, misses = misses + ? WHERE id = 0",
+                    (len(hits), len(keys) - len(hits)),
+                )
+        return [rows.get(key) for key in keys]
+
+    def put_many(self, model: str, items: list[tuple[str, bytes]]):
+        if not items:
+            return
+        now = time.time()
+        keys = [key for key, _ in items]
+        with self._lock, self._conn:
+            # 被替换的向量先从总大小中扣除
+            for i in range(0, len(keys), 500):
+                chunk = keys[i : i + 500]
+                self._conn.execute(
+                    "UPDATE stats SET size = size - "
+                    "(SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings "
+                    f"WHERE key IN ({','.join('?' * len(chunk))})) WHERE id = 0",
+                    chunk,
+                )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, vector, last_used) "
+                "VALUES (?, ?, ?, ?)",
+                [(key, model, vector, now) for key, vector in items],
+            )
+            self._conn.execute(
+                "UPDATE stats SET size = size + ? WHERE id = 0",
+                (sum(len(vector) for _, vector in items),),
+            )
+            self._evict()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT size FROM stats WHERE id = 0").fetchone()[0]
+        if total <= self.max_size:
+            return
+        # 一次淘汰到上限的90%，避免每次写入都触发
+        excess = total - self.max_size * 0.9
+        removed = 0
+        for key, size in self._conn.execute(
+            "SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_used"
+        ).fetchall():
+            if removed >= excess:
+                break
+            self._conn.execute("DELETE FROM embeddings WHERE key = ?", (key,))
+            removed += size
+        self._conn.execute("UPDATE stats SET size = size - ? WHERE id = 0", (removed,))
+        log.debug(f"向量缓存淘汰 {removed / 1024 / 1024:.2f} MB")
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits, misses, size = self._conn.execute(
+                "SELECT hits, misses, size FROM stats WHERE id = 0"
+            ).fetchone()
+            count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else None,
+            "entries": count,
+            "size_mb": size / 1024 / 1024,
+        }
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.execute(
+                "UPDATE stats SET hits = 0, misses = 0, size = 0 WHERE id = 0"
+            )
+        with self._lock:
+            self._conn.execute("VACUUM")
+
+
+def encode_vector(embedding) -> bytes:
+    """
+    将接口返回的向量（浮点数列表或base64编码的float32）转换为float32字节
+    """
+    if isinstance(embedding, str):
+        return base64.b64decode(embedding)
+    return np.asarray(embedding, dtype=np.float32).tobytes()
+
+
+def decode_vector(vector: bytes, encoding_format: str | None):
+    """
+    按请求的encoding_format还原接口格式的向量
+    """
+    if encoding_format == "base64":
+        return base64.b64encode(vector).decode()
+    return np.frombuffer(vector, dtype=np.float32).tolist()
+
+
+embedding_cache: EmbeddingCache | None = None
+if config.vector_cache.enabled:
+    embedding_cache = EmbeddingCache(
+        path=self_dir.joinpath(config.vector_cache.path).resolve(),
+        max_size=int(config.vector_cache.max_size_mb * 1024 * 1024),
+    )
@@ -0,0 +1,400 @@
+import time
+import uuid
+import threading
+import multiprocessing
+from collections import OrderedDict, deque
+from typing import List
+from multiprocessing.connection import Connection, wait
+
+from loguru import logger as log
+
+from classes import api_invoice_error
+from model import profile_name
+
+# 保留的已完成任务数量，超过后最早完成的任务会被清理
+max_finished_jobs = 256
+
+
+def _worker_main(conn: Connection, index: int, workers: int):
+    """
+    OCR工作进程入口：加载模型后循环处理任务，直到收到None
+    :param index: 工作进程序号，用于分配CPU核心
+    :param workers: 工作进程数量
+    """
+    from log import log_init
+
+    log_init()
+
+    from cpu import apply_cpu_settings
+
+    apply_cpu_settings(index, workers)
+
+    import model
+    # 不经过api导入，避免子进程载入发票库、导出等与识别无关的模块
+    from image_ocr import ocr_img_bytes
+    from progress import listen
+
+    try:
+        model.get_pipeline()
+    except Exception as e:
+        conn.send(("error", str(e)))
+        return
+    conn.send(("ready", model.model_status()))
+    send_lock = threading.Lock()
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+
+        job_id, img_bytes, qr_codes = message
+
+        def on_progress(event: str, detail: dict, job_id=job_id):
+            # 进度事件可能来自阶段线程，Connection不是线程安全的
+            with send_lock:
+                conn.send(("progress", (job_id, event, detail)))
+
+        try:
+            with listen(on_progress):
+                result = ocr_img_bytes(img_bytes, qr_codes).to_dict()
+        except Exception as e:
+            log.exception(f"任务{job_id}处理失败: {e}")
+            result = api_invoice_error(f"识别失败: {e}").to_dict()
+        with send_lock:
+            conn.send(("result", (job_id, result)))
+
+
+class OcrJob:
+    job_id: str
+    img_bytes: bytes | None
+    state: str
+    result: dict | None
+    submitted: float
+    started: float | None
+    finished: float | None
+
+    def __init__(
+        self,
+        job_id: str,
+        img_bytes: bytes,
+        on_done=None,
+        on_progress=None,
+        qr_codes: List[str] | None = None,
+    ):
+        self.job_id = job_id
+        self.img_bytes = img_bytes
+        # 查重时已识别的二维码，工作进程中不再重复识别
+        self.qr_codes = qr_codes
+        self.on_done = on_done
+        self.on_progress = on_progress
+        # 在等待队列中的位置，从1开始
+        self.position: int | None = None
+        self.state = "queued"
+        self.result = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.done = threading.Event()
+
+    def progress(self, event: str, detail: dict):
+        if not self.on_progress:
+            return
+        try:
+            self.on_progress(event, detail)
+        except Exception as e:
+            log.error(f"任务{self.job_id}进度回调出错: {e}")
+
+    def to_dict(self):
+        return {
+            "job_id": self.job_id,
+            "state": self.state,
+            "position": self.position,
+            "result": self.result,
+            "submitted": self.submitted,
+            "started": self.started,
+            "finished": self.finished,
+        }
+
+
+class _Worker:
+    def __init__(self, index: int, workers: int):
+        self.index = index
+        self.ready = False
+        self.failed = False
+        self.job: OcrJob | None = None
+        self.deadline: float | None = None
+
+        ctx = multiprocessing.get_context("spawn")
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main,
+            args=(child_conn, index, workers),
+            name=f"ocr-worker-{index}",
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+        log.info(f"OCR工作进程{index}已启动，pid={self.process.pid}")
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+        except (OSError, BrokenPipeError):
+            pass
+        self.process.join(timeout=5)
+        self.kill()
+
+    def kill(self):
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+class OcrWorkerPool:
+    """
+    OCR工作进程池。每个工作进程各自持有一份已加载的管道，
+    任务通过job_id追踪，支持取消、超时，工作进程异常退出后会自动重启。
+    """
+
+    def __init__(self, size: int, job_timeout: float):
+        self.size = size
+        self.job_timeout = job_timeout
+        self._jobs: OrderedDict[str, OcrJob] = OrderedDict()
+        self._queue: deque[OcrJob] = deque()
+        self._workers: list[_Worker] = []
+        self._lock = threading.Lock()
+        self._running = False
+        self._wake_r, self._wake_w = multiprocessing.Pipe(duplex=False)
+        self._dispatcher: threading.Thread | None = None
+        self._error: str | None = None
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._workers = [_Worker(i, self.size) for i in range(self.size)]
+        self._dispatcher = threading.Thread(
+            target=self._dispatch, name="ocr-pool-dispatcher", daemon=True
+        )
+        self._dispatcher.start()
+
+    def shutdown(self):
+        self._running = False
+        self._wake()
+        if self._dispatcher:
+            self._dispatcher.join(timeout=5)
+        for worker in self._workers:
+            worker.stop()
+        with self._lock:
+            for job in self._queue:
+                self._finish(job, "cancelled", api_invoice_error("进程池已关闭"))
+            self._queue.clear()
+
+    def status(self) -> dict:
+        """
+        进程池状态，格式与model.model_status一致
+        """
+        ready = sum(1 for worker in self._workers if worker.ready)
+        if ready:
+            state = "ready"
+        elif self._error:
+            state = "error"
+        elif self._running:
+            state = "loading"
+        else:
+            state = "idle"
+        return {
+            "state": state,
+            "error": self._error,
+            "load_time": None,
+            "profile": profile_name,
+            "workers": len(self._workers),
+            "ready_workers": ready,
+            "queued": len(self._queue),
+        }
+
+    def submit(
+        self,
+        img_bytes: bytes,
+        on_done=None,
+        on_progress=None,
+        qr_codes: List[str] | None = None,
+    ) -> str:
+        """
+        提交识别任务
+        :param img_bytes: 图片文件内容
+        :param on_done: 任务结束时以job_id为参数调用，在调度线程中执行，不应阻塞
+        :param on_progress: 收到进度事件时以事件名和事件内容为参数调用，在调度线程中执行，不应阻塞。
+            排队中的任务位置变化时发送queued事件，开始执行时发送started事件，
+            执行过程中转发工作进程内的stage、fields等事件
+        :param qr_codes: 已识别的发票二维码字段，没有二维码时为空列表，为None时在工作进程中识别
+        :return: job_id
+        """
+        job = OcrJob(uuid.uuid4().hex, img_bytes, on_done, on_progress, qr_codes)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._queue.append(job)
+        self._wake()
+        return job.job_id
+
+    def get(self, job_id: str) -> OcrJob | None:
+        return self._jobs.get(job_id)
+
+    def wait(self, job_id: str, timeout: float | None = None) -> dict:
+        """
+        等待任务完成并返回识别结果
+        """
+        job = self._jobs.get(job_id)
+        if not job:
+            return api_invoice_error(f"任务不存在: {job_id}").to_dict()
+        if not job.done.wait(timeout):
+            return api_invoice_error("等待识别结果超时").to_dict()
+        return job.result
+
+    def cancel(self, job_id: str) -> bool:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if not job or job.done.is_set():
+                return False
+            if job.state == "queued":
+                self._queue.remove(job)
+                self._finish(job, "cancelled", api_invoice_error("任务已取消"))
+                return True
+            for worker in self._workers:
+                if worker.job is job:
+                    log.info(f"取消任务{job_id}，重启工作进程{worker.index}")
+                    self._finish(job, "cancelled", api_invoice_error("任务已取消"))
+                    self._restart(worker)
+                    return True
+        return False
+
+    def _wake(self):
+        try:
+            self._wake_w.send(None)
+        except (OSError, BrokenPipeError):
+            pass
+
+    def _finish(self, job: OcrJob, state: str, result):
+        job.state = state
+        job.result = result if isinstance(result, dict) else result.to_dict()
+        job.finished = time.time()
+        job.img_bytes = None
+        job.done.set()
+        if job.on_done:
+            try:
+                job.on_done(job.job_id)
+            except Exception as e:
+                log.error(f"任务{job.job_id}回调出错: {e}")
+
+        finished = [j for j in self._jobs.values() if j.done.is_set()]
+        for old in finished[: max(0, len(finished) - max_finished_jobs)]:
+            self._jobs.pop(old.job_id, None)
+
+    def _restart(self, worker: _Worker):
+        worker.kill()
+        self._workers[worker.index] = _Worker(worker.index, self.size)
+
+    def _dispatch(self):
+        while self._running:
+            with self._lock:
+                self._assign_jobs()
+                waitables = [self._wake_r] + [
+                    obj
+                    for worker in self._workers
+                    if not worker.failed
+                    for obj in (worker.conn, worker.process.sentinel)
+                ]
+
+            for ready in wait(waitables, timeout=1):
+                if ready is self._wake_r:
+                    while self._wake_r.poll():
+                        self._wake_r.recv()
+
+            with self._lock:
+                for worker in list(self._workers):
+                    if not worker.failed:
+                        self._poll_worker(worker)
+
+    def _assign_jobs(self):
+        if all(worker.failed for worker in self._workers):
+            # 所有工作进程都无法加载模型，排队中的任务直接失败
+            while self._queue:
+                job = self._queue.popleft()
+                self._finish(job, "failed", api_invoice_error(f"模型加载失败: {self._error}"))
+            return
+
+        for worker in self._workers:
+            if not self._queue:
+                return
+            if not worker.ready or worker.job:
+                continue
+            job = self._queue.popleft()
+            try:
+                worker.conn.send((job.job_id, job.img_bytes, job.qr_codes))
+            except (OSError, BrokenPipeError) as e:
+                log.error(f"向工作进程{worker.index}发送任务失败: {e}")
+                self._queue.appendleft(job)
+                continue
+            job.state = "running"
+            job.started = time.time()
+            job.position = None
+            worker.job = job
+            worker.deadline = time.monotonic() + self.job_timeout
+            job.progress("started", {"worker": worker.index})
+
+        for position, job in enumerate(self._queue, start=1):
+            if job.position != position:
+                job.position = position
+                job.progress("queued", {"position": position})
+
+    def _poll_worker(self, worker: _Worker):
+        try:
+            while worker.conn.poll():
+                kind, payload = worker.conn.recv()
+                match kind:
+                    case "ready":
+                        worker.ready = True
+                        self._error = None
+                        log.info(f"OCR工作进程{worker.index}模型加载完成")
+                    case "error":
+                        self._error = payload
+                        worker.failed = True
+                        log.error(f"OCR工作进程{worker.index}模型加载失败: {payload}")
+                    case "progress":
+                        job_id, event, detail = payload
+                        if worker.job and worker.job.job_id == job_id:
+                            worker.job.progress(event, detail)
+                    case "result":
+                        job_id, result = payload
+                        if worker.job and worker.job.job_id == job_id:
+                            state = "done" if result.get("success") else "failed"
+                            self._finish(worker.job, state, result)
+                        worker.job = None
+                        worker.deadline = None
+        except (EOFError, OSError):
+            pass
+
+        if worker.failed:
+            # 模型加载失败时不再反复重启
+            worker.kill()
+            return
+
+        if not worker.process.is_alive():
+            log.error(
+                f"OCR工作进程{worker.index}异常退出(exitcode={worker.process.exitcode})，正在重启"
+            )
+            if worker.job:
+                self._finish(
+                    worker.job, "failed", api_invoice_error("OCR工作进程异常退出")
+                )
+            self._restart(worker)
+            return
+
+        if worker.deadline and time.monotonic() > worker.deadline:
+            log.error(f"任务{worker.job.job_id}超时，重启工作进程{worker.index}")
+            self._finish(worker.job, "timeout", api_invoice_error("识别超时"))
+            self._restart(worker)